@@ -1,7 +1,15 @@
-import requests
+import argparse
 import json
-from typing import Dict, List, Any, Optional
+import math
+import random
+import re
+import threading
+import time
+from collections import defaultdict
 from enum import Enum
+from typing import Callable, Dict, Iterable, List, Any, Optional
+import requests
+from requests.adapters import HTTPAdapter
 
 BASE_URL = "http://localhost:8000"
 
@@ -13,13 +21,109 @@ class QualityRating(str, Enum):
     GOOD = "good"
 
 
+class RequestStats:
+    """
+    Latencies and errors of requests per endpoint, shared between threads
+    """
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self.latencies[endpoint].append(seconds)
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def report(self, elapsed: float) -> str:
+        """
+        Throughput and latency percentiles per endpoint, as a table
+        """
+        lines = [
+            f"{'endpoint':36} {'requests':>8} {'errors':>6} {'req/s':>7}"
+            f" {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+        ]
+        with self._lock:
+            rows = sorted(self.latencies.items())
+            rows.append(("total", [x for _, values in rows for x in values]))
+            errors = dict(self.errors, total=sum(self.errors.values()))
+        for endpoint, values in rows:
+            if not values:
+                continue
+            ordered = sorted(values)
+            lines.append(
+                f"{endpoint:36} {len(values):>8} {errors.get(endpoint, 0):>6}"
+                f" {len(values) / elapsed:>7.1f}"
+                + "".join(
+                    f" {percentile(ordered, q) * 1000:>8.1f}"
+                    for q in (0.5, 0.9, 0.99)
+                )
+                + f" {ordered[-1] * 1000:>8.1f}"
+            )
+        return "\n".join(lines)
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    """
+    Nearest-rank percentile of sorted values
+    """
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
 class LLMEvaluatorClient:
     """
     A client for testing the LLM Evaluator API
+
+    Requests go through one requests.Session, so connections are kept alive
+    and reused. Sessions are not meant to be shared between threads; give
+    each thread its own client. With stats set, every request's latency is
+    recorded under its endpoint, with ids replaced by {id}.
     """
 
-    def __init__(self, base_url: str = BASE_URL):
+    def __init__(
+        self,
+        base_url: str = BASE_URL,
+        pool_size: int = 10,
+        stats: Optional[RequestStats] = None,
+        verbose: bool = True,
+    ):
         self.base_url = base_url
+        self.stats = stats
+        self.verbose = verbose
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self) -> None:
+        self.session.close()
+
+    def _send(self, method: str, endpoint: str, **kwargs) -> requests.Response:
+        """
+        Send a request, recording its latency, and raise for error responses
+        """
+        start = time.perf_counter()
+        try:
+            response = self.session.request(
+                method, f"{self.base_url}{endpoint}", **kwargs
+            )
+        except requests.RequestException:
+            self._record(method, endpoint, start, False)
+            raise
+        self._record(method, endpoint, start, response.status_code < 400)
+
+        if response.status_code >= 400:
+            if self.verbose:
+                print(f"Error {response.status_code}: {response.text}")
+            response.raise_for_status()
+        return response
+
+    def _record(self, method: str, endpoint: str, start: float, ok: bool) -> None:
+        if self.stats is not None:
+            path = re.sub(r"/\d+", "/{id}", endpoint.split("?")[0])
+            self.stats.record(f"{method} {path}", time.perf_counter() - start, ok)
 
     def _request(
         self, endpoint: str, method: str = "GET", data: Optional[Dict[str, Any]] = None
@@ -27,23 +131,11 @@ class LLMEvaluatorClient:
         """
         Make a request to the API
         """
-        url = f"{self.base_url}{endpoint}"
-        headers = {"Content-Type": "application/json"}
-
-        if method == "GET":
-            response = requests.get(url, headers=headers)
-        elif method == "POST":
-            response = requests.post(url, headers=headers, data=json.dumps(data))
-        elif method == "PUT":
-            response = requests.put(url, headers=headers, data=json.dumps(data))
-        elif method == "DELETE":
-            response = requests.delete(url, headers=headers)
-        else:
+        if method not in ("GET", "POST", "PUT", "DELETE"):
             raise ValueError(f"Unsupported method: {method}")
-
-        if response.status_code >= 400:
-            print(f"Error {response.status_code}: {response.text}")
-            response.raise_for_status()
+        response = self._send(
+            method, endpoint, json=data if method in ("POST", "PUT") else None
+        )
 
         # Some endpoints may return empty responses
         if response.text:
@@ -102,6 +194,38 @@ class LLMEvaluatorClient:
             f"/input-sets/{input_set_id}/inputs", method="POST", data=data
         )
 
+    def import_inputs(
+        self, input_set_id: int, inputs: Iterable[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        Bulk import inputs ({"text": ..., "name": ...}) into an input set
+
+        The inputs are sent as JSON Lines while they are generated, so the
+        iterable can be larger than memory. Texts already in the set are skipped.
+        """
+        lines = (json.dumps(item).encode("utf-8") + b"\n" for item in inputs)
+        return self._upload(f"/input-sets/{input_set_id}/inputs/import", lines, "jsonl")
+
+    def import_inputs_file(self, input_set_id: int, path: str) -> Dict[str, Any]:
+        """
+        Bulk import a .jsonl or .csv file into an input set
+        """
+        upload_format = "csv" if path.lower().endswith(".csv") else "jsonl"
+        with open(path, "rb") as f:
+            return self._upload(
+                f"/input-sets/{input_set_id}/inputs/import", f, upload_format
+            )
+
+    def _upload(self, endpoint: str, body: Any, upload_format: str) -> Dict[str, Any]:
+        """
+        Stream a request body without reading it into memory first
+        """
+        content_type = "text/csv" if upload_format == "csv" else "application/x-ndjson"
+        response = self._send(
+            "POST", endpoint, headers={"Content-Type": content_type}, data=body
+        )
+        return response.json()
+
     # Prompt Methods
 
     def create_prompt(
@@ -175,6 +299,12 @@ class LLMEvaluatorClient:
 
     # Evaluation Methods
 
+    def get_evaluations(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Get the newest evaluations
+        """
+        return self._request(f"/evaluations/?limit={limit}")
+
     def create_evaluation(
         self, output_id: int, quality: QualityRating, notes: Optional[str] = None
     ) -> Dict[str, Any]:
@@ -202,11 +332,11 @@ class LLMEvaluatorClient:
         return self._request("/evaluations/", method="POST", data=data)
 
 
-def run_test():
+def run_test(base_url: str = BASE_URL):
     """
     Run a test of the API client
     """
-    client = LLMEvaluatorClient()
+    client = LLMEvaluatorClient(base_url)
 
     print("Testing API Client...")
 
@@ -228,15 +358,18 @@ def run_test():
 
     # Add inputs to the set
     print("\nAdding inputs to set...")
-    inputs = [
-        client.add_input_to_set(
-            input_set["id"],
-            "This is a test input for the API client. It should summarize this text.",
-            name=f"Test Input {i+1}",
-        )
-        for i in range(2)
-    ]
-    print(f"Added {len(inputs)} inputs to set")
+    result = client.import_inputs(
+        input_set["id"],
+        (
+            {
+                "text": f"This is test input {i+1} for the API client. It should summarize this text.",
+                "name": f"Test Input {i+1}",
+            }
+            for i in range(2)
+        ),
+    )
+    print(f"Added {result['imported']} inputs to set")
+    inputs = client.get_input_set(input_set["id"])["inputs"]
 
     # Create prompts
     print("\nCreating prompts...")
@@ -293,5 +426,271 @@ def run_test():
     print("\nAPI test completed successfully!")
 
 
+# Actions of the virtual users in a load test and their default weights
+LOAD_MIX = {
+    "history": 40,
+    "compare": 20,
+    "evaluate": 20,
+    "evaluations": 10,
+    "import": 10,
+}
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """
+    Parse "history=40,compare=20" into weights per action
+    """
+    mix = {}
+    for item in value.split(","):
+        action, _, weight = item.partition("=")
+        if action.strip() not in LOAD_MIX:
+            raise ValueError(f"Unknown action {action!r}; use {', '.join(LOAD_MIX)}")
+        mix[action.strip()] = float(weight or 1)
+    return mix
+
+
+def sample_text(rng: random.Random, index: int) -> str:
+    """
+    A transcribed voice memo of a realistic length
+    """
+    words = "meeting budget follow up call client project deadline idea team".split()
+    body = " ".join(rng.choice(words) for _ in range(rng.randint(50, 300)))
+    return f"Voice memo {index}: {body}."
+
+
+class LoadTest:
+    """
+    Virtual users driving a weighted mix of actions against a running server
+
+    Each virtual user is a thread with its own client, so its connection is
+    kept alive between requests. Inputs and outputs created during the run
+    are shared, so later comparisons, history views and evaluations work on
+    them.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        users: int,
+        duration: float,
+        mix: Dict[str, float],
+        model_names: Optional[List[str]] = None,
+        inputs: int = 50,
+        think_time: float = 0.0,
+        seed: int = 0,
+    ):
+        self.base_url = base_url
+        self.users = users
+        self.duration = duration
+        self.mix = mix
+        self.model_names = model_names
+        self.initial_inputs = inputs
+        self.think_time = think_time
+        self.seed = seed
+        self.stats = RequestStats()
+        self.input_ids: List[int] = []
+        self.output_ids: List[int] = []
+        self._texts = 0
+        self._lock = threading.Lock()
+
+    def setup(self) -> None:
+        """
+        Create the input set, prompts and starting inputs the users work on
+        """
+        client = LLMEvaluatorClient(self.base_url)
+        try:
+            models = client.get_models()
+            if self.model_names:
+                models = [m for m in models if m["name"] in self.model_names]
+            else:
+                # Prefer fake models, so a load test costs nothing
+                fake_models = [m for m in models if m["name"].startswith("fake")]
+                models = fake_models or models[:1]
+            if not models:
+                raise SystemExit("No matching models; is the server running?")
+            self.model_ids = [m["id"] for m in models]
+
+            self.input_set_id = client.create_input_set(
+                name=f"Load test {time.strftime('%Y-%m-%d %H:%M:%S')}"
+            )["id"]
+            self.prompt_ids = [
+                client.create_prompt(
+                    name=f"Load test {name}", template=f"{template}: {{{{input}}}}"
+                )["id"]
+                for name, template in (
+                    ("summary", "Summarize in 1-2 sentences"),
+                    ("bullets", "Extract the key points as a bulleted list"),
+                )
+            ]
+            client.import_inputs(
+                self.input_set_id,
+                self._new_inputs(random.Random(self.seed), self.initial_inputs),
+            )
+            self.input_ids = [
+                item["id"] for item in client.get_input_set(self.input_set_id)["inputs"]
+            ]
+        finally:
+            client.close()
+
+    def _new_inputs(self, rng: random.Random, count: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            start = self._texts
+            self._texts += count
+        return [{"text": sample_text(rng, start + i)} for i in range(count)]
+
+    def action(self, name: str) -> Callable[[LLMEvaluatorClient, random.Random], None]:
+        return getattr(self, f"do_{name}")
+
+    def do_history(self, client: LLMEvaluatorClient, rng: random.Random) -> None:
+        history = client.get_input_history(rng.choice(self.input_ids))
+        with self._lock:
+            self.output_ids.extend(r["output_id"] for r in history["results"][:5])
+
+    def do_compare(self, client: LLMEvaluatorClient, rng: random.Random) -> None:
+        input_ids = rng.sample(
+            self.input_ids, min(len(self.input_ids), rng.randint(1, 3))
+        )
+        results = client.compare_prompts(
+            input_ids=input_ids,
+            prompt_ids=self.prompt_ids,
+            model_ids=[rng.choice(self.model_ids)],
+        )
+        with self._lock:
+            self.output_ids.extend(
+                r["output_id"]
+                for result in results
+                for r in result["prompt_results"]
+                if r.get("output_id")
+            )
+
+    def do_evaluate(self, client: LLMEvaluatorClient, rng: random.Random) -> None:
+        if not self.output_ids:
+            return self.do_compare(client, rng)
+        client.create_evaluation(
+            output_id=rng.choice(self.output_ids),
+            quality=rng.choice(list(QualityRating)),
+        )
+
+    def do_evaluations(self, client: LLMEvaluatorClient, rng: random.Random) -> None:
+        client.get_evaluations(limit=50)
+
+    def do_import(self, client: LLMEvaluatorClient, rng: random.Random) -> None:
+        client.import_inputs(
+            self.input_set_id, self._new_inputs(rng, rng.randint(5, 20))
+        )
+        # New inputs join the pool once they are listed
+        inputs = client.get_input_set(self.input_set_id)["inputs"]
+        with self._lock:
+            self.input_ids = [item["id"] for item in inputs]
+
+    def virtual_user(self, number: int, deadline: float) -> None:
+        rng = random.Random(self.seed + number)
+        client = LLMEvaluatorClient(
+            self.base_url, pool_size=1, stats=self.stats, verbose=False
+        )
+        actions = list(self.mix)
+        weights = [self.mix[action] for action in actions]
+        try:
+            while time.perf_counter() < deadline:
+                name = rng.choices(actions, weights)[0]
+                try:
+                    self.action(name)(client, rng)
+                except requests.RequestException:
+                    pass  # Counted as an error by the client
+                if self.think_time:
+                    time.sleep(rng.expovariate(1 / self.think_time))
+        finally:
+            client.close()
+
+    def run(self) -> float:
+        """
+        Run all virtual users until the duration is over; the elapsed time
+        """
+        start = time.perf_counter()
+        deadline = start + self.duration
+        threads = [
+            threading.Thread(target=self.virtual_user, args=(number, deadline))
+            for number in range(self.users)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start
+
+
+def run_load_test(
+    base_url: str = BASE_URL,
+    users: int = 10,
+    duration: float = 60.0,
+    mix: Optional[Dict[str, float]] = None,
+    model_names: Optional[List[str]] = None,
+    inputs: int = 50,
+    think_time: float = 0.0,
+    seed: int = 0,
+) -> RequestStats:
+    """
+    Run a load test and print throughput and latency per endpoint
+    """
+    load_test = LoadTest(
+        base_url,
+        users,
+        duration,
+        mix or LOAD_MIX,
+        model_names=model_names,
+        inputs=inputs,
+        think_time=think_time,
+        seed=seed,
+    )
+    print(f"Setting up input set with {inputs} inputs...")
+    load_test.setup()
+    print(f"Running {users} virtual users for {duration:g}s...")
+    elapsed = load_test.run()
+    print(f"\n{load_test.stats.report(elapsed)}")
+    return load_test.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Test the LLM Evaluator API, or put it under load"
+    )
+    parser.add_argument("mode", nargs="?", choices=["test", "load"], default="test")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--users", type=int, default=10, help="virtual users")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds")
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=LOAD_MIX,
+        help="weights per action, e.g. history=40,compare=20,evaluate=20,"
+        "evaluations=10,import=10",
+    )
+    parser.add_argument(
+        "--models",
+        type=lambda value: value.split(","),
+        help="comma-separated model names (default: the fake models, if any)",
+    )
+    parser.add_argument("--inputs", type=int, default=50, help="inputs to start with")
+    parser.add_argument(
+        "--think-time", type=float, default=0.0, help="mean pause between actions"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.mode == "load":
+        run_load_test(
+            args.base_url,
+            users=args.users,
+            duration=args.duration,
+            mix=args.mix,
+            model_names=args.models,
+            inputs=args.inputs,
+            think_time=args.think_time,
+            seed=args.seed,
+        )
+    else:
+        run_test(args.base_url)
+
+
 if __name__ == "__main__":
-    run_test()
+    main()
@@ -1,13 +1,99 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
+from . import config
+from .metrics import instrument_engine
+
+# Async drivers for the sync drivers we support
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "postgresql+psycopg": "postgresql+psycopg_async",
+}
+
+
+def async_url(url: str) -> str:
+    """The URL of the same database through an async driver"""
+    sync_url = make_url(url)
+    drivername = ASYNC_DRIVERS.get(sync_url.drivername, sync_url.drivername)
+    return sync_url.set(drivername=drivername).render_as_string(hide_password=False)
+
+
+SQLALCHEMY_DATABASE_URL = config.DATABASE_URL
+# Same database through an async driver, used by the async routes
+ASYNC_SQLALCHEMY_DATABASE_URL = config.ASYNC_DATABASE_URL or async_url(
+    SQLALCHEMY_DATABASE_URL
+)
+
+
+def engine_options(url: str, poolclass: type[Pool] = QueuePool) -> dict:
+    """Pool and driver options for an engine"""
+    database_url = make_url(url)
+    options = {}
+    if database_url.get_backend_name() == "sqlite":
+        # Sessions are used from worker threads
+        options["connect_args"] = {"check_same_thread": False}
+        if database_url.database in (None, "", ":memory:"):
+            # Every connection to an in-memory database is a separate database
+            return options
+    else:
+        # Drop connections the server closed while they were idle in the pool
+        options["pool_pre_ping"] = True
+    options.update(
+        poolclass=poolclass,
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+        pool_recycle=config.DB_POOL_RECYCLE,
+    )
+    return options
+
+
+def configure_sqlite(engine: Engine) -> None:
+    """Tune every new SQLite connection for concurrent use
+
+    WAL lets readers continue while one connection writes, synchronous=NORMAL
+    only syncs at checkpoints rather than on every commit (safe with WAL), and
+    the busy timeout makes writers wait for the lock instead of failing with
+    "database is locked".
+    """
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_SIZE}")
+        # A negative cache size is in KiB rather than pages
+        cursor.execute(f"PRAGMA cache_size=-{config.SQLITE_CACHE_SIZE_KB}")
+        cursor.close()
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./llm_evaluator.db"
 
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL)
 )
+configure_sqlite(engine)
+instrument_engine(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(
+    ASYNC_SQLALCHEMY_DATABASE_URL,
+    **engine_options(ASYNC_SQLALCHEMY_DATABASE_URL, AsyncAdaptedQueuePool),
+)
+configure_sqlite(async_engine.sync_engine)
+instrument_engine(async_engine.sync_engine)
+# Objects stay loaded after commit so responses can be built without lazy IO
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
 Base = declarative_base()
 
 # Dependency for FastAPI
@@ -17,3 +103,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# Dependency for async FastAPI routes
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,69 @@
+"""
+Export outputs with their input, model, prompt version and evaluation
+
+    python -m app.export outputs.jsonl
+    python -m app.export outputs.parquet --input-set-id 1 --evaluated-only
+
+The format follows the file extension (.jsonl, .parquet or .arrow) unless
+--format is given; - writes JSON Lines to standard output. Rows are streamed
+from the database, so exports of any size run in constant memory.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from .services.export_service import EXPORT_FORMATS, ExportService
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m app.export", description="Export outputs and evaluations"
+    )
+    parser.add_argument("file", help="file to write, or - for standard output")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS))
+    parser.add_argument("--input-set-id", type=int)
+    parser.add_argument("--model-id", type=int)
+    parser.add_argument("--prompt-id", type=int)
+    parser.add_argument("--quality", choices=["good", "ok", "bad"])
+    parser.add_argument(
+        "--evaluated-only", action="store_true", help="only outputs with an evaluation"
+    )
+    parser.add_argument(
+        "--no-text", action="store_true", help="leave out input and output texts"
+    )
+    args = parser.parse_args()
+
+    export_format = args.format
+    if export_format is None:
+        extension = os.path.splitext(args.file)[1].lstrip(".")
+        export_format = extension if extension in EXPORT_FORMATS else "jsonl"
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    try:
+        chunks = ExportService().stream(
+            export_format,
+            input_set_id=args.input_set_id,
+            model_id=args.model_id,
+            prompt_id=args.prompt_id,
+            quality=args.quality,
+            evaluated_only=args.evaluated_only or args.quality is not None,
+            include_text=not args.no_text,
+        )
+    except RuntimeError as e:
+        raise SystemExit(str(e))
+
+    start = time.perf_counter()
+    out = sys.stdout.buffer if args.file == "-" else open(args.file, "wb")
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    logging.info(f"Wrote {args.file} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Bulk import of inputs and outputs from JSON Lines files
+
+    python -m app.ingest inputs inputs.jsonl [--input-set-id ID]
+    python -m app.ingest outputs outputs.jsonl
+
+Each line is one object with the columns of the row, e.g. {"text": "..."} for
+inputs. Files are read incrementally and loaded with COPY on PostgreSQL.
+"""
+import argparse
+import datetime
+import json
+import logging
+import sys
+import time
+from typing import Any, Dict, Iterator, Optional, TextIO
+from .database import SessionLocal
+from .services.ingest_service import IngestService
+
+
+def read_rows(
+    lines: TextIO, input_set_id: Optional[int] = None
+) -> Iterator[Dict[str, Any]]:
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            raise SystemExit(f"Line {number} is not valid JSON: {e}")
+        if row.get("created_at"):
+            row["created_at"] = datetime.datetime.fromisoformat(row["created_at"])
+        if input_set_id is not None:
+            row["input_set_id"] = input_set_id
+        yield row
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m app.ingest", description="Bulk import rows from JSON Lines"
+    )
+    parser.add_argument("table", choices=["inputs", "outputs"])
+    parser.add_argument("file", help="JSON Lines file, or - for standard input")
+    parser.add_argument(
+        "--input-set-id", type=int, help="add the imported inputs to this input set"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    ingest_service = IngestService()
+    lines = sys.stdin if args.file == "-" else open(args.file, encoding="utf-8")
+    db = SessionLocal()
+    start = time.perf_counter()
+    try:
+        if args.table == "inputs":
+            count = ingest_service.ingest_inputs(
+                db, read_rows(lines, args.input_set_id)
+            )
+        else:
+            count = ingest_service.ingest_outputs(db, read_rows(lines))
+        db.commit()
+    finally:
+        db.close()
+        if lines is not sys.stdin:
+            lines.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Imported {count} {args.table} in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import datetime
+import itertools
+import json
+import logging
+import sys
+from typing import Any, Dict, Optional
+from . import config
+
+# Logging is configured once by the app at startup; modules only create
+# loggers with logging.getLogger(__name__) and pass arguments for lazy
+# %-formatting, so messages below the configured level cost next to nothing.
+
+# Attributes every LogRecord has; anything else was passed in `extra` and
+# becomes a field of the JSON line
+_RECORD_ATTRIBUTES = set(
+    vars(logging.LogRecord("", logging.INFO, "", 0, "", (), None))
+) | {"message", "asctime"}
+
+_configured = False
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats each record as one JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "time": datetime.datetime.fromtimestamp(
+                record.created, datetime.timezone.utc
+            ).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def parse_levels(value: str) -> Dict[str, str]:
+    """Per-logger levels from e.g. "app.services.job_service=DEBUG,sqlalchemy.engine=INFO" """
+    levels = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        name, _, level = item.partition("=")
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(
+    level: str = config.LOG_LEVEL,
+    log_format: str = config.LOG_FORMAT,
+    levels: Optional[Dict[str, str]] = None,
+) -> None:
+    """Send all logs to stderr as JSON (or plain text) with per-logger levels
+
+    Only the first call has an effect.
+    """
+    global _configured
+    if _configured:
+        return
+    _configured = True
+
+    handler = logging.StreamHandler(sys.stderr)
+    if log_format == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(
+            logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+        )
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level.upper())
+    if levels is None:
+        levels = parse_levels(config.LOG_LEVELS)
+    for name, logger_level in levels.items():
+        logging.getLogger(name).setLevel(logger_level)
+
+
+class SampledLogger:
+    """Logs only the first of every `every` events passed to it
+
+    For events that happen once per cell or generation, which would flood
+    the logs of a large run. Records carry sampled_every so counts can be
+    scaled back up; run-level summaries are logged in full elsewhere.
+    """
+
+    def __init__(self, logger: logging.Logger, every: int = config.LOG_CELL_SAMPLE_EVERY):
+        self.logger = logger
+        self.every = max(1, every)
+        # next() on itertools.count is atomic, so threads can share it
+        self._events = itertools.count()
+
+    def log(self, level: int, msg: str, *args, **kwargs) -> None:
+        if not self.logger.isEnabledFor(level):
+            return
+        if next(self._events) % self.every:
+            return
+        if self.every > 1:
+            kwargs["extra"] = {**kwargs.get("extra", {}), "sampled_every": self.every}
+        self.logger.log(level, msg, *args, **kwargs)
+
+    def debug(self, msg: str, *args, **kwargs) -> None:
+        self.log(logging.DEBUG, msg, *args, **kwargs)
+
+    def warning(self, msg: str, *args, **kwargs) -> None:
+        self.log(logging.WARNING, msg, *args, **kwargs)
+
+    def error(self, msg: str, *args, **kwargs) -> None:
+        self.log(logging.ERROR, msg, *args, **kwargs)
+
+    def exception(self, msg: str, *args, **kwargs) -> None:
+        kwargs.setdefault("exc_info", True)
+        self.log(logging.ERROR, msg, *args, **kwargs)
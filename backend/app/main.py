@@ -1,21 +1,42 @@
-from fastapi import FastAPI, Depends, HTTPException
+import asyncio
+import json
+from fastapi import FastAPI, Depends, Header, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Literal, Optional
 
 # Import database and models
-from .database import engine, get_db
-from . import models
+from .database import (
+    AsyncSessionLocal,
+    SessionLocal,
+    async_engine,
+    engine,
+    get_async_db,
+    get_db,
+)
+from . import metrics
+from .logging_config import configure_logging
 from . import schemas
+from .migrations import check_schema
+from .streaming import BodyPipe, UploadAborted
 
 # Import services
 from .services.llm_service import LLMService
 from .services.prompt_service import PromptService
-from .services.evaluation_service import EvaluationService
-from .services.input_service import InputService  # New service
+from .services.evaluation_service import EvaluationService, IdempotencyConflict
+from .services.input_service import IMPORT_FORMATS, InputService
+from .services.job_service import JobService
+from .services.export_service import EXPORT_FORMATS, ExportService
+from .services.model_registry_service import ModelRegistryService
+from .services.usage_service import UsageService
+from .services.worker_service import WorkerService
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
+# JSON logs for the whole process, set up before the services start
+configure_logging()
 
 # Initialize FastAPI app
 app = FastAPI(title="LLM Evaluator")
@@ -27,13 +48,111 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Job-Id"],
 )
+# Count and time requests for GET /metrics
+app.add_middleware(metrics.MetricsMiddleware)
 
-# Initialize services
+# Initialize services. Each server process has its own; they share jobs and
+# outputs through the database. Only the leading worker syncs the model
+# catalogue; the others load models when they first use them.
 llm_service = LLMService()
 prompt_service = PromptService()
 input_service = InputService()  # New service
 evaluation_service = EvaluationService(llm_service)
+job_service = JobService(evaluation_service)
+export_service = ExportService()
+usage_service = UsageService()
+worker_service = WorkerService(evaluation_service.output_writer.recover)
+worker_service.add_poller(job_service.poll)
+model_registry = ModelRegistryService(llm_service, is_leader=worker_service.is_leader)
+
+
+def collect_service_metrics():
+    """Metrics from the counters the services keep for their /stats endpoints"""
+    cache_lookups = metrics.Counter(
+        "llm_evaluator_cache_lookups_total",
+        "Generation cache lookups by result (hit or miss)",
+        ("result",),
+    )
+    cache_stats = evaluation_service.cache.get_stats()
+    cache_lookups.inc(cache_stats["hits"], result="hit")
+    cache_lookups.inc(cache_stats["misses"], result="miss")
+
+    queued = metrics.Gauge(
+        "llm_evaluator_generations_queued",
+        "Generations waiting for a scheduler slot",
+        ("model",),
+    )
+    active = metrics.Gauge(
+        "llm_evaluator_generations_in_flight",
+        "Generations running",
+        ("model",),
+    )
+    for model_name, stats in evaluation_service.scheduler.get_stats().items():
+        queued.set(stats["queued"], model=model_name)
+        active.set(stats["active"], model=model_name)
+
+    phases = metrics.Histogram(
+        "llm_evaluator_generation_phase_seconds",
+        "Queue wait, time to first token, generation and persist of outputs",
+        ("model", "phase"),
+    )
+    for model_name, stats in evaluation_service.timing.get_stats().items():
+        for phase, snapshot in stats["phases"].items():
+            phases.add_snapshot(snapshot, model=model_name, phase=phase)
+
+    return [cache_lookups, queued, active, phases]
+
+
+metrics.REGISTRY.add_collector(collect_service_metrics)
+
+
+@app.on_event("startup")
+def check_schema_version():
+    # The schema is created and upgraded by `python -m app.migrations upgrade`
+    check_schema(engine)
+
+
+@app.on_event("startup")
+def start_worker():
+    # Register with the other workers and take over the jobs of dead ones,
+    # including those that were running when this server stopped, after
+    # storing the outputs left in their journals
+    worker_service.start()
+
+
+@app.on_event("startup")
+def start_model_registry():
+    # The leading worker syncs the model catalogue now and in the background
+    model_registry.start()
+
+
+@app.on_event("shutdown")
+def stop_model_registry():
+    model_registry.stop()
+
+
+@app.on_event("shutdown")
+def stop_jobs():
+    job_service.stop()
+
+
+@app.on_event("shutdown")
+def flush_outputs():
+    evaluation_service.output_writer.close()
+
+
+@app.on_event("shutdown")
+def stop_worker():
+    # Hand unfinished jobs to the other workers
+    worker_service.stop()
+
+
+@app.on_event("shutdown")
+async def close_database():
+    # Pooled aiosqlite connections each keep a thread that would block exit
+    await async_engine.dispose()
 
 
 # Model endpoints
@@ -42,6 +161,14 @@ def get_models(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     return evaluation_service.get_models(db, skip=skip, limit=limit)
 
 
+@app.post("/models/refresh", response_model=schemas.ModelCatalogueRefresh)
+def refresh_models(db: Session = Depends(get_db)):
+    """
+    Discover the models offered by the installed llm plugins and add new ones
+    """
+    return model_registry.refresh(db)
+
+
 @app.post("/models/", response_model=schemas.LLMModel)
 def create_model(model: schemas.LLMModelCreate, db: Session = Depends(get_db)):
     return evaluation_service.create_model(db, model)
@@ -100,6 +227,57 @@ def create_input_in_set(
         raise HTTPException(status_code=404, detail=str(e))
 
 
+@app.post("/input-sets/{input_set_id}/inputs/import", response_model=schemas.InputImport)
+async def import_inputs(
+    input_set_id: int,
+    request: Request,
+    format: Optional[Literal["jsonl", "csv"]] = None,
+):
+    """Stream a JSONL or CSV file into an input set, skipping duplicate texts
+
+    The request body is the file itself. Its format comes from ?format= or
+    the Content-Type (application/x-ndjson or text/csv).
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    upload_format = format or IMPORT_FORMATS.get(content_type.lower())
+    if upload_format is None:
+        raise HTTPException(
+            status_code=415,
+            detail="Upload JSON Lines (application/x-ndjson) or CSV (text/csv)",
+        )
+
+    pipe = BodyPipe()
+
+    def run_import():
+        # Parsed and inserted on a worker thread while the body streams in
+        db = SessionLocal()
+        try:
+            if input_service.get_input_set(db, input_set_id) is None:
+                raise HTTPException(status_code=404, detail="Input set not found")
+            return input_service.import_file(db, input_set_id, pipe, upload_format)
+        finally:
+            pipe.close()
+            db.close()
+
+    importing = asyncio.ensure_future(run_in_threadpool(run_import))
+    try:
+        async for chunk in request.stream():
+            if not await pipe.feed(chunk):
+                break
+    except BaseException as e:
+        # A partial upload must not be imported as if it were complete
+        pipe.finish(error=e)
+        raise
+    pipe.finish()
+
+    try:
+        return await importing
+    except UploadAborted as e:
+        raise HTTPException(status_code=400, detail=f"Upload incomplete: {e}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @app.get("/inputs/", response_model=List[schemas.Input])
 def get_inputs(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     return input_service.get_inputs(db, skip=skip, limit=limit)
@@ -200,25 +378,260 @@ def get_prompt_version(version_id: int, db: Session = Depends(get_db)):
 
 
 # Processing endpoints
+# Processing endpoints are async so waiting on models doesn't hold a worker thread
+def idempotency_conflict(e: IdempotencyConflict) -> HTTPException:
+    headers = {"X-Job-Id": str(e.job_id)} if e.job_id is not None else None
+    return HTTPException(status_code=409, detail=str(e), headers=headers)
+
+
 @app.post("/process/")
-def process_text(request: schemas.ProcessRequest, db: Session = Depends(get_db)):
-    return evaluation_service.process_text(db, request)
+async def process_text(
+    request: schemas.ProcessRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Process a text with every model and prompt; a retry with the same
+    Idempotency-Key header returns the first result without generating again
+    """
+    try:
+        job_id, result = await evaluation_service.process_text(
+            db, request, idempotency_key
+        )
+    except IdempotencyConflict as e:
+        raise idempotency_conflict(e)
+    response.headers["X-Job-Id"] = str(job_id)
+    return result
+
+
+@app.post("/process/stream")
+async def process_text_stream(request: schemas.ProcessRequest):
+    """
+    Process a text and stream each output as a Server-Sent Event
+    """
+    return event_stream(evaluation_service.stream_process_text, request)
 
 
 @app.post("/batch-process/")
-def batch_process(request: schemas.BatchProcessRequest, db: Session = Depends(get_db)):
-    return evaluation_service.batch_process(db, request)
+async def batch_process(
+    request: schemas.BatchProcessRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Process a batch within the request; use /jobs/batch-process/ for large batches
+    """
+    try:
+        job_id, results = await evaluation_service.batch_process(
+            db, request, idempotency_key
+        )
+    except IdempotencyConflict as e:
+        raise idempotency_conflict(e)
+    response.headers["X-Job-Id"] = str(job_id)
+    return results
+
+
+# Background job endpoints
+@app.post("/jobs/batch-process/", response_model=schemas.Job, status_code=202)
+def create_batch_job(
+    request: schemas.BatchProcessRequest,
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    """
+    Queue a batch for background processing and return the job immediately
+    """
+    try:
+        return job_service.create_batch_job(db, request, idempotency_key)
+    except IdempotencyConflict as e:
+        raise idempotency_conflict(e)
+
+
+@app.post("/jobs/evaluation-runs/", response_model=schemas.Job, status_code=202)
+def create_evaluation_run(
+    request: schemas.EvaluationRunRequest,
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    """
+    Queue a run of every input in an input set against the given models and
+    prompts; follow it like any other job
+    """
+    try:
+        return job_service.create_evaluation_run(db, request, idempotency_key)
+    except IdempotencyConflict as e:
+        raise idempotency_conflict(e)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.get("/jobs/", response_model=List[schemas.Job])
+def get_jobs(
+    skip: int = 0,
+    limit: int = 100,
+    kind: Optional[str] = None,
+    input_set_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+):
+    return job_service.get_jobs(
+        db, skip=skip, limit=limit, kind=kind, input_set_id=input_set_id
+    )
+
+
+@app.get("/jobs/{job_id}", response_model=schemas.Job)
+def get_job(job_id: int, db: Session = Depends(get_db)):
+    job = job_service.get_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.post("/jobs/{job_id}/resume", response_model=schemas.Job, status_code=202)
+def resume_job(job_id: int, db: Session = Depends(get_db)):
+    """
+    Run a finished job again, keeping completed cells and retrying failed ones
+    """
+    try:
+        job = job_service.resume_job(db, job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/jobs/{job_id}/results")
+def get_job_results(
+    job_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)
+):
+    """
+    Get the outputs a job has produced so far
+    """
+    results = job_service.get_job_results(db, job_id, skip=skip, limit=limit)
+    if results is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return results
+
+
+@app.get("/jobs/{job_id}/usage", response_model=List[schemas.UsageSummary])
+def get_job_usage(job_id: int, db: Session = Depends(get_db)):
+    """
+    Token usage, cost and latency of a job's outputs per model and prompt version
+    """
+    if job_service.get_job(db, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return usage_service.get_usage(db, job_id=job_id)
+
+
+@app.get("/usage/", response_model=List[schemas.UsageSummary])
+def get_usage(
+    input_set_id: Optional[int] = None,
+    model_id: Optional[int] = None,
+    prompt_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Token usage, cost and latency per model and prompt version, for picking
+    prompt versions by cost and speed as well as quality
+    """
+    return usage_service.get_usage(
+        db, input_set_id=input_set_id, model_id=model_id, prompt_id=prompt_id
+    )
 
 
 # New: Prompt comparison endpoint
 @app.post("/compare-prompts/")
-def compare_prompts(
-    request: schemas.ComparePromptsRequest, db: Session = Depends(get_db)
+async def compare_prompts(
+    request: schemas.ComparePromptsRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Compare multiple prompts on the same input(s)
     """
-    return evaluation_service.compare_prompts(db, request)
+    try:
+        job_id, results = await evaluation_service.compare_prompts(
+            db, request, idempotency_key
+        )
+    except IdempotencyConflict as e:
+        raise idempotency_conflict(e)
+    response.headers["X-Job-Id"] = str(job_id)
+    return results
+
+
+@app.post("/compare-prompts/stream")
+async def compare_prompts_stream(request: schemas.ComparePromptsRequest):
+    """
+    Compare prompts and stream each result as a Server-Sent Event
+    """
+    return event_stream(evaluation_service.stream_compare_prompts, request)
+
+
+def event_stream(events, request) -> StreamingResponse:
+    """Serve an (event, data) generator as Server-Sent Events
+
+    The generator gets its own session, which stays open until the stream
+    is finished.
+    """
+
+    async def generate():
+        async with AsyncSessionLocal() as db:
+            async for event, data in events(db, request):
+                payload = json.dumps(jsonable_encoder(data))
+                yield f"event: {event}\ndata: {payload}\n\n"
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+@app.get("/cache/stats", response_model=schemas.CacheStats)
+def get_cache_stats():
+    """
+    Hit/miss counters of the generation cache since startup
+    """
+    return evaluation_service.cache.get_stats()
+
+
+@app.get("/scheduler/stats")
+def get_scheduler_stats():
+    """
+    Queue depth, active generations and rate-limit pauses per model
+    """
+    return evaluation_service.scheduler.get_stats()
+
+
+@app.get("/latency/stats")
+def get_latency_stats():
+    """
+    Latency histograms per model for queue wait, time to first token,
+    generation and persist, with generation and error counts since startup
+    """
+    return evaluation_service.timing.get_stats()
+
+
+@app.get("/workers")
+def get_workers(db: Session = Depends(get_db)):
+    """
+    Server processes sharing this database, with their heartbeats and the
+    number of cells each is generating
+    """
+    return worker_service.get_workers(db)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """
+    Counters and histograms of this process in the Prometheus text format
+    """
+    return PlainTextResponse(
+        metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE
+    )
 
 
 # Evaluation endpoints
@@ -230,17 +643,109 @@ def create_evaluation(
 
 
 @app.get("/evaluations/")
-def get_evaluations(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return evaluation_service.get_evaluations(db, skip=skip, limit=limit)
+def get_evaluations(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    model_id: Optional[int] = None,
+    prompt_id: Optional[int] = None,
+    quality: Optional[schemas.QualityRating] = None,
+    include_text: bool = True,
+    db: Session = Depends(get_db),
+):
+    """
+    List evaluations, newest first; pass the X-Next-Cursor header of a page
+    as cursor to get the next one
+    """
+    try:
+        page = evaluation_service.get_evaluations(
+            db,
+            skip=skip,
+            limit=limit,
+            cursor=cursor,
+            model_id=model_id,
+            prompt_id=prompt_id,
+            quality=quality.value if quality else None,
+            include_text=include_text,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if page["next_cursor"]:
+        response.headers["X-Next-Cursor"] = page["next_cursor"]
+    return page["items"]
+
+
+def export_response(export_format: str, filename: str, **filters) -> StreamingResponse:
+    try:
+        chunks = export_service.stream(export_format, **filters)
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    return StreamingResponse(
+        chunks,
+        media_type=EXPORT_FORMATS[export_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}.{export_format}"'
+        },
+    )
+
+
+@app.get("/outputs/export")
+def export_outputs(
+    format: Literal["jsonl", "parquet", "arrow"] = "jsonl",
+    input_set_id: Optional[int] = None,
+    model_id: Optional[int] = None,
+    prompt_id: Optional[int] = None,
+    include_text: bool = True,
+):
+    """
+    Download all outputs with their input, model, prompt version and
+    evaluation, streamed as JSON Lines, Parquet or an Arrow IPC stream
+    """
+    return export_response(
+        format,
+        "outputs",
+        input_set_id=input_set_id,
+        model_id=model_id,
+        prompt_id=prompt_id,
+        include_text=include_text,
+    )
+
+
+@app.get("/evaluations/export")
+def export_evaluations(
+    format: Literal["jsonl", "parquet", "arrow"] = "jsonl",
+    input_set_id: Optional[int] = None,
+    model_id: Optional[int] = None,
+    prompt_id: Optional[int] = None,
+    quality: Optional[schemas.QualityRating] = None,
+    include_text: bool = True,
+):
+    """
+    Download the evaluated outputs, like /outputs/export
+    """
+    return export_response(
+        format,
+        "evaluations",
+        input_set_id=input_set_id,
+        model_id=model_id,
+        prompt_id=prompt_id,
+        quality=quality.value if quality else None,
+        evaluated_only=True,
+        include_text=include_text,
+    )
 
 
 # Input history endpoint
 @app.get("/inputs/{input_id}/history")
-def get_input_history(input_id: int, db: Session = Depends(get_db)):
+def get_input_history(
+    input_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)
+):
     """
-    Get historical results for a specific input
+    Get historical results for a specific input, newest first
     """
-    return evaluation_service.get_input_history(db, input_id)
+    return evaluation_service.get_input_history(db, input_id, skip=skip, limit=limit)
 
 
 # For direct running with Python
@@ -0,0 +1,327 @@
+import contextvars
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from .services.timing_service import BUCKETS, LatencyHistogram, seconds_since
+
+# Metrics in the Prometheus text exposition format, served by GET /metrics.
+# They live in this process, so every worker reports its own.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Route label of queries and requests outside a request, e.g. background jobs
+BACKGROUND_ROUTE = "background"
+# Route label of requests that matched no route
+UNMATCHED_ROUTE = "unmatched"
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """A metric family with one value per combination of label values"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} takes the labels {', '.join(self.labelnames)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """(name suffix, formatted labels, value) of every sample"""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {_escape(self.documentation)}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    """A value that only goes up"""
+
+    type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            ("", _format_labels(self.labelnames, key), value) for key, value in values
+        ]
+
+
+class Gauge(Counter):
+    """A value that goes up and down"""
+
+    type = "gauge"
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    """Observations in cumulative buckets, with their count and sum"""
+
+    type = "histogram"
+
+    def __init__(self, *args, buckets: Tuple[float, ...] = BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = buckets
+        self._histograms: Dict[LabelValues, LatencyHistogram] = {}
+        self._snapshots: Dict[LabelValues, dict] = {}
+
+    def observe(self, seconds: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = LatencyHistogram(self.buckets)
+                self._histograms[key] = histogram
+            histogram.observe(seconds)
+
+    def add_snapshot(self, snapshot: dict, **labels: str) -> None:
+        """Expose a LatencyHistogram kept elsewhere, from its snapshot()"""
+        self._snapshots[self._key(labels)] = snapshot
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            snapshots = {
+                key: histogram.snapshot()
+                for key, histogram in self._histograms.items()
+            }
+        snapshots.update(self._snapshots)
+
+        samples = []
+        for key, snapshot in sorted(snapshots.items()):
+            bucket_labels = self.labelnames + ("le",)
+            for upper, count in snapshot["buckets"].items():
+                labels = _format_labels(bucket_labels, key + (_format_value(upper),))
+                samples.append(("_bucket", labels, count))
+            labels = _format_labels(bucket_labels, key + ("+Inf",))
+            samples.append(("_bucket", labels, snapshot["count"]))
+            labels = _format_labels(self.labelnames, key)
+            samples.append(("_sum", labels, snapshot["sum"]))
+            samples.append(("_count", labels, snapshot["count"]))
+        return samples
+
+
+class Registry:
+    """The metrics of this process, rendered together
+
+    Collectors are called on every scrape and return metrics built from
+    counters that services already keep, such as cache hits and latency
+    histograms.
+    """
+
+    def __init__(self):
+        self._metrics: List[Metric] = []
+        self._collectors: List[Callable[[], Iterable[Metric]]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[Metric]]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for metric in collector():
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+GENERATIONS = REGISTRY.register(
+    Counter(
+        "llm_evaluator_generations_total",
+        "Model calls by model and status (ok or error)",
+        ("model", "status"),
+    )
+)
+GENERATION_SECONDS = REGISTRY.register(
+    Histogram(
+        "llm_evaluator_generation_seconds",
+        "Duration of successful model calls",
+        ("model",),
+    )
+)
+GENERATION_TOKENS = REGISTRY.register(
+    Counter(
+        "llm_evaluator_generation_tokens_total",
+        "Tokens of successful model calls by direction (input or output)",
+        ("model", "direction"),
+    )
+)
+DB_QUERIES = REGISTRY.register(
+    Counter(
+        "llm_evaluator_db_queries_total",
+        "Database statements executed, by the route that ran them",
+        ("route",),
+    )
+)
+DB_QUERY_SECONDS = REGISTRY.register(
+    Histogram(
+        "llm_evaluator_db_query_seconds",
+        "Duration of database statements, by the route that ran them",
+        ("route",),
+    )
+)
+HTTP_REQUESTS = REGISTRY.register(
+    Counter(
+        "llm_evaluator_http_requests_total",
+        "Finished HTTP requests by method, route and status code",
+        ("method", "route", "status"),
+    )
+)
+HTTP_REQUEST_SECONDS = REGISTRY.register(
+    Histogram(
+        "llm_evaluator_http_request_seconds",
+        "Duration of HTTP requests until the response was sent",
+        ("method", "route"),
+    )
+)
+HTTP_REQUESTS_IN_FLIGHT = REGISTRY.register(
+    Gauge(
+        "llm_evaluator_http_requests_in_flight",
+        "HTTP requests being handled",
+    )
+)
+HTTP_REQUESTS_IN_FLIGHT.set(0)
+
+# The ASGI scope of the request being handled, for labelling its queries.
+# Worker threads of the job service start without one.
+_current_scope: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar(
+    "metrics_scope", default=None
+)
+
+
+def route_label(scope: Optional[dict]) -> str:
+    """The path template of a request's route, e.g. /jobs/{job_id}"""
+    if scope is None:
+        return BACKGROUND_ROUTE
+    # The router stores the matched route in the scope before the endpoint runs
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+def record_generation(model_name: str, output_data: dict) -> None:
+    """Count a model call and observe its duration and tokens"""
+    if output_data.get("error"):
+        GENERATIONS.inc(model=model_name, status="error")
+        return
+    GENERATIONS.inc(model=model_name, status="ok")
+    GENERATION_SECONDS.observe(output_data["processing_time"], model=model_name)
+    for direction in ("input", "output"):
+        tokens = output_data.get(f"{direction}_tokens")
+        if tokens:
+            GENERATION_TOKENS.inc(tokens, model=model_name, direction=direction)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Count and time every statement an engine executes
+
+    For an async engine pass its sync_engine. Statements on one connection
+    run one after another, so the connection holds the start of the current
+    one.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info["metrics_query_start_ns"] = time.perf_counter_ns()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def finish_query(conn, cursor, statement, parameters, context, executemany):
+        start_ns = conn.info.pop("metrics_query_start_ns", None)
+        if start_ns is None:
+            return
+        route = route_label(_current_scope.get())
+        DB_QUERIES.inc(route=route)
+        DB_QUERY_SECONDS.observe(seconds_since(start_ns), route=route)
+
+
+class MetricsMiddleware:
+    """Counts and times HTTP requests and tracks those in flight
+
+    A plain ASGI middleware rather than BaseHTTPMiddleware, so streamed
+    responses are timed until their last chunk and the request's scope is
+    visible to the database events of the endpoint.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        token = _current_scope.set(scope)
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        start_ns = time.perf_counter_ns()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            _current_scope.reset(token)
+            route = route_label(scope)
+            method = scope["method"]
+            HTTP_REQUESTS.inc(method=method, route=route, status=str(status))
+            HTTP_REQUEST_SECONDS.observe(
+                seconds_since(start_ns), method=method, route=route
+            )
@@ -0,0 +1,217 @@
+"""
+Versioned schema migrations
+
+Each module in app/migrations/versions named vNNNN_<description>.py upgrades
+the schema from version NNNN - 1 to NNNN. The version reached is stored in the
+schema_version table. A database without that table but with tables is at
+version 0, the schema from before migrations existed; an empty database is
+created from the models and stamped with the latest version.
+
+Index builds can't share a transaction with the version bump, so a migration
+may be interrupted half way. Migrations therefore check before they change
+anything and are safe to run again.
+
+Upgrade with `python -m app.migrations upgrade` from the backend directory.
+"""
+import importlib
+import logging
+import pkgutil
+from types import ModuleType
+from typing import List, Optional
+from sqlalchemy import Column, Index, Integer, MetaData, Table, inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateColumn, CreateIndex
+from .. import models
+from . import versions
+
+logger = logging.getLogger(__name__)
+
+metadata = MetaData()
+
+schema_version = Table(
+    "schema_version", metadata, Column("version", Integer, nullable=False)
+)
+
+
+class SchemaVersionError(RuntimeError):
+    """The database schema is not at the version the code expects"""
+
+
+class Migration:
+    def __init__(self, module: ModuleType):
+        self.module = module
+        self.version = int(module.__name__.rsplit(".", 1)[-1][1:5])
+        self.description = (module.__doc__ or "").strip().splitlines()[0]
+
+    def upgrade(self, op: "Operations") -> None:
+        self.module.upgrade(op)
+
+
+def load_migrations() -> List[Migration]:
+    """All migrations in version order"""
+    migrations = [
+        Migration(importlib.import_module(f"{versions.__name__}.{info.name}"))
+        for info in pkgutil.iter_modules(versions.__path__)
+        if info.name.startswith("v")
+    ]
+    migrations.sort(key=lambda migration: migration.version)
+    for expected, migration in enumerate(migrations, start=1):
+        if migration.version != expected:
+            raise SchemaVersionError(f"Missing migration {expected:04d}")
+    return migrations
+
+
+def head_version() -> int:
+    """The version the current code expects"""
+    migrations = load_migrations()
+    return migrations[-1].version if migrations else 0
+
+
+class Operations:
+    """Schema changes available to migrations
+
+    Every operation checks whether its change is already there first.
+    """
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+
+    def has_table(self, table_name: str) -> bool:
+        return inspect(self.engine).has_table(table_name)
+
+    def has_column(self, table_name: str, column_name: str) -> bool:
+        return any(
+            column["name"] == column_name
+            for column in inspect(self.engine).get_columns(table_name)
+        )
+
+    def column_type(self, table_name: str, column_name: str) -> str:
+        """The column's type as the database reports it, e.g. TEXT or JSONB"""
+        for column in inspect(self.engine).get_columns(table_name):
+            if column["name"] == column_name:
+                return str(column["type"].compile(dialect=self.engine.dialect))
+        raise KeyError(f"{table_name}.{column_name}")
+
+    def create_table(self, table: Table) -> None:
+        """Create a table together with its indexes"""
+        table.create(self.engine, checkfirst=True)
+
+    def add_column(self, column: Column) -> None:
+        """Add a column defined on one of the models' tables"""
+        table_name = column.table.name
+        if self.has_column(table_name, column.name):
+            return
+        with self.engine.begin() as connection:
+            column_ddl = CreateColumn(column).compile(dialect=connection.dialect)
+            table = connection.dialect.identifier_preparer.format_table(column.table)
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column_ddl}"))
+
+    def create_index(self, index: Index) -> None:
+        """Build an index while the database stays in use
+
+        PostgreSQL builds it concurrently, without blocking writes. SQLite has
+        no concurrent builds, so each index gets its own short transaction and
+        writers wait for one index at a time rather than for the whole
+        migration.
+        """
+        if self.engine.dialect.name == "postgresql":
+            # CREATE INDEX CONCURRENTLY can't run inside a transaction
+            with self.engine.connect().execution_options(
+                isolation_level="AUTOCOMMIT"
+            ) as connection:
+                self._create_index_concurrently(connection, index)
+        else:
+            with self.engine.begin() as connection:
+                connection.execute(CreateIndex(index, if_not_exists=True))
+        logger.info("Created index %s", index.name)
+
+    def _create_index_concurrently(self, connection: Connection, index: Index) -> None:
+        preparer = connection.dialect.identifier_preparer
+        name = preparer.quote(index.name)
+        # An interrupted concurrent build leaves an invalid index behind
+        invalid = connection.execute(
+            text(
+                "SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid"
+                " WHERE pg_class.relname = :name AND NOT pg_index.indisvalid"
+            ),
+            {"name": index.name},
+        ).first()
+        if invalid:
+            connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+        columns = ", ".join(preparer.quote(column.name) for column in index.columns)
+        unique = "UNIQUE " if index.unique else ""
+        connection.execute(
+            text(
+                f"CREATE {unique}INDEX CONCURRENTLY IF NOT EXISTS {name}"
+                f" ON {preparer.format_table(index.table)} ({columns})"
+            )
+        )
+
+    def execute(self, statement):
+        """Run a statement in its own transaction"""
+        with self.engine.begin() as connection:
+            return connection.execute(statement)
+
+
+def current_version(connection: Connection) -> Optional[int]:
+    """The schema version of the database, or None if it has no tables at all"""
+    inspector = inspect(connection)
+    if not inspector.has_table(schema_version.name):
+        return 0 if inspector.get_table_names() else None
+    return connection.execute(schema_version.select()).scalar() or 0
+
+
+def _stamp(engine: Engine, version: int) -> None:
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(schema_version.delete())
+        connection.execute(schema_version.insert().values(version=version))
+
+
+def upgrade(engine: Engine, target: Optional[int] = None) -> int:
+    """Apply all migrations up to target (default: the latest); returns the version"""
+    migrations = load_migrations()
+    head = migrations[-1].version if migrations else 0
+    target = head if target is None else target
+    if target > head:
+        raise SchemaVersionError(f"Unknown schema version {target}, latest is {head}")
+
+    with engine.connect() as connection:
+        version = current_version(connection)
+
+    if version is None:
+        logger.info("Creating new database at version %s", head)
+        models.Base.metadata.create_all(engine)
+        _stamp(engine, head)
+        return head
+
+    if version > target:
+        raise SchemaVersionError(
+            f"Database is at version {version}, newer than {target}; downgrades"
+            " are not supported"
+        )
+
+    op = Operations(engine)
+    for migration in migrations:
+        if version < migration.version <= target:
+            logger.info(
+                "Upgrading to %04d: %s", migration.version, migration.description
+            )
+            migration.upgrade(op)
+            _stamp(engine, migration.version)
+            version = migration.version
+    return version
+
+
+def check_schema(engine: Engine) -> None:
+    """Make sure the database is at the latest version, without changing it"""
+    head = head_version()
+    with engine.connect() as connection:
+        version = current_version(connection)
+    if version != head:
+        state = "has no tables" if version is None else f"is at version {version}"
+        raise SchemaVersionError(
+            f"Database schema {state}, expected version {head}. Run"
+            " `python -m app.migrations upgrade` in the backend directory."
+        )
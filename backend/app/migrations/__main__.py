@@ -0,0 +1,48 @@
+"""
+Command line interface for schema migrations
+
+    python -m app.migrations upgrade [--to VERSION]
+    python -m app.migrations current
+    python -m app.migrations history
+"""
+import argparse
+import logging
+from ..database import engine
+from . import current_version, load_migrations, upgrade
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m app.migrations", description="Manage the database schema"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    upgrade_parser = commands.add_parser("upgrade", help="apply pending migrations")
+    upgrade_parser.add_argument(
+        "--to", type=int, help="version to upgrade to (default: latest)"
+    )
+    commands.add_parser("current", help="show the database's schema version")
+    commands.add_parser("history", help="list all migrations")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.command == "upgrade":
+        version = upgrade(engine, args.to)
+        print(f"Database is at version {version}")
+    elif args.command == "current":
+        with engine.connect() as connection:
+            version = current_version(connection)
+        if version is None:
+            print("Database has no tables; run `upgrade` to create them")
+            return
+        print(f"Database is at version {version}")
+        for migration in load_migrations():
+            if migration.version > version:
+                print(f"  pending {migration.version:04d}: {migration.description}")
+    elif args.command == "history":
+        for migration in load_migrations():
+            print(f"{migration.version:04d}: {migration.description}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""Add the system prompt to prompt versions"""
+from ... import models
+
+
+def upgrade(op):
+    op.add_column(models.PromptVersion.__table__.c.system_prompt)
@@ -0,0 +1,7 @@
+"""Add background jobs and their cells"""
+from ... import models
+
+
+def upgrade(op):
+    op.create_table(models.Job.__table__)
+    op.create_table(models.JobCell.__table__)
@@ -0,0 +1,9 @@
+"""Add cache keys to outputs"""
+from ... import models
+
+
+def upgrade(op):
+    outputs = models.Output.__table__
+    op.add_column(outputs.c.cache_key)
+    op.add_column(outputs.c.cached)
+    op.create_index(next(i for i in outputs.indexes if i.name == "ix_outputs_cache_key"))
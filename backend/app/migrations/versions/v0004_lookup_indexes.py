@@ -0,0 +1,44 @@
+"""Index output and evaluation lookups, one evaluation per output"""
+import logging
+from sqlalchemy import Index, func, select
+from ... import models
+
+logger = logging.getLogger(__name__)
+
+
+def _index(model, name: str) -> Index:
+    return next(index for index in model.__table__.indexes if index.name == name)
+
+
+LOOKUP_INDEXES = [
+    _index(models.Output, "ix_outputs_lookup"),
+    _index(models.Output, "ix_outputs_model_id"),
+    _index(models.Output, "ix_outputs_prompt_id"),
+    _index(models.Output, "ix_outputs_prompt_version_id"),
+    _index(models.Evaluation, "ix_evaluations_output_id"),
+    _index(models.PromptVersion, "ix_prompt_versions_prompt_id"),
+]
+
+
+def remove_duplicate_evaluations(op) -> int:
+    """Keep the first evaluation of each output, which is the one that was updated"""
+    evaluations = models.Evaluation.__table__
+    keep = (
+        select(func.min(evaluations.c.id))
+        .where(evaluations.c.output_id.is_not(None))
+        .group_by(evaluations.c.output_id)
+    )
+    result = op.execute(
+        evaluations.delete().where(
+            evaluations.c.output_id.is_not(None), evaluations.c.id.not_in(keep)
+        )
+    )
+    return result.rowcount
+
+
+def upgrade(op):
+    removed = remove_duplicate_evaluations(op)
+    if removed:
+        logger.warning(f"Removed {removed} duplicate evaluations")
+    for index in LOOKUP_INDEXES:
+        op.create_index(index)
@@ -0,0 +1,13 @@
+"""Store job payloads as JSON documents"""
+from sqlalchemy import text
+
+
+def upgrade(op):
+    # SQLite keeps JSON as text, so only PostgreSQL needs the new type
+    if op.engine.dialect.name != "postgresql":
+        return
+    if op.column_type("jobs", "payload").lower() == "jsonb":
+        return
+    op.execute(
+        text("ALTER TABLE jobs ALTER COLUMN payload TYPE JSONB USING payload::jsonb")
+    )
@@ -0,0 +1,46 @@
+"""Add content hashes to inputs for deduplicating imports"""
+import logging
+from sqlalchemy import bindparam, select
+from ... import config
+from ... import models
+from ...services.ingest_service import content_hash
+
+logger = logging.getLogger(__name__)
+
+
+def backfill_content_hashes(op) -> int:
+    """Hash the text of existing inputs, one batch per transaction"""
+    inputs = models.Input.__table__
+    update = (
+        inputs.update()
+        .where(inputs.c.id == bindparam("input_id"))
+        .values(content_hash=bindparam("hash"))
+    )
+    hashed = 0
+    with op.engine.connect() as connection:
+        while True:
+            rows = connection.execute(
+                select(inputs.c.id, inputs.c.text)
+                .where(inputs.c.content_hash.is_(None))
+                .order_by(inputs.c.id)
+                .limit(config.DB_YIELD_PER)
+            ).all()
+            if not rows:
+                return hashed
+            connection.execute(
+                update,
+                [{"input_id": row.id, "hash": content_hash(row.text)} for row in rows],
+            )
+            connection.commit()
+            hashed += len(rows)
+
+
+def upgrade(op):
+    inputs = models.Input.__table__
+    op.add_column(inputs.c.content_hash)
+    hashed = backfill_content_hashes(op)
+    if hashed:
+        logger.info(f"Hashed {hashed} existing inputs")
+    op.create_index(
+        next(i for i in inputs.indexes if i.name == "ix_inputs_set_content_hash")
+    )
@@ -0,0 +1,14 @@
+"""Add evaluation runs over input sets and job run statistics"""
+from ... import models
+
+
+def upgrade(op):
+    jobs = models.Job.__table__
+    op.add_column(jobs.c.input_set_id)
+    op.add_column(jobs.c.processing_time)
+    op.add_column(jobs.c.run_time)
+    op.create_index(next(i for i in jobs.indexes if i.name == "ix_jobs_input_set_id"))
+    job_cells = models.JobCell.__table__
+    op.create_index(
+        next(i for i in job_cells.indexes if i.name == "ix_job_cells_job_status")
+    )
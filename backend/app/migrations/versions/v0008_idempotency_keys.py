@@ -0,0 +1,10 @@
+"""Add idempotency keys to jobs"""
+from ... import models
+
+
+def upgrade(op):
+    jobs = models.Job.__table__
+    op.add_column(jobs.c.idempotency_key)
+    op.create_index(
+        next(i for i in jobs.indexes if i.name == "ix_jobs_idempotency_key")
+    )
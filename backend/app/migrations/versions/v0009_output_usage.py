@@ -0,0 +1,11 @@
+"""Add token usage, latency and cost to outputs"""
+from ... import models
+
+
+def upgrade(op):
+    outputs = models.Output.__table__
+    op.add_column(outputs.c.input_tokens)
+    op.add_column(outputs.c.output_tokens)
+    op.add_column(outputs.c.time_to_first_token)
+    op.add_column(outputs.c.tokens_per_second)
+    op.add_column(outputs.c.cost)
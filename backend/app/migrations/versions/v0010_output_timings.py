@@ -0,0 +1,9 @@
+"""Add queue wait, generation time and error flags to outputs"""
+from ... import models
+
+
+def upgrade(op):
+    outputs = models.Output.__table__
+    op.add_column(outputs.c.queue_wait)
+    op.add_column(outputs.c.generation_time)
+    op.add_column(outputs.c.error)
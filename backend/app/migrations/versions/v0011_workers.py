@@ -0,0 +1,8 @@
+"""Add server workers and the worker running each job and cell"""
+from ... import models
+
+
+def upgrade(op):
+    op.create_table(models.Worker.__table__)
+    op.add_column(models.Job.__table__.c.worker_id)
+    op.add_column(models.JobCell.__table__.c.worker_id)
@@ -1,9 +1,25 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Text, DateTime, Enum
+from sqlalchemy import (
+    Boolean,
+    Column,
+    Integer,
+    String,
+    Float,
+    ForeignKey,
+    Text,
+    DateTime,
+    Enum,
+    Index,
+    JSON,
+)
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 import datetime
 import enum
 from .database import Base
 
+# JSON documents; PostgreSQL stores them as JSONB so they can be queried
+JSONDocument = JSON().with_variant(JSONB(), "postgresql")
+
 
 class QualityRating(enum.Enum):
     BAD = "bad"
@@ -31,11 +47,17 @@ class Input(Base):
     input_set_id = Column(Integer, ForeignKey("input_sets.id"), nullable=True)
     text = Column(Text, nullable=False)
     name = Column(String, nullable=True)  # Optional name for identification
+    # SHA-256 of the text, to skip duplicates when importing into a set
+    content_hash = Column(String(64), nullable=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
     input_set = relationship("InputSet", back_populates="inputs")
     outputs = relationship("Output", back_populates="input")
 
+    __table_args__ = (
+        Index("ix_inputs_set_content_hash", "input_set_id", "content_hash"),
+    )
+
 
 class LLMModel(Base):
     __tablename__ = "models"
@@ -64,7 +86,7 @@ class PromptVersion(Base):
     __tablename__ = "prompt_versions"
 
     id = Column(Integer, primary_key=True, index=True)
-    prompt_id = Column(Integer, ForeignKey("prompts.id"))
+    prompt_id = Column(Integer, ForeignKey("prompts.id"), index=True)
     version_number = Column(Integer)
     template = Column(Text, nullable=False)
     system_prompt = Column(Text, nullable=True)  # New field for system prompts
@@ -79,12 +101,29 @@ class Output(Base):
     __tablename__ = "outputs"
 
     id = Column(Integer, primary_key=True, index=True)
+    # input_id lookups use the leading column of ix_outputs_lookup
     input_id = Column(Integer, ForeignKey("inputs.id"))
-    model_id = Column(Integer, ForeignKey("models.id"))
-    prompt_id = Column(Integer, ForeignKey("prompts.id"))
-    prompt_version_id = Column(Integer, ForeignKey("prompt_versions.id"), nullable=True)
+    model_id = Column(Integer, ForeignKey("models.id"), index=True)
+    prompt_id = Column(Integer, ForeignKey("prompts.id"), index=True)
+    prompt_version_id = Column(
+        Integer, ForeignKey("prompt_versions.id"), nullable=True, index=True
+    )
     text = Column(Text, nullable=False)
-    processing_time = Column(Float)  # Time in seconds
+    processing_time = Column(Float)  # Seconds the model call took
+    # Seconds waiting for a scheduler slot, and generating after the first token
+    queue_wait = Column(Float, nullable=True)
+    generation_time = Column(Float, nullable=True)
+    # Set on failed generations, whose text is the error message
+    error = Column(Text, nullable=True)
+    # Token usage, latency and estimated cost of the generation
+    input_tokens = Column(Integer, nullable=True)
+    output_tokens = Column(Integer, nullable=True)
+    time_to_first_token = Column(Float, nullable=True)  # Seconds
+    tokens_per_second = Column(Float, nullable=True)  # Output tokens while generating
+    cost = Column(Float, nullable=True)  # In the currency of MODEL_PRICES
+    # Hash of model, rendered prompt, system prompt and options
+    cache_key = Column(String, nullable=True, index=True)
+    cached = Column(Boolean, default=False)  # Copied from an earlier generation
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
     input = relationship("Input", back_populates="outputs")
@@ -93,14 +132,112 @@ class Output(Base):
     prompt_version = relationship("PromptVersion", back_populates="outputs")
     evaluation = relationship("Evaluation", back_populates="output", uselist=False)
 
+    __table_args__ = (
+        # Finds an existing output for an input/model/prompt version combination
+        Index(
+            "ix_outputs_lookup", "input_id", "model_id", "prompt_id", "prompt_version_id"
+        ),
+    )
+
 
 class Evaluation(Base):
     __tablename__ = "evaluations"
 
     id = Column(Integer, primary_key=True, index=True)
-    output_id = Column(Integer, ForeignKey("outputs.id"))
+    # At most one evaluation per output
+    output_id = Column(Integer, ForeignKey("outputs.id"), unique=True, index=True)
     quality = Column(String, nullable=False)  # Change from Enum to String
     notes = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
     output = relationship("Output", back_populates="evaluation")
+
+
+class JobStatus(str, enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class JobKind(str, enum.Enum):
+    PROCESS = "process"
+    BATCH_PROCESS = "batch_process"
+    COMPARE_PROMPTS = "compare_prompts"
+    EVALUATION_RUN = "evaluation_run"
+
+
+class CellStatus(str, enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+# Background job processing a grid of inputs x models x prompt versions
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)
+    status = Column(String, nullable=False, default=JobStatus.QUEUED.value, index=True)
+    payload = Column(JSONDocument, nullable=True)  # Request options
+    # Client-chosen key; a retried request with the same key gets this job
+    idempotency_key = Column(String, nullable=True, unique=True, index=True)
+    # The input set an evaluation run covers
+    input_set_id = Column(
+        Integer, ForeignKey("input_sets.id"), nullable=True, index=True
+    )
+    error = Column(Text, nullable=True)
+    # The worker that owns a running job and completes it
+    worker_id = Column(String, nullable=True)
+    # Seconds the models spent generating, summed over cells
+    processing_time = Column(Float, nullable=True, default=0.0)
+    # Wall-clock seconds spent processing cells, across restarts
+    run_time = Column(Float, nullable=True, default=0.0)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    cells = relationship("JobCell", back_populates="job")
+    input_set = relationship("InputSet")
+
+
+# One model/prompt version/input combination of a job
+class JobCell(Base):
+    __tablename__ = "job_cells"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("jobs.id"), nullable=False, index=True)
+    input_id = Column(Integer, ForeignKey("inputs.id"), nullable=False)
+    model_id = Column(Integer, ForeignKey("models.id"), nullable=False)
+    prompt_id = Column(Integer, ForeignKey("prompts.id"), nullable=False)
+    prompt_version_id = Column(Integer, ForeignKey("prompt_versions.id"), nullable=False)
+    status = Column(String, nullable=False, default=CellStatus.PENDING.value)
+    output_id = Column(Integer, ForeignKey("outputs.id"), nullable=True)
+    error = Column(Text, nullable=True)
+    # The worker generating a running cell
+    worker_id = Column(String, nullable=True)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    job = relationship("Job", back_populates="cells")
+    input = relationship("Input")
+    model = relationship("LLMModel")
+    prompt_version = relationship("PromptVersion")
+    output = relationship("Output")
+
+    __table_args__ = (
+        # Finds the pending cells of a job
+        Index("ix_job_cells_job_status", "job_id", "status"),
+    )
+
+
+# A server process running jobs, alive while its heartbeat is recent
+class Worker(Base):
+    __tablename__ = "workers"
+
+    id = Column(String, primary_key=True)
+    hostname = Column(String, nullable=False)
+    pid = Column(Integer, nullable=False)
+    started_at = Column(DateTime, default=datetime.datetime.utcnow)
+    heartbeat_at = Column(DateTime, default=datetime.datetime.utcnow)
@@ -61,6 +61,13 @@ class InputSetDetail(InputSet):
     inputs: List[Input] = []
 
 
+class InputImport(BaseModel):
+    input_set_id: int
+    received: int  # Rows in the upload
+    imported: int
+    duplicates: int  # Skipped because the set already had the text
+
+
 # Model schemas
 class LLMModelBase(BaseModel):
     name: str
@@ -125,7 +132,7 @@ class PromptDetail(Prompt):
 # Output schemas
 class OutputBase(BaseModel):
     text: str
-    processing_time: float
+    processing_time: Optional[float] = None  # None for copies from the cache
 
 
 class OutputCreate(OutputBase):
@@ -141,6 +148,15 @@ class Output(OutputBase):
     model_id: int
     prompt_id: int
     prompt_version_id: Optional[int] = None
+    queue_wait: Optional[float] = None  # Seconds
+    generation_time: Optional[float] = None  # Seconds after the first token
+    error: Optional[str] = None  # Set if the generation failed
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    time_to_first_token: Optional[float] = None  # Seconds
+    tokens_per_second: Optional[float] = None
+    cost: Optional[float] = None
+    cached: bool = False
     created_at: datetime
 
     model_config = {"from_attributes": True}
@@ -170,6 +186,7 @@ class ProcessRequest(BaseModel):
     model_ids: List[int]
     prompt_ids: List[int]
     prompt_version_ids: Optional[Dict[int, int]] = None  # Map prompt_id to version_id
+    use_cache: bool = True  # Set to False to force new generations
 
 
 class BatchProcessRequest(BaseModel):
@@ -177,6 +194,7 @@ class BatchProcessRequest(BaseModel):
     model_ids: List[int]
     prompt_ids: List[int]
     prompt_version_ids: Optional[Dict[int, int]] = None
+    use_cache: bool = True
 
 
 # New: For comparing prompts
@@ -185,8 +203,72 @@ class ComparePromptsRequest(BaseModel):
     prompt_ids: List[int]
     model_ids: List[int]
     prompt_version_ids: Optional[Dict[int, int]] = None  # Map prompt_id to version_id
+    use_cache: bool = True  # Set to False to regenerate existing combinations
+
+
+# Evaluation of every input in a set against a grid of models and prompts
+class EvaluationRunRequest(BaseModel):
+    input_set_id: int
+    model_ids: List[int]
+    prompt_ids: List[int]
+    prompt_version_ids: Optional[Dict[int, int]] = None  # Map prompt_id to version_id
+    use_cache: bool = True
 
 
 class ProcessResult(BaseModel):
     input_id: int
     results: List[Output]
+
+
+# Background jobs
+class Job(BaseModel):
+    id: int
+    kind: str
+    status: str
+    total_cells: int = 0
+    pending_cells: int = 0
+    running_cells: int = 0
+    completed_cells: int = 0
+    failed_cells: int = 0
+    input_set_id: Optional[int] = None
+    processing_time: float = 0.0  # Generation seconds summed over cells
+    run_time: float = 0.0  # Wall-clock seconds spent processing
+    throughput: Optional[float] = None  # Cells per second of run time
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+# Token usage, cost and latency of the outputs of one model and prompt version.
+# Averages and token counts cover successful generations, not cached copies
+# or errors.
+class UsageSummary(BaseModel):
+    model_id: Optional[int] = None
+    model_name: Optional[str] = None
+    prompt_id: Optional[int] = None
+    prompt_name: Optional[str] = None
+    prompt_version_id: Optional[int] = None
+    prompt_version_number: Optional[int] = None
+    outputs: int = 0
+    generated: int = 0
+    errors: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cost: Optional[float] = None
+    avg_cost: Optional[float] = None
+    avg_processing_time: Optional[float] = None
+    avg_queue_wait: Optional[float] = None
+    avg_time_to_first_token: Optional[float] = None
+    avg_tokens_per_second: Optional[float] = None
+
+
+class CacheStats(BaseModel):
+    hits: int
+    misses: int
+    hit_rate: float
+
+
+class ModelCatalogueRefresh(BaseModel):
+    models: int
+    added: int
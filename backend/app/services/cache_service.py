@@ -0,0 +1,74 @@
+import hashlib
+import json
+import logging
+import threading
+from typing import List, Dict, Any, Optional
+from sqlalchemy.orm import Session
+from .. import models
+
+logger = logging.getLogger(__name__)
+
+# Stay below SQLite's limit on bound parameters per statement
+LOOKUP_CHUNK_SIZE = 500
+
+
+class CacheService:
+    """Content-addressed cache of generations
+
+    Outputs are keyed by a hash of everything that determines what the model
+    is asked: model name, rendered prompt, system prompt and generation
+    options. Any stored output with the same key can be reused, regardless of
+    which input, prompt or endpoint produced it.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(
+        model_name: str,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        options: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """Hash the parameters of a generation into a cache key"""
+        payload = json.dumps(
+            [model_name, prompt, system_prompt, options or {}],
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def lookup(self, db: Session, keys: List[str]) -> Dict[str, models.Output]:
+        """Find a stored output for each key, counting hits and misses"""
+        found: Dict[str, models.Output] = {}
+        unique_keys = list(dict.fromkeys(keys))
+        for start in range(0, len(unique_keys), LOOKUP_CHUNK_SIZE):
+            chunk = unique_keys[start : start + LOOKUP_CHUNK_SIZE]
+            outputs = (
+                db.query(models.Output)
+                .filter(models.Output.cache_key.in_(chunk))
+                .order_by(models.Output.id.desc())
+                .all()
+            )
+            for output in outputs:
+                found.setdefault(output.cache_key, output)
+
+        hits = sum(1 for key in keys if key in found)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return found
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters since startup"""
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
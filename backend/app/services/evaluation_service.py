@@ -1,20 +1,72 @@
+import asyncio
+import base64
+import datetime
 import logging
-from typing import List, Dict, Any, Optional
-from sqlalchemy.orm import Session
+import queue
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import (
+    List,
+    Dict,
+    Any,
+    Optional,
+    Tuple,
+    Iterator,
+    AsyncIterator,
+    Callable,
+    Awaitable,
+    Hashable,
+    Union,
+)
+from sqlalchemy import and_, bindparam, func, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, contains_eager, joinedload
+from .. import config
 from .. import models
+from ..logging_config import SampledLogger
 from .. import schemas
+from .cache_service import LOOKUP_CHUNK_SIZE, CacheService
 from .llm_service import LLMService
+from .output_writer_service import OutputWriterService
 from .prompt_service import PromptService
+from .scheduler_service import SchedulerService, estimate_tokens, new_request_key
+from .timing_service import TimingService, seconds_since
+from .worker_service import current_worker_id
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+# Failures of single cells are sampled; job summaries are logged in full
+cell_logger = SampledLogger(logger)
+
+Generation = Tuple[str, str, str, Optional[str]]
+
+
+class IdempotencyConflict(Exception):
+    """An idempotency key belongs to another kind of request or one still running"""
+
+    def __init__(self, message: str, job_id: Optional[int] = None):
+        super().__init__(message)
+        self.job_id = job_id
 
 
 class EvaluationService:
-    def __init__(self, llm_service: LLMService):
+    def __init__(
+        self,
+        llm_service: LLMService,
+        max_workers: int = config.MAX_WORKERS,
+    ):
         self.llm_service = llm_service
         self.prompt_service = PromptService()
+        self.cache = CacheService()
+
+        # Shared pool for model calls; the scheduler decides when each call
+        # may reach its model
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="generation"
+        )
+        self.scheduler = SchedulerService()
+        self.output_writer = OutputWriterService()
+        self.timing = TimingService()
         logger.info("EvaluationService initialized")
 
     def create_input(
@@ -51,40 +103,8 @@ class EvaluationService:
         self, db: Session, skip: int = 0, limit: int = 100
     ) -> List[models.LLMModel]:
         """Get all models with pagination"""
-        # IMPORTANT FIX: First ensure LLM models are synchronized with the database
-        self.sync_models_with_db(db)
-
         return db.query(models.LLMModel).offset(skip).limit(limit).all()
 
-    def sync_models_with_db(self, db: Session) -> None:
-        """Synchronize models from LLMService with the database"""
-        logger.info("Synchronizing models with database")
-
-        # Get models from LLMService
-        service_models = self.llm_service.get_available_models()
-        logger.info(f"Found {len(service_models)} models from LLMService")
-
-        # Get existing models from database
-        db_models = db.query(models.LLMModel).all()
-        db_model_names = {model.name for model in db_models}
-
-        # Add missing models to database
-        models_added = 0
-        for model_info in service_models:
-            if model_info["name"] not in db_model_names:
-                logger.info(f"Adding new model to database: {model_info['name']}")
-                db_model = models.LLMModel(
-                    name=model_info["name"], description=model_info["description"]
-                )
-                db.add(db_model)
-                models_added += 1
-
-        if models_added > 0:
-            logger.info(f"Added {models_added} new models to database")
-            db.commit()
-        else:
-            logger.info("No new models to add to database")
-
     def _get_prompt_version(
         self, db: Session, prompt_id: int, version_id: Optional[int] = None
     ) -> Optional[models.PromptVersion]:
@@ -103,304 +123,1210 @@ class EvaluationService:
                 .first()
             )
 
-    # Update process_text method to use system_prompt
-    def process_text(
-        self, db: Session, request: schemas.ProcessRequest
+    def resolve_prompts(
+        self,
+        db: Session,
+        prompt_ids: List[int],
+        prompt_version_ids: Optional[Dict[int, int]] = None,
+    ) -> List[Tuple[models.Prompt, models.PromptVersion]]:
+        """Resolve prompt ids to (prompt, version) pairs, skipping missing ones
+
+        Uses the version mapped in prompt_version_ids or the latest version.
+        """
+        prompts = []
+        for prompt_id in prompt_ids:
+            db_prompt = (
+                db.query(models.Prompt).filter(models.Prompt.id == prompt_id).first()
+            )
+            if not db_prompt:
+                logger.warning("Prompt with ID %s not found", prompt_id)
+                continue
+
+            # Get the specific prompt version or latest
+            prompt_version_id = (
+                prompt_version_ids.get(prompt_id) if prompt_version_ids else None
+            )
+            db_prompt_version = self._get_prompt_version(
+                db, prompt_id, prompt_version_id
+            )
+
+            if not db_prompt_version:
+                logger.warning("Prompt version not found for prompt ID %s", prompt_id)
+                continue
+
+            prompts.append((db_prompt, db_prompt_version))
+
+        return prompts
+
+    def generate(
+        self,
+        model_name: str,
+        prompt_template: str,
+        input_text: str,
+        system_prompt: Optional[str] = None,
+        on_chunk: Optional[Callable[[str], None]] = None,
+        request_key: Hashable = None,
+    ) -> Dict[str, Any]:
+        """Run a single generation once the scheduler grants it a slot"""
+        return self.submit_generation(
+            model_name,
+            prompt_template,
+            input_text,
+            system_prompt=system_prompt,
+            on_chunk=on_chunk,
+            request_key=request_key,
+        ).result()
+
+    def submit_generation(
+        self,
+        model_name: str,
+        prompt_template: str,
+        input_text: str,
+        system_prompt: Optional[str] = None,
+        on_chunk: Optional[Callable[[str], None]] = None,
+        request_key: Hashable = None,
+    ) -> Future:
+        """Queue a generation; the future resolves to its output data
+
+        The scheduler hands the call to the shared pool only once the model
+        grants it a slot, so a slow or rate-limited model can't take the
+        threads other models need.
+        """
+        scheduled = self.scheduler.submit(
+            self.executor,
+            model_name,
+            lambda: self.llm_service.process_text(
+                model_name,
+                prompt_template,
+                input_text,
+                system_prompt=system_prompt,
+                on_chunk=on_chunk,
+            ),
+            request_key=request_key,
+            tokens=estimate_tokens(prompt_template, input_text, system_prompt),
+        )
+        generated: Future = Future()
+
+        def record(scheduled: Future) -> None:
+            try:
+                output_data = scheduled.result()
+            except BaseException as e:
+                generated.set_exception(e)
+                return
+            self.timing.record_generation(model_name, output_data)
+            generated.set_result(output_data)
+
+        scheduled.add_done_callback(record)
+        return generated
+
+    async def agenerate(
+        self,
+        model_name: str,
+        prompt_template: str,
+        input_text: str,
+        system_prompt: Optional[str] = None,
+        on_chunk: Optional[Callable[[str], None]] = None,
+        request_key: Hashable = None,
+    ) -> Dict[str, Any]:
+        """Async counterpart of generate, scheduled alongside the sync calls"""
+        output_data = await self.scheduler.arun(
+            model_name,
+            lambda: self.llm_service.aprocess_text(
+                model_name,
+                prompt_template,
+                input_text,
+                system_prompt=system_prompt,
+                on_chunk=on_chunk,
+            ),
+            request_key=request_key,
+            tokens=estimate_tokens(prompt_template, input_text, system_prompt),
+        )
+        self.timing.record_generation(model_name, output_data)
+        return output_data
+
+    def _cache_keys(
+        self, generations: List[Tuple[str, str, str, Optional[str]]]
+    ) -> List[str]:
+        return [
+            self.cache.make_key(
+                model_name,
+                self.llm_service.render_prompt(prompt_template, input_text),
+                system_prompt,
+            )
+            for model_name, prompt_template, input_text, system_prompt in generations
+        ]
+
+    def _cached_result(self, cached_output: models.Output, key: str) -> Dict[str, Any]:
+        # A copy costs nothing (if its model has a price) and has no latency
+        # of its own, so it doesn't count in latency statistics
+        return {
+            "text": cached_output.text,
+            "processing_time": None,
+            "error": None,
+            "input_tokens": cached_output.input_tokens,
+            "output_tokens": cached_output.output_tokens,
+            "cost": None if cached_output.cost is None else 0.0,
+            "cache_key": key,
+            "cached": True,
+        }
+
+    def execute(
+        self,
+        db: Session,
+        generations: List[Tuple[str, str, str, Optional[str]]],
+        stream: bool = False,
+        use_cache: bool = True,
+        request_key: Hashable = None,
+    ) -> Iterator[Tuple[str, int, Any]]:
+        """Run generations concurrently and yield events as they arrive
+
+        Each generation is a (model_name, prompt_template, input_text,
+        system_prompt) tuple. Yields ("chunk", position, text) for streamed
+        tokens when stream is set, then exactly one ("result", position,
+        output_data) or ("error", position, exception) per generation.
+        Generations found in the cache are yielded first without calling
+        the model, unless use_cache is False. All generations share
+        request_key in the scheduler's fair queue.
+        """
+        if request_key is None:
+            request_key = new_request_key()
+        keys = self._cache_keys(generations)
+        cached = self.cache.lookup(db, keys) if use_cache else {}
+
+        events: queue.Queue = queue.Queue()
+
+        def run(position: int, generation: Tuple[str, str, str, Optional[str]]):
+            on_chunk = None
+            if stream:
+                on_chunk = lambda chunk: events.put(("chunk", position, chunk))
+            model_name, prompt_template, input_text, system_prompt = generation
+            self.submit_generation(
+                model_name,
+                prompt_template,
+                input_text,
+                system_prompt=system_prompt,
+                on_chunk=on_chunk,
+                request_key=request_key,
+            ).add_done_callback(lambda future: finish(position, future))
+
+        def finish(position: int, future: Future) -> None:
+            try:
+                output_data = future.result()
+                output_data["cache_key"] = keys[position]
+                events.put(("result", position, output_data))
+            except Exception as e:
+                events.put(("error", position, e))
+
+        hits = []
+        for position, generation in enumerate(generations):
+            cached_output = cached.get(keys[position])
+            if cached_output is not None:
+                hits.append(
+                    ("result", position, self._cached_result(cached_output, keys[position]))
+                )
+            else:
+                run(position, generation)
+
+        # Cache hits are ready right away
+        yield from hits
+
+        remaining = len(generations) - len(hits)
+        while remaining:
+            event = events.get()
+            if event[0] != "chunk":
+                remaining -= 1
+            yield event
+
+    async def aexecute(
+        self,
+        db: AsyncSession,
+        generations: List[Tuple[str, str, str, Optional[str]]],
+        stream: bool = False,
+        use_cache: bool = True,
+        request_key: Hashable = None,
+        persist: Optional[Callable[[int, Dict[str, Any]], Awaitable[Any]]] = None,
+    ) -> AsyncIterator[Tuple[str, int, Any]]:
+        """Async counterpart of execute, running every generation as a task
+
+        If persist is given it is awaited with (position, output_data) inside
+        the generation's task and the "result" event carries its return value,
+        so outputs finishing together are written together. Generations still
+        running when the consumer stops are cancelled.
+        """
+        if request_key is None:
+            request_key = new_request_key()
+        keys = self._cache_keys(generations)
+        cached = await db.run_sync(self.cache.lookup, keys) if use_cache else {}
+
+        events: asyncio.Queue = asyncio.Queue()
+
+        async def finish(position: int, output_data: Dict[str, Any]) -> None:
+            value = output_data
+            if persist is not None:
+                value = await persist(position, output_data)
+            events.put_nowait(("result", position, value))
+
+        async def run(position: int, generation: Tuple[str, str, str, Optional[str]]):
+            on_chunk = None
+            if stream:
+                on_chunk = lambda chunk: events.put_nowait(("chunk", position, chunk))
+            try:
+                cached_output = cached.get(keys[position])
+                if cached_output is not None:
+                    output_data = self._cached_result(cached_output, keys[position])
+                else:
+                    model_name, prompt_template, input_text, system_prompt = generation
+                    output_data = await self.agenerate(
+                        model_name,
+                        prompt_template,
+                        input_text,
+                        system_prompt=system_prompt,
+                        on_chunk=on_chunk,
+                        request_key=request_key,
+                    )
+                    output_data["cache_key"] = keys[position]
+                await finish(position, output_data)
+            except Exception as e:
+                events.put_nowait(("error", position, e))
+
+        # Cache hits are ready right away and only wait for persist
+        tasks = [
+            asyncio.create_task(run(position, generation))
+            for position, generation in enumerate(generations)
+        ]
+
+        try:
+            remaining = len(tasks)
+            while remaining:
+                event = await events.get()
+                if event[0] != "chunk":
+                    remaining -= 1
+                yield event
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def output_row(
+        self,
+        input_id: int,
+        model_id: int,
+        prompt_id: int,
+        prompt_version_id: int,
+        output_data: Dict[str, Any],
     ) -> Dict[str, Any]:
-        """Process a single text with multiple models and prompts"""
-        logger.info(
-            f"Processing text with {len(request.model_ids)} models and {len(request.prompt_ids)} prompts"
+        """Column values of a generated output"""
+        return {
+            "input_id": input_id,
+            "model_id": model_id,
+            "prompt_id": prompt_id,
+            "prompt_version_id": prompt_version_id,
+            "text": output_data["text"],
+            "processing_time": output_data["processing_time"],
+            "queue_wait": output_data.get("queue_wait"),
+            "generation_time": output_data.get("generation_time"),
+            "input_tokens": output_data.get("input_tokens"),
+            "output_tokens": output_data.get("output_tokens"),
+            "time_to_first_token": output_data.get("time_to_first_token"),
+            "tokens_per_second": output_data.get("tokens_per_second"),
+            "cost": output_data.get("cost"),
+            "error": output_data.get("error"),
+            # Failed generations must not be served from the cache
+            "cache_key": None if output_data.get("error") else output_data.get("cache_key"),
+            "cached": output_data.get("cached", False),
+            "created_at": datetime.datetime.utcnow(),
+        }
+
+    def write_output(
+        self,
+        model_name: str,
+        row: Dict[str, Any],
+        job_cell_id: Optional[int] = None,
+    ) -> Future:
+        """Queue an output row for the write-behind buffer, timing its persist"""
+        start_ns = time.perf_counter_ns()
+        future = self.output_writer.write(row, job_cell_id)
+        if not row.get("error"):
+            future.add_done_callback(
+                lambda _: self.timing.observe(
+                    model_name, "persist", seconds_since(start_ns)
+                )
+            )
+        return future
+
+    async def awrite_output(
+        self,
+        model_name: str,
+        row: Dict[str, Any],
+        job_cell_id: Optional[int] = None,
+    ) -> int:
+        """Async counterpart of write_output, returning the id"""
+        return await asyncio.wrap_future(
+            self.write_output(model_name, row, job_cell_id)
+        )
+
+    async def _save_output(
+        self,
+        input_id: int,
+        db_model: models.LLMModel,
+        db_prompt: models.Prompt,
+        db_prompt_version: models.PromptVersion,
+        output_data: Dict[str, Any],
+    ) -> models.Output:
+        """Persist a generated output through the write-behind buffer
+
+        Returns a detached Output carrying the stored values and id.
+        """
+        row = self.output_row(
+            input_id, db_model.id, db_prompt.id, db_prompt_version.id, output_data
+        )
+        output_id = await self.awrite_output(db_model.name, row)
+        return models.Output(id=output_id, **row)
+
+    def _prompt_result(
+        self,
+        db_output: models.Output,
+        db_model: models.LLMModel,
+        db_prompt: models.Prompt,
+        db_prompt_version: models.PromptVersion,
+        is_existing: bool,
+    ) -> Dict[str, Any]:
+        """Describe an output together with the model and prompt version that made it"""
+        return {
+            "output_id": db_output.id,
+            "prompt_id": db_prompt.id,
+            "prompt_name": db_prompt.name,
+            "prompt_version_id": db_prompt_version.id,
+            "prompt_version_number": db_prompt_version.version_number,
+            "prompt_template": db_prompt_version.template,
+            "system_prompt": db_prompt_version.system_prompt,  # Add system prompt
+            "model_id": db_model.id,
+            "model_name": db_model.name,
+            "text": db_output.text,
+            "processing_time": db_output.processing_time,
+            "input_tokens": db_output.input_tokens,
+            "output_tokens": db_output.output_tokens,
+            "time_to_first_token": db_output.time_to_first_token,
+            "tokens_per_second": db_output.tokens_per_second,
+            "cost": db_output.cost,
+            "error": db_output.error,
+            "cached": bool(db_output.cached),
+            "created_at": db_output.created_at,
+            "is_existing": is_existing,
+        }
+
+    def find_job(
+        self, db: Session, kind: str, idempotency_key: Optional[str]
+    ) -> Optional[models.Job]:
+        """The job an earlier request with this idempotency key created, if any"""
+        if not idempotency_key:
+            return None
+        db_job = (
+            db.query(models.Job)
+            .filter(models.Job.idempotency_key == idempotency_key)
+            .first()
+        )
+        if db_job and db_job.kind != kind:
+            raise IdempotencyConflict(
+                f"Idempotency key {idempotency_key!r} was used for a"
+                f" {db_job.kind} request",
+                db_job.id,
+            )
+        return db_job
+
+    def commit_job(self, db: Session, idempotency_key: Optional[str]) -> None:
+        """Commit a new job; a concurrent request may have taken its key first"""
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            if not idempotency_key:
+                raise
+            raise IdempotencyConflict(
+                f"A request with idempotency key {idempotency_key!r} is in progress"
+            )
+
+    def fail_cells(self, db: Session, errors: Dict[int, str]) -> None:
+        """Mark job cells failed unless their output was stored meanwhile
+
+        Doesn't commit, so the caller can record the rest of the job with it.
+        """
+        if not errors:
+            return
+        cells = models.JobCell.__table__
+        db.execute(
+            cells.update()
+            .where(
+                cells.c.id == bindparam("cell_id"),
+                cells.c.status == models.CellStatus.RUNNING.value,
+            )
+            .values(
+                status=models.CellStatus.FAILED.value,
+                error=bindparam("cell_error"),
+                updated_at=datetime.datetime.utcnow(),
+            ),
+            [
+                {"cell_id": cell_id, "cell_error": error}
+                for cell_id, error in errors.items()
+            ],
+        )
+
+    async def _finished_job(
+        self, db: AsyncSession, kind: str, idempotency_key: Optional[str]
+    ) -> Optional[models.Job]:
+        """The finished job of a retried request, to answer it without generating"""
+        db_job = await db.run_sync(self.find_job, kind, idempotency_key)
+        if db_job and db_job.status in (
+            models.JobStatus.QUEUED.value,
+            models.JobStatus.RUNNING.value,
+        ):
+            raise IdempotencyConflict(
+                f"The request with idempotency key {idempotency_key!r} is still"
+                f" running as job {db_job.id}",
+                db_job.id,
+            )
+        return db_job
+
+    def _record_job(
+        self,
+        db: Session,
+        kind: str,
+        payload: Dict[str, Any],
+        idempotency_key: Optional[str],
+        db_cells: List[models.JobCell],
+    ) -> models.Job:
+        """Store the grid of a request processed in the foreground as a running job
+
+        If the server stops before the request finishes, the job is resumed
+        in the background like any other and its outputs aren't lost. The
+        job and its running cells belong to this worker until then.
+
+        The cells are inserted by one executemany rather than a statement
+        each, as a comparison of existing outputs records a done cell per
+        output it reuses. The running cells get their ids afterwards.
+        """
+        worker_id = current_worker_id()
+        db_job = models.Job(
+            kind=kind,
+            status=models.JobStatus.RUNNING.value,
+            payload=payload,
+            idempotency_key=idempotency_key,
+            worker_id=worker_id,
+            started_at=datetime.datetime.utcnow(),
         )
+        db.add(db_job)
+        db.flush()
+
+        running_cells = []
+        for db_cell in db_cells:
+            db_cell.job_id = db_job.id
+            if db_cell.status == models.CellStatus.RUNNING.value:
+                db_cell.worker_id = worker_id
+                running_cells.append(db_cell)
+        if db_cells:
+            # A Core insert, so rows with and without an output share one statement
+            db.execute(
+                models.JobCell.__table__.insert(),
+                [
+                    {
+                        "job_id": db_job.id,
+                        "input_id": db_cell.input_id,
+                        "model_id": db_cell.model_id,
+                        "prompt_id": db_cell.prompt_id,
+                        "prompt_version_id": db_cell.prompt_version_id,
+                        "status": db_cell.status,
+                        "output_id": db_cell.output_id,
+                        "worker_id": db_cell.worker_id,
+                    }
+                    for db_cell in db_cells
+                ],
+            )
+        if running_cells:
+            # Ids follow the order the cells were inserted in
+            cell_ids = db.scalars(
+                select(models.JobCell.id)
+                .where(
+                    models.JobCell.job_id == db_job.id,
+                    models.JobCell.status == models.CellStatus.RUNNING.value,
+                )
+                .order_by(models.JobCell.id)
+            ).all()
+            for db_cell, cell_id in zip(running_cells, cell_ids):
+                db_cell.id = cell_id
+        self.commit_job(db, idempotency_key)
+        return db_job
+
+    async def _run_request_job(
+        self,
+        db: AsyncSession,
+        db_job: models.Job,
+        db_cells: List[models.JobCell],
+        generations: List[Generation],
+        use_cache: bool,
+    ) -> None:
+        """Generate the running cells of a job within the request
+
+        Each output marks its cell done as it is stored. Once all cells have
+        finished the job is completed; if the request ends early, the cells
+        that didn't finish are failed so the job can be resumed.
+        """
+        start = time.perf_counter()
+        processing_time = 0.0
+        errors: Dict[int, str] = {}
+
+        async def persist(position: int, output_data: Dict[str, Any]) -> int:
+            nonlocal processing_time
+            db_cell = db_cells[position]
+            if not output_data.get("cached"):
+                processing_time += output_data.get("processing_time") or 0.0
+            row = self.output_row(
+                db_cell.input_id,
+                db_cell.model_id,
+                db_cell.prompt_id,
+                db_cell.prompt_version_id,
+                output_data,
+            )
+            model_name = generations[position][0]
+            return await self.awrite_output(model_name, row, db_cell.id)
+
+        finished = False
+        try:
+            # All cells of a job share one place in the scheduler's fair queue
+            async for event, position, value in self.aexecute(
+                db,
+                generations,
+                use_cache=use_cache,
+                request_key=("job", db_job.id),
+                persist=persist,
+            ):
+                if event == "error":
+                    cell_id = db_cells[position].id
+                    cell_logger.error(
+                        "Error processing job cell %s: %s",
+                        cell_id,
+                        value,
+                        extra={"job_id": db_job.id, "cell_id": cell_id},
+                    )
+                    errors[cell_id] = str(value)
+            finished = True
+        finally:
+            run_time = time.perf_counter() - start
+            await db.run_sync(
+                self._finish_request_job,
+                db_job,
+                errors,
+                finished,
+                processing_time,
+                run_time,
+            )
+            logger.info(
+                "Job %s %s: %d cells, %d failed in %.2fs",
+                db_job.id,
+                db_job.status,
+                len(db_cells),
+                len(errors),
+                run_time,
+                extra={
+                    "job_id": db_job.id,
+                    "kind": db_job.kind,
+                    "status": db_job.status,
+                    "cells": len(db_cells),
+                    "failed_cells": len(errors),
+                    "processing_time": processing_time,
+                    "run_time": run_time,
+                },
+            )
+
+    def _finish_request_job(
+        self,
+        db: Session,
+        db_job: models.Job,
+        errors: Dict[int, str],
+        finished: bool,
+        processing_time: float,
+        run_time: float,
+    ) -> None:
+        self.fail_cells(db, errors)
+        now = datetime.datetime.utcnow()
+        if finished:
+            db_job.status = models.JobStatus.COMPLETED.value
+        else:
+            # Outputs still in the write buffer mark their cells done later
+            db.query(models.JobCell).filter(
+                models.JobCell.job_id == db_job.id,
+                models.JobCell.status == models.CellStatus.RUNNING.value,
+            ).update(
+                {
+                    models.JobCell.status: models.CellStatus.FAILED.value,
+                    models.JobCell.error: "The request ended before this cell finished",
+                    models.JobCell.updated_at: now,
+                },
+                synchronize_session=False,
+            )
+            db_job.status = models.JobStatus.FAILED.value
+            db_job.error = "The request ended early; resume the job to finish it"
+        db_job.finished_at = now
+        db_job.processing_time = processing_time
+        db_job.run_time = run_time
+        db.commit()
+
+    def _job_outputs(
+        self, db: Session, db_job: models.Job
+    ) -> List[Tuple[models.JobCell, models.Output]]:
+        """The done cells of a job with their outputs, in cell order"""
+        return (
+            db.query(models.JobCell, models.Output)
+            .join(models.Output, models.JobCell.output_id == models.Output.id)
+            .options(
+                joinedload(models.Output.model),
+                joinedload(models.Output.prompt),
+                joinedload(models.Output.input),
+                joinedload(models.Output.prompt_version),
+                joinedload(models.Output.evaluation),
+            )
+            .filter(
+                models.JobCell.job_id == db_job.id,
+                models.JobCell.status == models.CellStatus.DONE.value,
+            )
+            .order_by(models.JobCell.id)
+            .all()
+        )
+
+    def _process_results(self, db: Session, db_job: models.Job) -> List[Dict[str, Any]]:
+        """The response of a process or batch job: its outputs per input"""
+        results = {
+            input_id: {"input_id": input_id, "results": []}
+            for input_id in db_job.payload["input_ids"]
+        }
+        for db_cell, db_output in self._job_outputs(db, db_job):
+            results[db_cell.input_id]["results"].append(db_output)
+        return list(results.values())
+
+    def _comparison_results(
+        self, db: Session, db_job: models.Job
+    ) -> List[Dict[str, Any]]:
+        """The response of a comparison job
+
+        Outputs that are older than the job were reused rather than generated.
+        """
+        input_ids = db_job.payload["input_ids"]
+        db_inputs: Dict[int, models.Input] = {}
+        for start in range(0, len(input_ids), LOOKUP_CHUNK_SIZE):
+            chunk = input_ids[start : start + LOOKUP_CHUNK_SIZE]
+            for db_input in db.query(models.Input).filter(models.Input.id.in_(chunk)):
+                db_inputs[db_input.id] = db_input
+
+        results = {
+            input_id: {
+                "input_id": input_id,
+                "input": db_inputs.get(input_id),
+                "prompt_results": [],
+            }
+            for input_id in input_ids
+        }
+        for db_cell, db_output in self._job_outputs(db, db_job):
+            results[db_cell.input_id]["prompt_results"].append(
+                self._prompt_result(
+                    db_output,
+                    db_output.model,
+                    db_output.prompt,
+                    db_output.prompt_version,
+                    db_output.created_at < db_job.created_at,
+                )
+            )
+        return list(results.values())
 
+    def _plan_process(
+        self, db: Session, request: schemas.ProcessRequest
+    ) -> Tuple[
+        models.Input,
+        List[Tuple[models.LLMModel, models.Prompt, models.PromptVersion]],
+    ]:
+        """Create the input of a process request and list its model/prompt combinations"""
         # Create input
         db_input = models.Input(text=request.text)
         db.add(db_input)
         db.commit()
         db.refresh(db_input)
 
-        results = []
+        # Resolve every prompt once, then pair it with each model
+        prompts = self.resolve_prompts(
+            db, request.prompt_ids, request.prompt_version_ids
+        )
 
-        # Process with each model and prompt combination
+        cells = []
         for model_id in request.model_ids:
             db_model = self.get_model(db, model_id)
             if not db_model:
-                logger.warning(f"Model with ID {model_id} not found")
+                logger.warning("Model with ID %s not found", model_id)
                 continue
 
-            for prompt_id in request.prompt_ids:
-                db_prompt = (
-                    db.query(models.Prompt)
-                    .filter(models.Prompt.id == prompt_id)
-                    .first()
-                )
-                if not db_prompt:
-                    logger.warning(f"Prompt with ID {prompt_id} not found")
-                    continue
-
-                # Get the specific prompt version or latest
-                prompt_version_id = (
-                    request.prompt_version_ids.get(str(prompt_id))
-                    if request.prompt_version_ids
-                    else None
-                )
-                db_prompt_version = self._get_prompt_version(
-                    db, prompt_id, prompt_version_id
-                )
-
-                if not db_prompt_version:
-                    logger.warning(
-                        f"Prompt version not found for prompt ID {prompt_id}"
+            for db_prompt, db_prompt_version in prompts:
+                cells.append((db_model, db_prompt, db_prompt_version))
+
+        return db_input, cells
+
+    def _plan_process_job(
+        self,
+        db: Session,
+        kind: str,
+        texts: List[str],
+        request: Union[schemas.ProcessRequest, schemas.BatchProcessRequest],
+        idempotency_key: Optional[str],
+    ) -> Tuple[models.Job, List[models.JobCell], List[Generation]]:
+        """Create the inputs of a process or batch request and record it as a job"""
+        prompts = self.resolve_prompts(
+            db, request.prompt_ids, request.prompt_version_ids
+        )
+        db_models = []
+        for model_id in request.model_ids:
+            db_model = self.get_model(db, model_id)
+            if not db_model:
+                logger.warning("Model with ID %s not found", model_id)
+                continue
+            db_models.append(db_model)
+
+        db_inputs = [models.Input(text=text) for text in texts]
+        db.add_all(db_inputs)
+        db.flush()
+
+        db_cells = []
+        generations = []
+        for db_input in db_inputs:
+            for db_model in db_models:
+                for db_prompt, db_prompt_version in prompts:
+                    db_cells.append(
+                        models.JobCell(
+                            input_id=db_input.id,
+                            model_id=db_model.id,
+                            prompt_id=db_prompt.id,
+                            prompt_version_id=db_prompt_version.id,
+                            status=models.CellStatus.RUNNING.value,
+                        )
+                    )
+                    generations.append(
+                        (
+                            db_model.name,
+                            db_prompt_version.template,
+                            db_input.text,
+                            db_prompt_version.system_prompt,
+                        )
                     )
-                    continue
 
-                logger.info(
-                    f"Processing with model: {db_model.name}, prompt: {db_prompt.name}, version: {db_prompt_version.version_number}"
-                )
+        payload = request.model_dump(mode="json", exclude={"text", "texts"})
+        payload["input_ids"] = [db_input.id for db_input in db_inputs]
+        db_job = self._record_job(db, kind, payload, idempotency_key, db_cells)
+        return db_job, db_cells, generations
+
+    async def process_text(
+        self,
+        db: AsyncSession,
+        request: schemas.ProcessRequest,
+        idempotency_key: Optional[str] = None,
+    ) -> Tuple[int, Dict[str, Any]]:
+        """Process a single text with multiple models and prompts
+
+        All model/prompt combinations are started at once; outputs are
+        persisted as they finish. The request is recorded as a job, whose id
+        is returned with the result. A retry with the same idempotency key
+        gets the result of the first request instead of generating again.
+        """
+        kind = models.JobKind.PROCESS.value
+        db_job = await self._finished_job(db, kind, idempotency_key)
+        if db_job is None:
+            logger.info(
+                "Processing text with %d models and %d prompts",
+                len(request.model_ids),
+                len(request.prompt_ids),
+            )
+            db_job, db_cells, generations = await db.run_sync(
+                self._plan_process_job, kind, [request.text], request, idempotency_key
+            )
+            await self._run_request_job(db, db_job, db_cells, generations, request.use_cache)
 
-                # Process with the LLM service
-                try:
-                    output_data = self.llm_service.process_text(
-                        db_model.name,
-                        db_prompt_version.template,
-                        request.text,
-                        system_prompt=db_prompt_version.system_prompt,
-                    )
+        results = await db.run_sync(self._process_results, db_job)
+        return db_job.id, results[0]
 
-                    # Create output record
-                    db_output = models.Output(
-                        input_id=db_input.id,
-                        model_id=model_id,
-                        prompt_id=prompt_id,
-                        prompt_version_id=db_prompt_version.id,
-                        text=output_data["text"],
-                        processing_time=output_data["processing_time"],
-                    )
-                    db.add(db_output)
-                    db.commit()
-                    db.refresh(db_output)
-
-                    # Load relationships for the response
-                    db_output.model = db_model
-                    db_output.prompt = db_prompt
-                    db_output.input = db_input
-                    db_output.prompt_version = db_prompt_version
-
-                    results.append(db_output)
-                    logger.info(
-                        f"Processing successful, output length: {len(output_data['text'])} chars"
-                    )
-                except Exception as e:
-                    logger.exception(f"Error processing text: {e}")
+    async def stream_process_text(
+        self, db: AsyncSession, request: schemas.ProcessRequest
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Process a single text, yielding (event, data) pairs as results arrive
 
-        return {"input_id": db_input.id, "results": results}
+        Emits "input" once, "chunk" for streamed tokens, one "output" or
+        "error" per model/prompt combination and a final "done".
+        """
+        db_input, cells = await db.run_sync(self._plan_process, request)
+        yield "input", {"input_id": db_input.id, "cells": len(cells)}
+
+        generations = [
+            (
+                db_model.name,
+                db_prompt_version.template,
+                request.text,
+                db_prompt_version.system_prompt,
+            )
+            for db_model, db_prompt, db_prompt_version in cells
+        ]
+
+        async def persist(position: int, output_data: Dict[str, Any]) -> models.Output:
+            return await self._save_output(db_input.id, *cells[position], output_data)
+
+        completed = 0
+        async for event, position, value in self.aexecute(
+            db, generations, stream=True, use_cache=request.use_cache, persist=persist
+        ):
+            db_model, db_prompt, db_prompt_version = cells[position]
+            cell = {
+                "cell": position,
+                "model_id": db_model.id,
+                "prompt_id": db_prompt.id,
+                "prompt_version_id": db_prompt_version.id,
+            }
 
-    def batch_process(
-        self, db: Session, request: schemas.BatchProcessRequest
-    ) -> List[Dict[str, Any]]:
-        """Process multiple texts with multiple models and prompts"""
-        results = []
+            if event == "chunk":
+                yield "chunk", {**cell, "text": value}
+                continue
+
+            if event == "error":
+                cell_logger.error("Error processing text: %s", value)
+                yield "error", {**cell, "detail": str(value)}
+                continue
 
-        for text in request.texts:
-            process_request = schemas.ProcessRequest(
-                text=text,
-                model_ids=request.model_ids,
-                prompt_ids=request.prompt_ids,
-                prompt_version_ids=request.prompt_version_ids,
+            completed += 1
+            yield "output", {
+                **cell,
+                "result": self._prompt_result(
+                    value, db_model, db_prompt, db_prompt_version, False
+                ),
+            }
+
+        yield "done", {"input_id": db_input.id, "completed": completed}
+
+    async def batch_process(
+        self,
+        db: AsyncSession,
+        request: schemas.BatchProcessRequest,
+        idempotency_key: Optional[str] = None,
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """Process multiple texts with multiple models and prompts
+
+        All texts are processed concurrently as one job, like process_text.
+        """
+        kind = models.JobKind.BATCH_PROCESS.value
+        db_job = await self._finished_job(db, kind, idempotency_key)
+        if db_job is None:
+            logger.info(
+                "Processing %d texts with %d models and %d prompts",
+                len(request.texts),
+                len(request.model_ids),
+                len(request.prompt_ids),
             )
-            result = self.process_text(db, process_request)
-            results.append(result)
+            db_job, db_cells, generations = await db.run_sync(
+                self._plan_process_job, kind, request.texts, request, idempotency_key
+            )
+            await self._run_request_job(db, db_job, db_cells, generations, request.use_cache)
 
-        return results
+        return db_job.id, await db.run_sync(self._process_results, db_job)
 
-    # Update compare_prompts method to use system_prompt
-    def compare_prompts(
+    def _plan_comparison(
         self, db: Session, request: schemas.ComparePromptsRequest
-    ) -> List[Dict[str, Any]]:
-        """
-        Compare multiple prompts on the same set of inputs
+    ) -> Tuple[List[models.Input], List[Tuple[Any, ...]]]:
+        """Resolve a comparison request into its inputs and cells
+
+        Each cell is an (input_index, model, prompt, prompt_version,
+        existing_output) tuple, ordered by input, then prompt, then model.
         """
-        logger.info(
-            f"Comparing {len(request.prompt_ids)} prompts on {len(request.input_ids)} inputs using {len(request.model_ids)} models"
+        prompts = self.resolve_prompts(
+            db, request.prompt_ids, request.prompt_version_ids
         )
 
-        results = []
+        db_models = []
+        for model_id in request.model_ids:
+            db_model = self.get_model(db, model_id)
+            if not db_model:
+                logger.warning("Model with ID %s not found", model_id)
+                continue
+            db_models.append(db_model)
+
+        # Inputs and their existing outputs are loaded a chunk of ids at a time
+        db_inputs: Dict[int, models.Input] = {}
+        existing_outputs: Dict[Tuple[int, int, int, int], models.Output] = {}
+        unique_input_ids = list(dict.fromkeys(request.input_ids))
+        for start in range(0, len(unique_input_ids), LOOKUP_CHUNK_SIZE):
+            chunk = unique_input_ids[start : start + LOOKUP_CHUNK_SIZE]
+            for db_input in db.query(models.Input).filter(models.Input.id.in_(chunk)):
+                db_inputs[db_input.id] = db_input
+            # Check if we already have results for these combinations in the database
+            if request.use_cache and prompts and db_models:
+                outputs = (
+                    db.query(models.Output)
+                    .filter(
+                        models.Output.input_id.in_(chunk),
+                        models.Output.model_id.in_([m.id for m in db_models]),
+                        models.Output.prompt_version_id.in_(
+                            [version.id for _, version in prompts]
+                        ),
+                    )
+                    .order_by(models.Output.id)
+                )
+                for output in outputs:
+                    existing_outputs.setdefault(
+                        (
+                            output.input_id,
+                            output.model_id,
+                            output.prompt_id,
+                            output.prompt_version_id,
+                        ),
+                        output,
+                    )
 
+        inputs = []
+        cells = []
         for input_id in request.input_ids:
-            # Get the input
-            db_input = self.get_input(db, input_id)
+            db_input = db_inputs.get(input_id)
             if not db_input:
-                logger.warning(f"Input with ID {input_id} not found")
+                logger.warning("Input with ID %s not found", input_id)
                 continue
 
-            input_results = {
-                "input_id": input_id,
-                "input": db_input,
-                "prompt_results": [],
-            }
+            input_index = len(inputs)
+            inputs.append(db_input)
+
+            for db_prompt, db_prompt_version in prompts:
+                for db_model in db_models:
+                    existing_output = existing_outputs.get(
+                        (input_id, db_model.id, db_prompt.id, db_prompt_version.id)
+                    )
+                    cells.append(
+                        (
+                            input_index,
+                            db_model,
+                            db_prompt,
+                            db_prompt_version,
+                            existing_output,
+                        )
+                    )
 
-            for prompt_id in request.prompt_ids:
-                # Get the prompt
-                db_prompt = (
-                    db.query(models.Prompt)
-                    .filter(models.Prompt.id == prompt_id)
-                    .first()
+        return inputs, cells
+
+    def _plan_comparison_job(
+        self,
+        db: Session,
+        request: schemas.ComparePromptsRequest,
+        idempotency_key: Optional[str],
+    ) -> Tuple[models.Job, List[models.JobCell], List[Generation]]:
+        """Record a comparison as a job; cells with an existing output start done
+
+        Returns the job with the cells that still need generating.
+        """
+        inputs, cells = self._plan_comparison(db, request)
+
+        db_cells = []
+        pending = []
+        generations = []
+        for input_index, db_model, db_prompt, db_prompt_version, existing_output in cells:
+            db_input = inputs[input_index]
+            db_cell = models.JobCell(
+                input_id=db_input.id,
+                model_id=db_model.id,
+                prompt_id=db_prompt.id,
+                prompt_version_id=db_prompt_version.id,
+            )
+            db_cells.append(db_cell)
+            if existing_output:
+                logger.debug(
+                    "Found existing output for input %s with model %s, prompt %s, version %s",
+                    db_input.id,
+                    db_model.name,
+                    db_prompt.name,
+                    db_prompt_version.version_number,
                 )
-                if not db_prompt:
-                    logger.warning(f"Prompt with ID {prompt_id} not found")
-                    continue
-
-                # Get the specified prompt version or latest
-                prompt_version_id = (
-                    request.prompt_version_ids.get(str(prompt_id))
-                    if request.prompt_version_ids
-                    else None
+                db_cell.status = models.CellStatus.DONE.value
+                db_cell.output_id = existing_output.id
+                continue
+
+            db_cell.status = models.CellStatus.RUNNING.value
+            pending.append(db_cell)
+            generations.append(
+                (
+                    db_model.name,
+                    db_prompt_version.template,
+                    db_input.text,
+                    db_prompt_version.system_prompt,
                 )
-                db_prompt_version = self._get_prompt_version(
-                    db, prompt_id, prompt_version_id
+            )
+
+        payload = request.model_dump(mode="json")
+        payload["input_ids"] = [db_input.id for db_input in inputs]
+        db_job = self._record_job(
+            db, models.JobKind.COMPARE_PROMPTS.value, payload, idempotency_key, db_cells
+        )
+        return db_job, pending, generations
+
+    async def compare_prompts(
+        self,
+        db: AsyncSession,
+        request: schemas.ComparePromptsRequest,
+        idempotency_key: Optional[str] = None,
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        Compare multiple prompts on the same set of inputs
+
+        Existing outputs are reused; missing combinations are generated
+        concurrently. Like process_text, the comparison is recorded as a job
+        and a retry with the same idempotency key gets the first result.
+        Inputs listed more than once are compared once.
+        """
+        kind = models.JobKind.COMPARE_PROMPTS.value
+        db_job = await self._finished_job(db, kind, idempotency_key)
+        if db_job is None:
+            logger.info(
+                "Comparing %d prompts on %d inputs using %d models",
+                len(request.prompt_ids),
+                len(request.input_ids),
+                len(request.model_ids),
+            )
+            request = request.model_copy(
+                update={"input_ids": list(dict.fromkeys(request.input_ids))}
+            )
+            db_job, db_cells, generations = await db.run_sync(
+                self._plan_comparison_job, request, idempotency_key
+            )
+            await self._run_request_job(db, db_job, db_cells, generations, request.use_cache)
+
+        return db_job.id, await db.run_sync(self._comparison_results, db_job)
+
+    async def stream_compare_prompts(
+        self, db: AsyncSession, request: schemas.ComparePromptsRequest
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Compare prompts, yielding (event, data) pairs as results arrive
+
+        Emits "input" for every input, "result" for reused outputs right away,
+        then "chunk" for streamed tokens, one "result" or "error" per generated
+        combination and a final "done".
+        """
+        inputs, cells = await db.run_sync(self._plan_comparison, request)
+
+        for db_input in inputs:
+            yield "input", {
+                "input_id": db_input.id,
+                "input": schemas.Input.model_validate(db_input).model_dump(),
+            }
+
+        completed = 0
+        pending = []
+        for position, cell in enumerate(cells):
+            input_index, db_model, db_prompt, db_prompt_version, existing_output = cell
+            if existing_output:
+                completed += 1
+                yield "result", {
+                    "input_id": inputs[input_index].id,
+                    "prompt_result": self._prompt_result(
+                        existing_output, db_model, db_prompt, db_prompt_version, True
+                    ),
+                }
+            else:
+                pending.append(position)
+
+        generations = []
+        for position in pending:
+            input_index, db_model, db_prompt, db_prompt_version, _ = cells[position]
+            generations.append(
+                (
+                    db_model.name,
+                    db_prompt_version.template,
+                    inputs[input_index].text,
+                    db_prompt_version.system_prompt,
                 )
+            )
 
-                if not db_prompt_version:
-                    logger.warning(
-                        f"Prompt version not found for prompt ID {prompt_id}"
-                    )
-                    continue
+        async def persist(index: int, output_data: Dict[str, Any]) -> models.Output:
+            input_index, db_model, db_prompt, db_prompt_version, _ = cells[
+                pending[index]
+            ]
+            return await self._save_output(
+                inputs[input_index].id,
+                db_model,
+                db_prompt,
+                db_prompt_version,
+                output_data,
+            )
 
-                for model_id in request.model_ids:
-                    # Get the model
-                    db_model = self.get_model(db, model_id)
-                    if not db_model:
-                        logger.warning(f"Model with ID {model_id} not found")
-                        continue
+        async for event, index, value in self.aexecute(
+            db, generations, stream=True, use_cache=request.use_cache, persist=persist
+        ):
+            input_index, db_model, db_prompt, db_prompt_version, _ = cells[
+                pending[index]
+            ]
+            cell = {
+                "input_id": inputs[input_index].id,
+                "model_id": db_model.id,
+                "prompt_id": db_prompt.id,
+                "prompt_version_id": db_prompt_version.id,
+            }
 
-                    logger.info(
-                        f"Comparing input {input_id} with model {db_model.name}, prompt {db_prompt.name}, version {db_prompt_version.version_number}"
-                    )
+            if event == "chunk":
+                yield "chunk", {**cell, "text": value}
+                continue
 
-                    # Check if we already have a result for this combination in the database
-                    existing_output = (
-                        db.query(models.Output)
-                        .filter(
-                            models.Output.input_id == input_id,
-                            models.Output.model_id == model_id,
-                            models.Output.prompt_id == prompt_id,
-                            models.Output.prompt_version_id == db_prompt_version.id,
-                        )
-                        .first()
-                    )
+            if event == "error":
+                cell_logger.error("Error processing comparison: %s", value)
+                yield "error", {**cell, "detail": str(value)}
+                continue
 
-                    if existing_output:
-                        logger.info(
-                            f"Found existing output for this combination, using that"
-                        )
+            completed += 1
+            yield "result", {
+                "input_id": inputs[input_index].id,
+                "prompt_result": self._prompt_result(
+                    value, db_model, db_prompt, db_prompt_version, False
+                ),
+            }
+
+        yield "done", {"completed": completed}
 
-                        # Use the existing output
-                        prompt_result = {
-                            "output_id": existing_output.id,
-                            "prompt_id": prompt_id,
-                            "prompt_name": db_prompt.name,
-                            "prompt_version_id": db_prompt_version.id,
-                            "prompt_version_number": db_prompt_version.version_number,
-                            "prompt_template": db_prompt_version.template,
-                            "system_prompt": db_prompt_version.system_prompt,  # Add system prompt
-                            "model_id": model_id,
-                            "model_name": db_model.name,
-                            "text": existing_output.text,
-                            "processing_time": existing_output.processing_time,
-                            "created_at": existing_output.created_at,
-                            "is_existing": True,
-                        }
-
-                    else:
-                        # Process with the LLM service
-                        try:
-                            # Process the text with system prompt
-                            output_data = self.llm_service.process_text(
-                                db_model.name,
-                                db_prompt_version.template,
-                                db_input.text,
-                                system_prompt=db_prompt_version.system_prompt,
-                            )
-
-                            # Create output record
-                            db_output = models.Output(
-                                input_id=input_id,
-                                model_id=model_id,
-                                prompt_id=prompt_id,
-                                prompt_version_id=db_prompt_version.id,
-                                text=output_data["text"],
-                                processing_time=output_data["processing_time"],
-                            )
-                            db.add(db_output)
-                            db.commit()
-                            db.refresh(db_output)
-
-                            prompt_result = {
-                                "output_id": db_output.id,
-                                "prompt_id": prompt_id,
-                                "prompt_name": db_prompt.name,
-                                "prompt_version_id": db_prompt_version.id,
-                                "prompt_version_number": db_prompt_version.version_number,
-                                "prompt_template": db_prompt_version.template,
-                                "system_prompt": db_prompt_version.system_prompt,  # Add system prompt
-                                "model_id": model_id,
-                                "model_name": db_model.name,
-                                "text": db_output.text,
-                                "processing_time": db_output.processing_time,
-                                "created_at": db_output.created_at,
-                                "is_existing": False,
-                            }
-
-                            logger.info(
-                                f"Processing successful, output length: {len(output_data['text'])} chars"
-                            )
-
-                        except Exception as e:
-                            logger.exception(f"Error processing comparison: {e}")
-                            continue
-
-                    input_results["prompt_results"].append(prompt_result)
-
-            results.append(input_results)
-
-        return results
-
-    def get_input_history(self, db: Session, input_id: int) -> Dict[str, Any]:
+    def get_input_history(
+        self, db: Session, input_id: int, skip: int = 0, limit: int = 100
+    ) -> Dict[str, Any]:
         """
-        Get historical results for a specific input
+        Get historical results for a specific input, newest first
+
+        Outputs are loaded together with their model, prompt, prompt version
+        and evaluation, so a page costs the same few queries however many
+        outputs it contains.
         """
-        logger.info(f"Getting history for input {input_id}")
+        logger.debug("Getting history for input %s", input_id)
 
         # Get the input
         db_input = self.get_input(db, input_id)
         if not db_input:
-            logger.warning(f"Input with ID {input_id} not found")
-            return {"input_id": input_id, "input": None, "results": []}
+            logger.warning("Input with ID %s not found", input_id)
+            return {"input_id": input_id, "input": None, "total": 0, "results": []}
 
-        # Get all outputs for this input
+        total = (
+            db.query(func.count(models.Output.id))
+            .filter(models.Output.input_id == input_id)
+            .scalar()
+        )
+
+        # Get one page of outputs with everything the view needs, streamed in
+        # batches (a server-side cursor on PostgreSQL) rather than buffered
         outputs = (
             db.query(models.Output)
+            .options(
+                joinedload(models.Output.prompt),
+                joinedload(models.Output.model),
+                joinedload(models.Output.prompt_version),
+                joinedload(models.Output.evaluation),
+            )
             .filter(models.Output.input_id == input_id)
-            .order_by(models.Output.created_at.desc())
-            .all()
+            .order_by(models.Output.created_at.desc(), models.Output.id.desc())
+            .offset(skip)
+            .limit(limit)
+            .yield_per(config.DB_YIELD_PER)
         )
 
         results = []
         for output in outputs:
-            # Get the prompt version
-            prompt_version = None
-            if output.prompt_version_id:
-                prompt_version = (
-                    db.query(models.PromptVersion)
-                    .filter(models.PromptVersion.id == output.prompt_version_id)
-                    .first()
-                )
-
-            # Get evaluation if any
-            evaluation = (
-                db.query(models.Evaluation)
-                .filter(models.Evaluation.output_id == output.id)
-                .first()
-            )
+            prompt_version = output.prompt_version
+            evaluation = output.evaluation
 
             result = {
                 "output_id": output.id,
@@ -415,6 +1341,11 @@ class EvaluationService:
                 "model_name": output.model.name if output.model else None,
                 "text": output.text,
                 "processing_time": output.processing_time,
+                "input_tokens": output.input_tokens,
+                "output_tokens": output.output_tokens,
+                "time_to_first_token": output.time_to_first_token,
+                "tokens_per_second": output.tokens_per_second,
+                "cost": output.cost,
                 "created_at": output.created_at,
                 "evaluation": (
                     {
@@ -430,7 +1361,12 @@ class EvaluationService:
 
             results.append(result)
 
-        return {"input_id": input_id, "input": db_input, "results": results}
+        return {
+            "input_id": input_id,
+            "input": db_input,
+            "total": total,
+            "results": results,
+        }
 
     def create_evaluation(
         self, db: Session, evaluation: schemas.EvaluationCreate
@@ -465,30 +1401,114 @@ class EvaluationService:
         db.refresh(db_eval)
         return db_eval
 
+    def _encode_cursor(self, evaluation: models.Evaluation) -> str:
+        raw = f"{evaluation.created_at.isoformat()}|{evaluation.id}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def _decode_cursor(self, cursor: str) -> Tuple[datetime.datetime, int]:
+        try:
+            created_at, evaluation_id = (
+                base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+            )
+            return datetime.datetime.fromisoformat(created_at), int(evaluation_id)
+        except Exception:
+            raise ValueError(f"Invalid cursor: {cursor}")
+
     def get_evaluations(
-        self, db: Session, skip: int = 0, limit: int = 100
-    ) -> List[Dict[str, Any]]:
-        """Get all evaluations with related data"""
-        evaluations = db.query(models.Evaluation).offset(skip).limit(limit).all()
+        self,
+        db: Session,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        model_id: Optional[int] = None,
+        prompt_id: Optional[int] = None,
+        quality: Optional[str] = None,
+        include_text: bool = True,
+    ) -> Dict[str, Any]:
+        """Get evaluations with related data, newest first
+
+        Pages are addressed by an opaque cursor on (created_at, id); the
+        returned next_cursor fetches the following page and is None on the
+        last one. Filters are applied in SQL and output, input, model and
+        prompt are loaded in the same query. With include_text=False the
+        input and output texts are neither loaded nor returned.
+        """
+        output_options = contains_eager(models.Evaluation.output)
+        input_options = output_options.joinedload(models.Output.input)
+        if not include_text:
+            output_options = output_options.defer(models.Output.text)
+            input_options = input_options.defer(models.Input.text)
+
+        query = (
+            db.query(models.Evaluation)
+            .join(models.Evaluation.output)
+            .options(
+                output_options,
+                input_options,
+                contains_eager(models.Evaluation.output).joinedload(
+                    models.Output.model
+                ),
+                contains_eager(models.Evaluation.output).joinedload(
+                    models.Output.prompt
+                ),
+            )
+        )
+
+        if model_id is not None:
+            query = query.filter(models.Output.model_id == model_id)
+        if prompt_id is not None:
+            query = query.filter(models.Output.prompt_id == prompt_id)
+        if quality is not None:
+            query = query.filter(models.Evaluation.quality == quality)
+
+        if cursor:
+            created_at, evaluation_id = self._decode_cursor(cursor)
+            query = query.filter(
+                or_(
+                    models.Evaluation.created_at < created_at,
+                    and_(
+                        models.Evaluation.created_at == created_at,
+                        models.Evaluation.id < evaluation_id,
+                    ),
+                )
+            )
+
+        query = query.order_by(
+            models.Evaluation.created_at.desc(), models.Evaluation.id.desc()
+        )
+        if skip and not cursor:
+            # Offset paging is kept for existing clients
+            query = query.offset(skip)
+
+        evaluations = query.limit(limit).all()
 
         result = []
         for eval in evaluations:
             output = eval.output
+            output_data = {
+                "id": output.id,
+                "processing_time": output.processing_time,
+                "input": {"id": output.input.id},
+                "model": {"id": output.model.id, "name": output.model.name},
+                "prompt": {"id": output.prompt.id, "name": output.prompt.name},
+            }
+            if include_text:
+                output_data["text"] = output.text
+                output_data["input"]["text"] = output.input.text
+
             result.append(
                 {
                     "id": eval.id,
                     "quality": eval.quality,  # Changed: no more .value
                     "notes": eval.notes,
                     "created_at": eval.created_at,
-                    "output": {
-                        "id": output.id,
-                        "text": output.text,
-                        "processing_time": output.processing_time,
-                        "input": {"id": output.input.id, "text": output.input.text},
-                        "model": {"id": output.model.id, "name": output.model.name},
-                        "prompt": {"id": output.prompt.id, "name": output.prompt.name},
-                    },
+                    "output": output_data,
                 }
             )
 
-        return result
+        next_cursor = (
+            self._encode_cursor(evaluations[-1])
+            if len(evaluations) == limit
+            else None
+        )
+        return {"items": result, "next_cursor": next_cursor}
@@ -0,0 +1,223 @@
+import datetime
+import json
+import logging
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from sqlalchemy import Select, select
+from .. import config
+from .. import models
+from ..database import SessionLocal
+
+# Parquet and Arrow exports need pyarrow
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+# Media types of the export formats
+EXPORT_FORMATS = {
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+# Exported columns with their Arrow types; the text columns are optional
+EXPORT_COLUMNS: List[Tuple[str, Any, str]] = [
+    ("output_id", models.Output.id, "int64"),
+    ("input_id", models.Output.input_id, "int64"),
+    ("input_set_id", models.Input.input_set_id, "int64"),
+    ("input_name", models.Input.name, "string"),
+    ("input_text", models.Input.text, "string"),
+    ("model_id", models.Output.model_id, "int64"),
+    ("model_name", models.LLMModel.name, "string"),
+    ("prompt_id", models.Output.prompt_id, "int64"),
+    ("prompt_name", models.Prompt.name, "string"),
+    ("prompt_version_id", models.Output.prompt_version_id, "int64"),
+    ("prompt_version", models.PromptVersion.version_number, "int64"),
+    ("output_text", models.Output.text, "string"),
+    ("processing_time", models.Output.processing_time, "double"),
+    ("queue_wait", models.Output.queue_wait, "double"),
+    ("generation_time", models.Output.generation_time, "double"),
+    ("input_tokens", models.Output.input_tokens, "int64"),
+    ("output_tokens", models.Output.output_tokens, "int64"),
+    ("time_to_first_token", models.Output.time_to_first_token, "double"),
+    ("tokens_per_second", models.Output.tokens_per_second, "double"),
+    ("cost", models.Output.cost, "double"),
+    ("error", models.Output.error, "string"),
+    ("cached", models.Output.cached, "bool"),
+    ("created_at", models.Output.created_at, "timestamp[us]"),
+    ("evaluation_id", models.Evaluation.id, "int64"),
+    ("quality", models.Evaluation.quality, "string"),
+    ("notes", models.Evaluation.notes, "string"),
+    ("evaluated_at", models.Evaluation.created_at, "timestamp[us]"),
+]
+
+TEXT_COLUMNS = {"input_text", "output_text"}
+
+
+class ExportService:
+    """Streams outputs joined with their input, model, prompt version and evaluation
+
+    Rows are read through a server-side cursor on PostgreSQL (SQLite reads
+    lazily anyway) and written batch_size rows at a time, so an export of
+    any size runs in the memory of one batch. Each export opens its own
+    session, which stays open while the response streams.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        batch_size: int = config.EXPORT_BATCH_SIZE,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+
+    def stream(
+        self,
+        export_format: str,
+        input_set_id: Optional[int] = None,
+        model_id: Optional[int] = None,
+        prompt_id: Optional[int] = None,
+        quality: Optional[str] = None,
+        evaluated_only: bool = False,
+        include_text: bool = True,
+    ) -> Iterator[bytes]:
+        """The export as chunks of bytes in jsonl, parquet or arrow format"""
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {export_format}")
+        if export_format != "jsonl" and pyarrow is None:
+            raise RuntimeError(
+                f"{export_format} exports need pyarrow: pip install '.[export]'"
+            )
+
+        columns = [
+            column
+            for column in EXPORT_COLUMNS
+            if include_text or column[0] not in TEXT_COLUMNS
+        ]
+        statement = self._query(
+            columns, input_set_id, model_id, prompt_id, quality, evaluated_only
+        )
+        batches = self._batches(statement)
+        if export_format == "jsonl":
+            return self._jsonl(batches)
+        return self._arrow(batches, columns, parquet=export_format == "parquet")
+
+    def _query(
+        self,
+        columns: List[Tuple[str, Any, str]],
+        input_set_id: Optional[int],
+        model_id: Optional[int],
+        prompt_id: Optional[int],
+        quality: Optional[str],
+        evaluated_only: bool,
+    ) -> Select:
+        statement = (
+            select(*(column.label(name) for name, column, _ in columns))
+            .select_from(models.Output)
+            .join(models.Input, models.Output.input_id == models.Input.id)
+            .outerjoin(models.LLMModel, models.Output.model_id == models.LLMModel.id)
+            .outerjoin(models.Prompt, models.Output.prompt_id == models.Prompt.id)
+            .outerjoin(
+                models.PromptVersion,
+                models.Output.prompt_version_id == models.PromptVersion.id,
+            )
+            .outerjoin(models.Evaluation, models.Evaluation.output_id == models.Output.id)
+            .order_by(models.Output.id)
+        )
+        if input_set_id is not None:
+            statement = statement.where(models.Input.input_set_id == input_set_id)
+        if model_id is not None:
+            statement = statement.where(models.Output.model_id == model_id)
+        if prompt_id is not None:
+            statement = statement.where(models.Output.prompt_id == prompt_id)
+        if quality is not None:
+            statement = statement.where(models.Evaluation.quality == quality)
+        if evaluated_only:
+            statement = statement.where(models.Evaluation.id.is_not(None))
+        return statement
+
+    def _batches(self, statement: Select) -> Iterator[List[Dict[str, Any]]]:
+        db = self.session_factory()
+        exported = 0
+        try:
+            result = db.execute(
+                statement, execution_options={"yield_per": self.batch_size}
+            )
+            for partition in result.mappings().partitions():
+                exported += len(partition)
+                yield [dict(row) for row in partition]
+        finally:
+            db.close()
+            logger.info("Exported %s outputs", exported)
+
+    def _jsonl(self, batches: Iterator[List[Dict[str, Any]]]) -> Iterator[bytes]:
+        for batch in batches:
+            lines = [json.dumps(row, default=_encode_datetime) + "\n" for row in batch]
+            yield "".join(lines).encode("utf-8")
+
+    def _arrow(
+        self,
+        batches: Iterator[List[Dict[str, Any]]],
+        columns: List[Tuple[str, Any, str]],
+        parquet: bool,
+    ) -> Iterator[bytes]:
+        """Parquet with one row group per batch, or an Arrow IPC stream"""
+        schema = pyarrow.schema(
+            [
+                (name, pyarrow.type_for_alias(arrow_type))
+                for name, _, arrow_type in columns
+            ]
+        )
+        sink = _ChunkSink()
+        if parquet:
+            writer = pyarrow.parquet.ParquetWriter(sink, schema)
+        else:
+            writer = pyarrow.ipc.new_stream(sink, schema)
+        try:
+            for batch in batches:
+                record_batch = pyarrow.RecordBatch.from_pylist(batch, schema=schema)
+                writer.write_batch(record_batch)
+                yield sink.take()
+        finally:
+            # Writes the Parquet footer or the end-of-stream marker
+            writer.close()
+        yield sink.take()
+
+
+class _ChunkSink:
+    """A write-only file that hands out what was written since the last take()"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _encode_datetime(value: Any) -> str:
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError(f"Can't encode {type(value).__name__}")
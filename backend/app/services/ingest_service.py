@@ -0,0 +1,147 @@
+import csv
+import datetime
+import hashlib
+import io
+import itertools
+import logging
+from typing import List, Dict, Any, Iterable, Iterator
+from sqlalchemy import Table, insert
+from sqlalchemy.orm import Session
+from .. import config
+from .. import models
+
+logger = logging.getLogger(__name__)
+
+INPUT_COLUMNS = ["input_set_id", "text", "name", "content_hash", "created_at"]
+
+OUTPUT_COLUMNS = [
+    "input_id",
+    "model_id",
+    "prompt_id",
+    "prompt_version_id",
+    "text",
+    "processing_time",
+    "queue_wait",
+    "generation_time",
+    "input_tokens",
+    "output_tokens",
+    "time_to_first_token",
+    "tokens_per_second",
+    "cost",
+    "error",
+    "cache_key",
+    "cached",
+    "created_at",
+]
+
+
+def content_hash(text: str) -> str:
+    """Hash of an input's text, used to recognise duplicates"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _chunks(rows: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    iterator = iter(rows)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class IngestService:
+    """Bulk loading of inputs and outputs
+
+    Rows are consumed lazily in chunks, so an import of any size only holds
+    one chunk in memory. PostgreSQL loads each chunk with COPY ... FROM STDIN;
+    other databases get one multi-row INSERT per chunk. Nothing is committed;
+    the caller decides where the transaction ends.
+    """
+
+    def __init__(self, chunk_size: int = config.INGEST_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+
+    def ingest_inputs(self, db: Session, rows: Iterable[Dict[str, Any]]) -> int:
+        """Load inputs given as dicts with text and optional input_set_id and name"""
+        return self._ingest(
+            db,
+            models.Input.__table__,
+            INPUT_COLUMNS,
+            (_with_content_hash(row) for row in rows),
+        )
+
+    def ingest_outputs(self, db: Session, rows: Iterable[Dict[str, Any]]) -> int:
+        """Load outputs given as dicts with the columns of models.Output"""
+        return self._ingest(
+            db,
+            models.Output.__table__,
+            OUTPUT_COLUMNS,
+            ({"cached": False, **row} for row in rows),
+        )
+
+    def _ingest(
+        self,
+        db: Session,
+        table: Table,
+        columns: List[str],
+        rows: Iterable[Dict[str, Any]],
+    ) -> int:
+        use_copy = db.get_bind().dialect.name == "postgresql"
+        count = 0
+        for chunk in _chunks(rows, self.chunk_size):
+            now = datetime.datetime.utcnow()
+            values = []
+            for row in chunk:
+                row = {**row, "created_at": row.get("created_at") or now}
+                values.append([row.get(column) for column in columns])
+            if use_copy:
+                self._copy(db, table, columns, values)
+            else:
+                db.execute(
+                    insert(table), [dict(zip(columns, row)) for row in values]
+                )
+            count += len(values)
+        logger.debug("Ingested %s rows into %s", count, table.name)
+        return count
+
+    def _copy(
+        self, db: Session, table: Table, columns: List[str], values: List[List[Any]]
+    ) -> None:
+        """Stream one chunk through COPY on the session's own connection"""
+        dbapi_connection = db.connection().connection.dbapi_connection
+        column_list = ", ".join(columns)
+        cursor = dbapi_connection.cursor()
+        try:
+            if hasattr(cursor, "copy_expert"):
+                # psycopg2: COPY from an in-memory CSV file
+                buffer = io.StringIO()
+                # Unquoted empty fields are NULL, quoted ones empty strings
+                csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC).writerows(
+                    [_csv_value(value) for value in row] for row in values
+                )
+                buffer.seek(0)
+                cursor.copy_expert(
+                    f"COPY {table.name} ({column_list}) FROM STDIN WITH (FORMAT csv)",
+                    buffer,
+                )
+            else:
+                # psycopg 3 adapts the Python values itself
+                with cursor.copy(f"COPY {table.name} ({column_list}) FROM STDIN") as copy:
+                    for row in values:
+                        copy.write_row(row)
+        finally:
+            cursor.close()
+
+
+def _with_content_hash(row: Dict[str, Any]) -> Dict[str, Any]:
+    if row.get("content_hash"):
+        return row
+    return {**row, "content_hash": content_hash(row["text"])}
+
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
@@ -1,15 +1,60 @@
+import csv
+import io
+import itertools
+import json
 import logging
-from typing import List, Optional
+from typing import List, Optional, Dict, Any, BinaryIO, Iterable, Iterator
 from sqlalchemy.orm import Session
+from .. import config
 from .. import models
 from .. import schemas
+from .ingest_service import IngestService, content_hash
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Upload formats by content type
+IMPORT_FORMATS = {
+    "application/x-ndjson": "jsonl",
+    "application/jsonl": "jsonl",
+    "application/json-lines": "jsonl",
+    "text/csv": "csv",
+}
+
+
+def _import_row(record: Any, where: str) -> Dict[str, Any]:
+    if not isinstance(record, dict):
+        raise ValueError(f"{where} is not an object")
+    text = record.get("text")
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError(f"{where} has no text")
+    name = record.get("name")
+    return {"text": text, "name": str(name) if name else None}
+
+
+def read_jsonl(lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Parse inputs from JSON Lines, one {"text": ..., "name": ...} per line"""
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise ValueError(f"Line {number} is not valid JSON")
+        yield _import_row(record, f"Line {number}")
+
+
+def read_csv(lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Parse inputs from CSV with a header row naming a text and optional name column"""
+    reader = csv.DictReader(lines)
+    if not reader.fieldnames or "text" not in reader.fieldnames:
+        raise ValueError("CSV needs a header row with a text column")
+    for record in reader:
+        yield _import_row(record, f"Row ending on line {reader.line_num}")
+
+
 class InputService:
     def __init__(self):
+        self.ingest_service = IngestService()
         logger.info("InputService initialized")
     
     def get_input_sets(self, db: Session, skip: int = 0, limit: int = 100) -> List[models.InputSet]:
@@ -25,7 +70,9 @@ class InputService:
         db.add(db_input_set)
         db.commit()
         db.refresh(db_input_set)
-        logger.info(f"Created input set: {db_input_set.name} (ID: {db_input_set.id})")
+        logger.info(
+            "Created input set: %s (ID: %s)", db_input_set.name, db_input_set.id
+        )
         return db_input_set
     
     def get_input_set(self, db: Session, input_set_id: int) -> Optional[models.InputSet]:
@@ -38,9 +85,13 @@ class InputService:
         if not input_set:
             return None
             
-        inputs = db.query(models.Input).filter(
+        # Streamed in batches (a server-side cursor on PostgreSQL). Each input
+        # is copied into its response schema as it arrives, so the rows and
+        # their ORM objects are released batch by batch
+        db_inputs = db.query(models.Input).filter(
             models.Input.input_set_id == input_set_id
-        ).all()
+        ).order_by(models.Input.id).yield_per(config.DB_YIELD_PER)
+        inputs = [schemas.Input.model_validate(db_input) for db_input in db_inputs]
         
         return {
             "id": input_set.id,
@@ -63,7 +114,9 @@ class InputService:
             
         db.commit()
         db.refresh(db_input_set)
-        logger.info(f"Updated input set: {db_input_set.name} (ID: {db_input_set.id})")
+        logger.info(
+            "Updated input set: %s (ID: %s)", db_input_set.name, db_input_set.id
+        )
         return db_input_set
     
     def delete_input_set(self, db: Session, input_set_id: int) -> bool:
@@ -88,19 +141,20 @@ class InputService:
             
         db.delete(db_input_set)
         db.commit()
-        logger.info(f"Deleted input set: ID {input_set_id}")
+        logger.info("Deleted input set: ID %s", input_set_id)
         return True
     
     def create_input(self, db: Session, input_data: schemas.InputCreate) -> models.Input:
         """Create a new input"""
         db_input = models.Input(
             text=input_data.text,
-            name=input_data.name
+            name=input_data.name,
+            content_hash=content_hash(input_data.text)
         )
         db.add(db_input)
         db.commit()
         db.refresh(db_input)
-        logger.info(f"Created input: ID {db_input.id}")
+        logger.info("Created input: ID %s", db_input.id)
         return db_input
     
     def create_input_in_set(self, db: Session, input_set_id: int, 
@@ -114,14 +168,73 @@ class InputService:
         db_input = models.Input(
             input_set_id=input_set_id,
             text=input_data.text,
-            name=input_data.name
+            name=input_data.name,
+            content_hash=content_hash(input_data.text)
         )
         db.add(db_input)
         db.commit()
         db.refresh(db_input)
-        logger.info(f"Created input in set {input_set_id}: Input ID {db_input.id}")
+        logger.info("Created input in set %s: Input ID %s", input_set_id, db_input.id)
         return db_input
     
+    def import_file(
+        self, db: Session, input_set_id: int, file: BinaryIO, upload_format: str
+    ) -> Dict[str, int]:
+        """Import a JSONL or CSV file into a set, parsing it as it is read"""
+        # utf-8-sig drops the byte order mark spreadsheet exports start with
+        with io.TextIOWrapper(file, encoding="utf-8-sig", newline="") as lines:
+            reader = read_csv if upload_format == "csv" else read_jsonl
+            return self.import_inputs(db, input_set_id, reader(lines))
+
+    def import_inputs(
+        self, db: Session, input_set_id: int, rows: Iterable[Dict[str, Any]]
+    ) -> Dict[str, int]:
+        """Add inputs to a set in chunks, skipping texts the set already has
+
+        Each chunk is committed on its own, so an import that fails part way
+        keeps the chunks before the failure; importing the same file again
+        only adds the rest.
+        """
+        rows = iter(rows)
+        received = imported = 0
+        while True:
+            chunk = list(itertools.islice(rows, config.IMPORT_CHUNK_SIZE))
+            if not chunk:
+                break
+            received += len(chunk)
+
+            # The first of each text in the chunk, unless the set has it
+            new_rows = {}
+            for row in chunk:
+                new_rows.setdefault(content_hash(row["text"]), row)
+            existing = db.query(models.Input.content_hash).filter(
+                models.Input.input_set_id == input_set_id,
+                models.Input.content_hash.in_(list(new_rows)),
+            )
+            for (known_hash,) in existing:
+                new_rows.pop(known_hash, None)
+
+            if new_rows:
+                self.ingest_service.ingest_inputs(
+                    db,
+                    (
+                        {**row, "input_set_id": input_set_id, "content_hash": row_hash}
+                        for row_hash, row in new_rows.items()
+                    ),
+                )
+                db.commit()
+            imported += len(new_rows)
+
+        logger.info(
+            "Imported %d of %d inputs into set %s", imported, received, input_set_id
+        )
+        return {
+            "input_set_id": input_set_id,
+            "received": received,
+            "imported": imported,
+            "duplicates": received - imported,
+        }
+
     def get_input(self, db: Session, input_id: int) -> Optional[models.Input]:
         """Get an input by ID"""
         return db.query(models.Input).filter(models.Input.id == input_id).first()
@@ -135,7 +248,7 @@ class InputService:
         """Get all inputs in a specific set"""
         return db.query(models.Input).filter(
             models.Input.input_set_id == input_set_id
-        ).offset(skip).limit(limit).all()
+        ).order_by(models.Input.id).offset(skip).limit(limit).all()
     
     def update_input(self, db: Session, input_id: int, 
                      input_data: schemas.InputUpdate) -> Optional[models.Input]:
@@ -147,10 +260,12 @@ class InputService:
         update_data = input_data.model_dump(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_input, key, value)
+        # Inputs created outside of a set may not have a hash yet
+        db_input.content_hash = content_hash(db_input.text)
             
         db.commit()
         db.refresh(db_input)
-        logger.info(f"Updated input: ID {db_input.id}")
+        logger.info("Updated input: ID %s", db_input.id)
         return db_input
     
     def delete_input(self, db: Session, input_id: int) -> bool:
@@ -179,5 +294,5 @@ class InputService:
         
         db.delete(db_input)
         db.commit()
-        logger.info(f"Deleted input: ID {input_id}")
+        logger.info("Deleted input: ID %s", input_id)
         return True
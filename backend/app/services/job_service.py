@@ -0,0 +1,755 @@
+import datetime
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Set
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session, joinedload
+from .. import config
+from .. import models
+from .. import schemas
+from ..database import SessionLocal
+from ..logging_config import SampledLogger
+from .cache_service import LOOKUP_CHUNK_SIZE
+from .evaluation_service import EvaluationService
+from .worker_service import current_worker_id
+
+logger = logging.getLogger(__name__)
+cell_logger = SampledLogger(logger)
+
+
+class JobService:
+    """Runs batch requests in the background
+
+    A job is stored as one cell per input/model/prompt version combination.
+    Workers claim pending cells in chunks by marking them running; a cell is
+    done once its output is stored. A job that was interrupted by a restart
+    runs its unfinished cells again once it is resumed, and only those.
+
+    An evaluation run is a job over every input of an input set. Its cells
+    are created by the worker, a chunk of inputs at a time, rather than with
+    the request.
+
+    Several server processes can share the jobs of one database. The process
+    that moves a queued job to running owns it: it plans the cells and
+    completes the job. Processes with idle threads help with the pending
+    cells of jobs owned by others. Cells are claimed with a single UPDATE
+    and carry the id of the worker generating them, so no cell is generated
+    twice.
+    """
+
+    def __init__(
+        self,
+        evaluation_service: EvaluationService,
+        max_workers: int = config.JOB_WORKERS,
+        chunk_size: int = config.JOB_CHUNK_SIZE,
+        poll_interval: float = config.WORKER_HEARTBEAT_INTERVAL,
+    ):
+        self.evaluation_service = evaluation_service
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="job"
+        )
+        self.chunk_size = chunk_size
+        self.poll_interval = poll_interval
+        # Jobs this process is running or helping with
+        self._active: Set[int] = set()
+        self._active_lock = threading.Lock()
+        self._stopping = False
+        logger.info("JobService initialized")
+
+    def create_batch_job(
+        self,
+        db: Session,
+        request: schemas.BatchProcessRequest,
+        idempotency_key: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Store a batch request as a job and queue it for processing
+
+        A request with the idempotency key of an earlier one gets that job.
+        """
+        db_job = self.evaluation_service.find_job(
+            db, models.JobKind.BATCH_PROCESS.value, idempotency_key
+        )
+        if db_job:
+            return self.get_job(db, db_job.id)
+
+        prompts = self.evaluation_service.resolve_prompts(
+            db, request.prompt_ids, request.prompt_version_ids
+        )
+        model_ids = self._existing_model_ids(db, request.model_ids)
+
+        db_job = models.Job(
+            kind=models.JobKind.BATCH_PROCESS.value,
+            payload=request.model_dump(mode="json", exclude={"texts"}),
+            idempotency_key=idempotency_key,
+        )
+        db_inputs = [models.Input(text=text) for text in request.texts]
+        db.add(db_job)
+        db.add_all(db_inputs)
+        db.flush()
+
+        db.add_all(
+            [
+                models.JobCell(
+                    job_id=db_job.id,
+                    input_id=db_input.id,
+                    model_id=model_id,
+                    prompt_id=db_prompt.id,
+                    prompt_version_id=db_prompt_version.id,
+                )
+                for db_input in db_inputs
+                for model_id in model_ids
+                for db_prompt, db_prompt_version in prompts
+            ]
+        )
+        self.evaluation_service.commit_job(db, idempotency_key)
+        logger.info("Created job %s for %s texts", db_job.id, len(db_inputs))
+
+        self.submit(db_job.id)
+        return self.get_job(db, db_job.id)
+
+    def create_evaluation_run(
+        self,
+        db: Session,
+        request: schemas.EvaluationRunRequest,
+        idempotency_key: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Queue a run of every input in a set against the model/prompt grid"""
+        db_job = self.evaluation_service.find_job(
+            db, models.JobKind.EVALUATION_RUN.value, idempotency_key
+        )
+        if db_job:
+            return self.get_job(db, db_job.id)
+
+        db_input_set = (
+            db.query(models.InputSet)
+            .filter(models.InputSet.id == request.input_set_id)
+            .first()
+        )
+        if not db_input_set:
+            raise ValueError(f"Input set with ID {request.input_set_id} not found")
+
+        prompts = self.evaluation_service.resolve_prompts(
+            db, request.prompt_ids, request.prompt_version_ids
+        )
+        # The grid is fixed now, so later prompt versions don't change the run
+        payload = request.model_dump(mode="json")
+        payload["model_ids"] = self._existing_model_ids(db, request.model_ids)
+        payload["prompt_versions"] = [
+            [db_prompt.id, db_prompt_version.id]
+            for db_prompt, db_prompt_version in prompts
+        ]
+
+        db_job = models.Job(
+            kind=models.JobKind.EVALUATION_RUN.value,
+            input_set_id=db_input_set.id,
+            payload=payload,
+            idempotency_key=idempotency_key,
+        )
+        db.add(db_job)
+        self.evaluation_service.commit_job(db, idempotency_key)
+        logger.info(
+            "Created evaluation run %s for input set %s", db_job.id, db_input_set.id
+        )
+
+        self.submit(db_job.id)
+        return self.get_job(db, db_job.id)
+
+    def resume_job(self, db: Session, job_id: int) -> Optional[Dict[str, Any]]:
+        """Queue a finished job again to retry its failed and unfinished cells
+
+        Completed cells are kept. An evaluation run also picks up inputs that
+        were added to its set since it ran.
+        """
+        db_job = db.query(models.Job).filter(models.Job.id == job_id).first()
+        if not db_job:
+            return None
+        if db_job.status in (
+            models.JobStatus.QUEUED.value,
+            models.JobStatus.RUNNING.value,
+        ):
+            raise ValueError(f"Job {job_id} is already {db_job.status}")
+
+        retried = (
+            db.query(models.JobCell)
+            .filter(
+                models.JobCell.job_id == job_id,
+                models.JobCell.status.in_(
+                    [models.CellStatus.FAILED.value, models.CellStatus.RUNNING.value]
+                ),
+            )
+            .update(
+                {
+                    models.JobCell.status: models.CellStatus.PENDING.value,
+                    models.JobCell.worker_id: None,
+                    models.JobCell.error: None,
+                    models.JobCell.updated_at: datetime.datetime.utcnow(),
+                },
+                synchronize_session=False,
+            )
+        )
+        db_job.status = models.JobStatus.QUEUED.value
+        db_job.worker_id = None
+        db_job.error = None
+        db_job.finished_at = None
+        db.commit()
+        logger.info("Resuming job %s, retrying %s cells", job_id, retried)
+
+        self.submit(job_id)
+        return self.get_job(db, job_id)
+
+    def get_job(self, db: Session, job_id: int) -> Optional[Dict[str, Any]]:
+        """Get a job with its progress counters"""
+        db_job = db.query(models.Job).filter(models.Job.id == job_id).first()
+        if not db_job:
+            return None
+        return self._job_summary(db_job, self._cell_counts(db, [job_id]))
+
+    def get_jobs(
+        self,
+        db: Session,
+        skip: int = 0,
+        limit: int = 100,
+        kind: Optional[str] = None,
+        input_set_id: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Get all jobs, newest first, with their progress counters"""
+        query = db.query(models.Job)
+        if kind is not None:
+            query = query.filter(models.Job.kind == kind)
+        if input_set_id is not None:
+            query = query.filter(models.Job.input_set_id == input_set_id)
+        db_jobs = query.order_by(models.Job.id.desc()).offset(skip).limit(limit).all()
+        counts = self._cell_counts(db, [db_job.id for db_job in db_jobs])
+        return [self._job_summary(db_job, counts) for db_job in db_jobs]
+
+    def get_job_results(
+        self, db: Session, job_id: int, skip: int = 0, limit: int = 100
+    ) -> Optional[Dict[str, Any]]:
+        """Get the outputs generated so far, grouped by input"""
+        job = self.get_job(db, job_id)
+        if not job:
+            return None
+
+        cells = (
+            db.query(models.JobCell)
+            .options(joinedload(models.JobCell.output))
+            .filter(
+                models.JobCell.job_id == job_id,
+                models.JobCell.status == models.CellStatus.DONE.value,
+            )
+            .order_by(models.JobCell.id)
+            .offset(skip)
+            .limit(limit)
+            .all()
+        )
+
+        results: Dict[int, List[Dict[str, Any]]] = {}
+        for cell in cells:
+            output = cell.output
+            results.setdefault(cell.input_id, []).append(
+                {
+                    "output_id": output.id,
+                    "model_id": output.model_id,
+                    "prompt_id": output.prompt_id,
+                    "prompt_version_id": output.prompt_version_id,
+                    "text": output.text,
+                    "processing_time": output.processing_time,
+                    "input_tokens": output.input_tokens,
+                    "output_tokens": output.output_tokens,
+                    "cost": output.cost,
+                    "created_at": output.created_at,
+                }
+            )
+
+        return {
+            "job": job,
+            "results": [
+                {"input_id": input_id, "results": input_results}
+                for input_id, input_results in results.items()
+            ],
+        }
+
+    def submit(self, job_id: int) -> None:
+        """Run a job on the worker pool unless this process is running it already"""
+        with self._active_lock:
+            if self._stopping or job_id in self._active:
+                return
+            self._active.add(job_id)
+        self.executor.submit(self._run_job, job_id)
+
+    def poll(self) -> None:
+        """Start queued jobs, then help with running jobs of other workers
+
+        Called by the worker service after every heartbeat. Jobs are only
+        taken while this process has idle job threads.
+        """
+        with self._active_lock:
+            active = list(self._active)
+        capacity = self.max_workers - len(active)
+        if self._stopping or capacity <= 0:
+            return
+
+        db = SessionLocal()
+        try:
+            job_ids = [
+                job_id
+                for (job_id,) in db.query(models.Job.id)
+                .filter(
+                    models.Job.status == models.JobStatus.QUEUED.value,
+                    models.Job.id.notin_(active),
+                )
+                .order_by(models.Job.id)
+                .limit(capacity)
+            ]
+            if len(job_ids) < capacity:
+                has_pending_cells = (
+                    select(models.JobCell.id)
+                    .where(
+                        models.JobCell.job_id == models.Job.id,
+                        models.JobCell.status == models.CellStatus.PENDING.value,
+                    )
+                    .exists()
+                )
+                job_ids += [
+                    job_id
+                    for (job_id,) in db.query(models.Job.id)
+                    .filter(
+                        models.Job.status == models.JobStatus.RUNNING.value,
+                        models.Job.worker_id != current_worker_id(),
+                        models.Job.id.notin_(active),
+                        has_pending_cells,
+                    )
+                    .order_by(models.Job.id)
+                    .limit(capacity - len(job_ids))
+                ]
+        finally:
+            db.close()
+
+        for job_id in job_ids:
+            self.submit(job_id)
+
+    def stop(self) -> None:
+        """Stop claiming cells and wait for the chunks being generated
+
+        Jobs that are left unfinished stay with this worker until it
+        deregisters, which hands them to the other workers.
+        """
+        with self._active_lock:
+            self._stopping = True
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def _run_job(self, job_id: int) -> None:
+        """Process the pending cells of a job in its own session
+
+        A queued job is claimed first and this worker becomes its owner. The
+        owner completes the job once no cell is pending and the other
+        workers have finished theirs; a helper stops when no cell is pending.
+        """
+        db = SessionLocal()
+        owner = False
+        try:
+            db_job = db.query(models.Job).filter(models.Job.id == job_id).first()
+            if not db_job:
+                logger.warning("Job with ID %s not found", job_id)
+                return
+
+            owner = self._claim_job(db, job_id)
+            if not owner and db_job.status != models.JobStatus.RUNNING.value:
+                # Claimed by another worker before it could run, or finished
+                return
+
+            if owner and db_job.kind == models.JobKind.EVALUATION_RUN.value:
+                self._plan_run(db, db_job)
+
+            while not self._stopping:
+                cells = self._claim_cells(db, job_id)
+                if cells:
+                    self._process_cells(db, db_job, cells, owner)
+                    if not owner and db_job.status != models.JobStatus.RUNNING.value:
+                        break
+                    continue
+                if not owner or not self._has_running_cells(db, job_id):
+                    break
+                # Wait for the cells other workers are generating; if one of
+                # them dies its cells become pending and are claimed here
+                time.sleep(self.poll_interval)
+                self._add_run_time(db, job_id, self.poll_interval)
+                db.commit()
+
+            if owner and not self._stopping:
+                self._complete_job(db, db_job)
+        except Exception as e:
+            logger.exception("Error running job %s: %s", job_id, e)
+            db.rollback()
+            if owner:
+                self._fail_job(db, job_id, str(e))
+            else:
+                self._release_cells(db, job_id)
+        finally:
+            with self._active_lock:
+                self._active.discard(job_id)
+            db.close()
+
+    def _claim_job(self, db: Session, job_id: int) -> bool:
+        """Move a queued job to running as this worker's; False if it wasn't queued"""
+        now = datetime.datetime.utcnow()
+        claimed = (
+            db.query(models.Job)
+            .filter(
+                models.Job.id == job_id,
+                models.Job.status == models.JobStatus.QUEUED.value,
+            )
+            .update(
+                {
+                    models.Job.status: models.JobStatus.RUNNING.value,
+                    models.Job.worker_id: current_worker_id(),
+                    models.Job.started_at: func.coalesce(models.Job.started_at, now),
+                },
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        return claimed == 1
+
+    def _complete_job(self, db: Session, db_job: models.Job) -> None:
+        """Mark a job completed unless another worker took it over meanwhile"""
+        job_id = db_job.id
+        completed = (
+            db.query(models.Job)
+            .filter(
+                models.Job.id == job_id,
+                models.Job.status == models.JobStatus.RUNNING.value,
+                models.Job.worker_id == current_worker_id(),
+            )
+            .update(
+                {
+                    models.Job.status: models.JobStatus.COMPLETED.value,
+                    models.Job.finished_at: datetime.datetime.utcnow(),
+                },
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        if not completed:
+            logger.warning("Job %s was taken over by another worker", job_id)
+            return
+
+        summary = self._job_summary(db_job, self._cell_counts(db, [job_id]))
+        logger.info(
+            "Job %s completed: %d cells done, %d failed in %.2fs",
+            job_id,
+            summary["completed_cells"],
+            summary["failed_cells"],
+            summary["run_time"],
+            extra={
+                "job_id": job_id,
+                "kind": summary["kind"],
+                "completed_cells": summary["completed_cells"],
+                "failed_cells": summary["failed_cells"],
+                "processing_time": summary["processing_time"],
+                "run_time": summary["run_time"],
+                "throughput": summary["throughput"],
+            },
+        )
+
+    def _fail_job(self, db: Session, job_id: int, error: str) -> None:
+        db.query(models.Job).filter(
+            models.Job.id == job_id,
+            models.Job.worker_id == current_worker_id(),
+        ).update(
+            {
+                models.Job.status: models.JobStatus.FAILED.value,
+                models.Job.error: error,
+                models.Job.finished_at: datetime.datetime.utcnow(),
+            },
+            synchronize_session=False,
+        )
+        db.commit()
+
+    def _release_cells(self, db: Session, job_id: int) -> None:
+        """Hand the cells this worker claimed of a job back to the others"""
+        db.query(models.JobCell).filter(
+            models.JobCell.job_id == job_id,
+            models.JobCell.status == models.CellStatus.RUNNING.value,
+            models.JobCell.worker_id == current_worker_id(),
+        ).update(
+            {
+                models.JobCell.status: models.CellStatus.PENDING.value,
+                models.JobCell.worker_id: None,
+                models.JobCell.updated_at: datetime.datetime.utcnow(),
+            },
+            synchronize_session=False,
+        )
+        db.commit()
+
+    def _has_running_cells(self, db: Session, job_id: int) -> bool:
+        return db.query(
+            db.query(models.JobCell)
+            .filter(
+                models.JobCell.job_id == job_id,
+                models.JobCell.status == models.CellStatus.RUNNING.value,
+            )
+            .exists()
+        ).scalar()
+
+    def _add_run_time(
+        self, db: Session, job_id: int, run_time: float, processing_time: float = 0.0
+    ) -> None:
+        """Add to a job's timings in SQL, as several workers may run it at once
+
+        Doesn't commit.
+        """
+        job = models.Job
+        db.query(job).filter(job.id == job_id).update(
+            {
+                job.processing_time: func.coalesce(job.processing_time, 0.0)
+                + processing_time,
+                job.run_time: func.coalesce(job.run_time, 0.0) + run_time,
+            },
+            synchronize_session=False,
+        )
+
+    def _plan_run(self, db: Session, db_job: models.Job) -> None:
+        """Create the missing cells of an evaluation run, a chunk of inputs at a time
+
+        Only input ids are loaded here; texts are loaded with each chunk of
+        cells. Cells that exist already are kept, so planning again after a
+        restart or a resume only adds cells for new inputs.
+        """
+        grid = [
+            (model_id, prompt_id, prompt_version_id)
+            for model_id in db_job.payload["model_ids"]
+            for prompt_id, prompt_version_id in db_job.payload["prompt_versions"]
+        ]
+        planned = 0
+        last_input_id = 0
+        while True:
+            input_ids = [
+                input_id
+                for (input_id,) in db.query(models.Input.id)
+                .filter(
+                    models.Input.input_set_id == db_job.input_set_id,
+                    models.Input.id > last_input_id,
+                )
+                .order_by(models.Input.id)
+                .limit(LOOKUP_CHUNK_SIZE)
+            ]
+            if not input_ids:
+                break
+            last_input_id = input_ids[-1]
+
+            existing = set(
+                tuple(row)
+                for row in db.query(
+                    models.JobCell.input_id,
+                    models.JobCell.model_id,
+                    models.JobCell.prompt_version_id,
+                ).filter(
+                    models.JobCell.job_id == db_job.id,
+                    models.JobCell.input_id.in_(input_ids),
+                )
+            )
+            new_cells = [
+                {
+                    "job_id": db_job.id,
+                    "input_id": input_id,
+                    "model_id": model_id,
+                    "prompt_id": prompt_id,
+                    "prompt_version_id": prompt_version_id,
+                }
+                for input_id in input_ids
+                for model_id, prompt_id, prompt_version_id in grid
+                if (input_id, model_id, prompt_version_id) not in existing
+            ]
+            if new_cells:
+                db.execute(insert(models.JobCell), new_cells)
+            db.commit()
+            planned += len(new_cells)
+
+        if planned:
+            logger.info("Planned %s cells for evaluation run %s", planned, db_job.id)
+
+    def _claim_cells(self, db: Session, job_id: int) -> List[models.JobCell]:
+        """Mark the next chunk of pending cells running for this worker and load them
+
+        The cells are picked and marked by one UPDATE, so two workers never
+        claim the same cell. On PostgreSQL cells another worker is claiming
+        are skipped rather than waited for.
+        """
+        worker_id = current_worker_id()
+        pending = (
+            select(models.JobCell.id)
+            .where(
+                models.JobCell.job_id == job_id,
+                models.JobCell.status == models.CellStatus.PENDING.value,
+            )
+            .order_by(models.JobCell.id)
+            .limit(self.chunk_size)
+        )
+        if db.get_bind().dialect.name == "postgresql":
+            pending = pending.with_for_update(skip_locked=True)
+        cell_ids = (
+            db.execute(
+                update(models.JobCell)
+                .where(
+                    models.JobCell.id.in_(pending),
+                    models.JobCell.status == models.CellStatus.PENDING.value,
+                )
+                .values(
+                    status=models.CellStatus.RUNNING.value,
+                    worker_id=worker_id,
+                    updated_at=datetime.datetime.utcnow(),
+                )
+                .returning(models.JobCell.id)
+                .execution_options(synchronize_session=False)
+            )
+            .scalars()
+            .all()
+        )
+        db.commit()
+        if not cell_ids:
+            return []
+
+        return (
+            db.query(models.JobCell)
+            .options(
+                joinedload(models.JobCell.input),
+                joinedload(models.JobCell.model),
+                joinedload(models.JobCell.prompt_version),
+            )
+            .filter(
+                models.JobCell.id.in_(cell_ids),
+                models.JobCell.status == models.CellStatus.RUNNING.value,
+                models.JobCell.worker_id == worker_id,
+            )
+            .order_by(models.JobCell.id)
+            .all()
+        )
+
+    def _process_cells(
+        self,
+        db: Session,
+        db_job: models.Job,
+        cells: List[models.JobCell],
+        owner: bool = True,
+    ) -> None:
+        """Generate all cells concurrently
+
+        Outputs go through the evaluation service's write-behind buffer as
+        they finish, which marks each cell done together with its output.
+        Failed cells are recorded once the whole chunk has finished. Only
+        the owner of the job adds to its run time, so it stays close to
+        wall-clock time when other workers help.
+        """
+        start = time.perf_counter()
+        use_cache = (db_job.payload or {}).get("use_cache", True)
+        generations = [
+            (
+                cell.model.name,
+                cell.prompt_version.template,
+                cell.input.text,
+                cell.prompt_version.system_prompt,
+            )
+            for cell in cells
+        ]
+
+        writes: Dict[int, Any] = {}
+        errors: Dict[int, Exception] = {}
+        # All chunks of a job share one place in the scheduler's fair queue
+        processing_time = 0.0
+        for event, position, value in self.evaluation_service.execute(
+            db, generations, use_cache=use_cache, request_key=("job", db_job.id)
+        ):
+            if event == "error":
+                errors[position] = value
+                continue
+            if not value.get("cached"):
+                processing_time += value.get("processing_time") or 0.0
+            cell = cells[position]
+            writes[position] = self.evaluation_service.write_output(
+                cell.model.name,
+                self.evaluation_service.output_row(
+                    cell.input_id,
+                    cell.model_id,
+                    cell.prompt_id,
+                    cell.prompt_version_id,
+                    value,
+                ),
+                job_cell_id=cell.id,
+            )
+
+        failed: Dict[int, str] = {}
+        for position, cell in enumerate(cells):
+            try:
+                if position in errors:
+                    raise errors[position]
+                writes[position].result()
+            except Exception as e:
+                cell_logger.exception(
+                    "Error processing job cell %s: %s",
+                    cell.id,
+                    e,
+                    extra={"job_id": db_job.id, "cell_id": cell.id},
+                )
+                failed[cell.id] = str(e)
+        self.evaluation_service.fail_cells(db, failed)
+        run_time = time.perf_counter() - start if owner else 0.0
+        self._add_run_time(db, db_job.id, run_time, processing_time)
+        db.commit()
+
+    def _existing_model_ids(self, db: Session, model_ids: List[int]) -> List[int]:
+        """The ids of the given models that exist, skipping the others"""
+        existing = []
+        for model_id in model_ids:
+            if self.evaluation_service.get_model(db, model_id):
+                existing.append(model_id)
+            else:
+                logger.warning("Model with ID %s not found", model_id)
+        return existing
+
+    def _cell_counts(
+        self, db: Session, job_ids: List[int]
+    ) -> Dict[int, Dict[str, int]]:
+        """Count cells per status for each of the given jobs"""
+        counts: Dict[int, Dict[str, int]] = {job_id: {} for job_id in job_ids}
+        if not job_ids:
+            return counts
+
+        rows = (
+            db.query(models.JobCell.job_id, models.JobCell.status, func.count())
+            .filter(models.JobCell.job_id.in_(job_ids))
+            .group_by(models.JobCell.job_id, models.JobCell.status)
+            .all()
+        )
+        for job_id, status, count in rows:
+            counts[job_id][status] = count
+        return counts
+
+    def _job_summary(
+        self, db_job: models.Job, counts: Dict[int, Dict[str, int]]
+    ) -> Dict[str, Any]:
+        job_counts = counts.get(db_job.id, {})
+        completed = job_counts.get(models.CellStatus.DONE.value, 0)
+        failed = job_counts.get(models.CellStatus.FAILED.value, 0)
+        run_time = db_job.run_time or 0.0
+        return {
+            "id": db_job.id,
+            "kind": db_job.kind,
+            "status": db_job.status,
+            "total_cells": sum(job_counts.values()),
+            "pending_cells": job_counts.get(models.CellStatus.PENDING.value, 0),
+            "running_cells": job_counts.get(models.CellStatus.RUNNING.value, 0),
+            "completed_cells": completed,
+            "failed_cells": failed,
+            "input_set_id": db_job.input_set_id,
+            "processing_time": db_job.processing_time or 0.0,
+            "run_time": run_time,
+            "throughput": (completed + failed) / run_time if run_time else None,
+            "error": db_job.error,
+            "created_at": db_job.created_at,
+            "started_at": db_job.started_at,
+            "finished_at": db_job.finished_at,
+        }
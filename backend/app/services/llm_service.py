@@ -1,45 +1,104 @@
+import asyncio
+import functools
+import logging
+import math
+import random
+import threading
 import time
-from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Callable, Iterator
+from .. import config
+from ..logging_config import SampledLogger
+from ..metrics import record_generation
+from .scheduler_service import estimate_tokens, is_rate_limit_error
+from .timing_service import GenerationTimer
+
+logger = logging.getLogger(__name__)
+# Logs once per generation, so sampled
+cell_logger = SampledLogger(logger)
 
 # Try to import the llm library
 try:
     import llm
 except ImportError:
     llm = None
-    print("Warning: llm library not found. Using dummy implementations.")
+    logger.warning("llm library not found. Using dummy implementations.")
 
 
 class LLMService:
     def __init__(self):
-        self.models = {}
-        self._load_available_models()
+        # Plugins are only discovered when a model is first needed
+        self._models: Optional[Dict[str, Any]] = None
+        self._models_lock = threading.Lock()
+        # Models added with register_model, kept when models are discovered again
+        self._registered_models: Dict[str, Any] = {}
+        self.async_models = {}
+        # Price per million tokens by model name, for cost estimates
+        self.prices: Dict[str, Dict[str, float]] = config.MODEL_PRICES
+        # Runs models without an async variant for aprocess_text
+        self.executor = ThreadPoolExecutor(
+            max_workers=config.MAX_WORKERS, thread_name_prefix="llm"
+        )
+
+    @property
+    def models(self) -> Dict[str, Any]:
+        """Available models by name, loaded on first use"""
+        if self._models is None:
+            with self._models_lock:
+                if self._models is None:
+                    self._models = self._load_available_models()
+        return self._models
+
+    @models.setter
+    def models(self, value: Dict[str, Any]) -> None:
+        self._models = value
+
+    def register_model(self, model: Any) -> None:
+        """Make a model available under its model_id, e.g. a FakeModel"""
+        available_models = self.models
+        with self._models_lock:
+            self._registered_models[model.model_id] = model
+            self._models = {**available_models, model.model_id: model}
+            self.async_models.pop(model.model_id, None)
 
-    def _load_available_models(self):
+    def refresh_models(self) -> None:
+        """Discover the available models again, e.g. after installing a plugin"""
+        available_models = self._load_available_models()
+        with self._models_lock:
+            self._models = {**available_models, **self._registered_models}
+            self.async_models = {}
+
+    def _load_available_models(self) -> Dict[str, Any]:
+        """The models of the llm library and the fake models from the config"""
+        available_models = self._load_library_models()
+        for name, options in config.FAKE_MODELS.items():
+            available_models[name] = FakeModel(name, **options)
+        return available_models
+
+    def _load_library_models(self) -> Dict[str, Any]:
         """Load all available models from the llm library"""
         try:
             if llm is None:
                 raise ImportError("llm library not installed")
 
-            # Get all available models from the llm library
-            available_models = llm.get_models()
-
-            # Store models by name for easy lookup
-            for model in available_models:
-                self.models[model.model_id] = model
+            # Get all available models from the llm library and store them
+            # by name for easy lookup
+            available_models = {model.model_id: model for model in llm.get_models()}
 
-            if not self.models:
-                print("No models found. Loading default models.")
-                self._load_default_models()
+            if not available_models:
+                logger.warning("No models found. Loading default models.")
+                return self._load_default_models()
+            return available_models
 
         except Exception as e:
-            print(f"Error loading models: {e}")
+            logger.warning("Error loading models: %s", e)
             # Load some default models for testing if actual loading fails
-            self._load_default_models()
+            return self._load_default_models()
 
-    def _load_default_models(self):
+    def _load_default_models(self) -> Dict[str, Any]:
         """Load some default models for testing"""
         # This is just a placeholder until we can properly integrate with the llm library
-        self.models = {
+        return {
             "gpt-4o-mini": DummyModel("gpt-4o-mini", "OpenAI GPT-4o mini model"),
             "llama2": DummyModel("llama2", "Local Llama2 model"),
             "mistral": DummyModel("mistral", "Local Mistral model"),
@@ -52,27 +111,84 @@ class LLMService:
             for model_id, model in self.models.items()
         ]
 
+    def render_prompt(self, prompt_template: str, input_text: str) -> str:
+        """Fill the input text into a prompt template"""
+        # The prompt template uses {{input}} as a placeholder
+        return prompt_template.replace("{{input}}", input_text)
+
+    def estimate_cost(
+        self,
+        model_name: str,
+        input_tokens: Optional[int],
+        output_tokens: Optional[int],
+    ) -> Optional[float]:
+        """Cost of a generation from the model's price per million tokens"""
+        price = self.prices.get(model_name)
+        if price is None or input_tokens is None or output_tokens is None:
+            return None
+        return (
+            input_tokens * price.get("input", 0.0)
+            + output_tokens * price.get("output", 0.0)
+        ) / 1_000_000
+
+    def _usage(
+        self,
+        model_name: str,
+        input_tokens: Optional[int],
+        output_tokens: Optional[int],
+        timer: GenerationTimer,
+    ) -> Dict[str, Any]:
+        """Token counts, latency and cost of a successful generation
+
+        Tokens per second are measured from the first chunk on, so they
+        describe generation speed apart from the wait for the first token; a
+        response that arrived in one piece is measured over the whole call.
+        """
+        generation_time = timer.generation_time
+        rate_time = generation_time
+        if timer.chunks < 2 or not rate_time:
+            rate_time = timer.processing_time
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "time_to_first_token": timer.time_to_first_token,
+            "generation_time": generation_time,
+            "tokens_per_second": (
+                output_tokens / rate_time if output_tokens and rate_time > 0 else None
+            ),
+            "cost": self.estimate_cost(model_name, input_tokens, output_tokens),
+        }
+
     def process_text(
         self,
         model_name: str,
         prompt_template: str,
         input_text: str,
         system_prompt: Optional[str] = None,
+        on_chunk: Optional[Callable[[str], None]] = None,
     ) -> Dict[str, Any]:
-        """Process a single text with a given model and prompt"""
+        """Process a single text with a given model and prompt
+
+        If on_chunk is given it is called with each piece of text as the model
+        produces it (or once with the full text for models that can't stream).
+        The result includes token usage, time to first token, generation
+        time, tokens per second and the estimated cost, all timed on the
+        monotonic clock from the moment the model is called. A failed call
+        has its error set and no usage.
+        """
         if model_name not in self.models:
             raise ValueError(f"Model {model_name} not found")
 
         model = self.models[model_name]
 
-        # Replace placeholder in prompt template
-        # The prompt template uses {{input}} as a placeholder
-        prompt = prompt_template.replace("{{input}}", input_text)
+        prompt = self.render_prompt(prompt_template, input_text)
 
-        # Measure processing time
-        start_time = time.time()
+        timer = GenerationTimer()
+        input_tokens = output_tokens = None
 
         # Call the model
+        error = None
+        rate_limited = False
         try:
             if llm is not None and not isinstance(model, DummyModel):
                 # Use the actual llm library
@@ -81,26 +197,159 @@ class LLMService:
                 else:
                     response = model.prompt(prompt)
 
-                # Get the full text response
-                output = response.text()
+                # Iterating the response streams it chunk by chunk if the model
+                # can stream; the first chunk gives the time to first token
+                chunks = []
+                for chunk in response:
+                    timer.chunk()
+                    chunks.append(chunk)
+                    if on_chunk is not None:
+                        on_chunk(chunk)
+                output = "".join(chunks)
 
-                # Optionally get token usage information
+                # Plugins that don't report usage leave the counts empty
                 try:
                     usage = response.usage()
-                    print(f"Token usage - Input: {usage.input}, Output: {usage.output}")
+                    input_tokens, output_tokens = usage.input, usage.output
                 except Exception as usage_err:
-                    print(f"Could not retrieve token usage: {usage_err}")
+                    logger.debug("Could not retrieve token usage: %s", usage_err)
             else:
                 # Use the dummy model for testing
                 result = model.generate(prompt, system=system_prompt)
                 output = result if isinstance(result, str) else "Dummy response"
+                timer.chunk()
+                if on_chunk is not None:
+                    on_chunk(output)
+                input_tokens = estimate_tokens(prompt, system_prompt)
+                output_tokens = estimate_tokens(output)
+        except Exception as e:
+            cell_logger.warning(
+                "Error generating output with %s: %s",
+                model_name,
+                e,
+                extra={"model": model_name},
+            )
+            output = f"Error: {str(e)}"
+            error = str(e)
+            rate_limited = is_rate_limit_error(e)
+
+        timer.stop()
+
+        output_data = {
+            "text": output,
+            "processing_time": timer.processing_time,
+            "error": error,
+            "rate_limited": rate_limited,
+        }
+        if error is None:
+            output_data.update(
+                self._usage(model_name, input_tokens, output_tokens, timer)
+            )
+        record_generation(model_name, output_data)
+        return output_data
+
+    def _get_async_model(self, model_name: str):
+        """Get the async variant of a model, or None if its plugin has none"""
+        if model_name not in self.async_models:
+            async_model = None
+            if llm is not None and not isinstance(
+                self.models[model_name], (DummyModel, FakeModel)
+            ):
+                try:
+                    async_model = llm.get_async_model(model_name)
+                except Exception:
+                    async_model = None
+            self.async_models[model_name] = async_model
+        return self.async_models[model_name]
+
+    async def aprocess_text(
+        self,
+        model_name: str,
+        prompt_template: str,
+        input_text: str,
+        system_prompt: Optional[str] = None,
+        on_chunk: Optional[Callable[[str], None]] = None,
+    ) -> Dict[str, Any]:
+        """Async counterpart of process_text
+
+        Uses the llm library's async model when the plugin provides one and
+        otherwise runs process_text in the service's executor. on_chunk is
+        always called on the event loop.
+        """
+        if model_name not in self.models:
+            raise ValueError(f"Model {model_name} not found")
+
+        async_model = self._get_async_model(model_name)
+        if async_model is None:
+            loop = asyncio.get_running_loop()
+            thread_on_chunk = None
+            if on_chunk is not None:
+                thread_on_chunk = lambda chunk: loop.call_soon_threadsafe(
+                    on_chunk, chunk
+                )
+            return await loop.run_in_executor(
+                self.executor,
+                functools.partial(
+                    self.process_text,
+                    model_name,
+                    prompt_template,
+                    input_text,
+                    system_prompt=system_prompt,
+                    on_chunk=thread_on_chunk,
+                ),
+            )
+
+        prompt = self.render_prompt(prompt_template, input_text)
+
+        timer = GenerationTimer()
+        input_tokens = output_tokens = None
+
+        error = None
+        rate_limited = False
+        try:
+            if system_prompt:
+                response = async_model.prompt(prompt, system=system_prompt)
+            else:
+                response = async_model.prompt(prompt)
+
+            chunks = []
+            async for chunk in response:
+                timer.chunk()
+                chunks.append(chunk)
+                if on_chunk is not None:
+                    on_chunk(chunk)
+            output = "".join(chunks)
+
+            try:
+                usage = await response.usage()
+                input_tokens, output_tokens = usage.input, usage.output
+            except Exception as usage_err:
+                logger.debug("Could not retrieve token usage: %s", usage_err)
         except Exception as e:
-            print(f"Error generating output: {e}")
+            cell_logger.warning(
+                "Error generating output with %s: %s",
+                model_name,
+                e,
+                extra={"model": model_name},
+            )
             output = f"Error: {str(e)}"
+            error = str(e)
+            rate_limited = is_rate_limit_error(e)
 
-        processing_time = time.time() - start_time
+        timer.stop()
 
-        return {"text": output, "processing_time": processing_time}
+        output_data = {
+            "text": output,
+            "processing_time": timer.processing_time,
+            "error": error,
+            "rate_limited": rate_limited,
+        }
+        if error is None:
+            output_data.update(
+                self._usage(model_name, input_tokens, output_tokens, timer)
+            )
+        record_generation(model_name, output_data)
+        return output_data
 
 
 class DummyModel:
@@ -147,3 +396,124 @@ class DummyModel:
                 return DummyUsage()
 
         return DummyResponse()
+
+
+class FakeRateLimitError(Exception):
+    """The error a FakeModel raises to simulate being rate limited"""
+
+    status_code = 429
+
+
+class FakeModel:
+    """A model with configurable latency, speed and failures, for benchmarks
+
+    Each call waits for its time to first token, drawn from
+    latency_distribution: "fixed", "uniform" (up to twice the mean),
+    "exponential" or "lognormal" (with latency_sigma). Then output_tokens
+    tokens arrive at tokens_per_second, chunk_tokens at a time when streaming
+    or all at once otherwise. A share error_rate of calls fails, and a share
+    rate_limit_rate is rate limited so the scheduler retries it.
+    """
+
+    LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+    def __init__(
+        self,
+        name: str,
+        description: Optional[str] = None,
+        first_token_latency: float = 0.2,
+        latency_distribution: str = "lognormal",
+        latency_sigma: float = 0.5,
+        tokens_per_second: float = 50.0,
+        output_tokens: int = 100,
+        chunk_tokens: int = 5,
+        stream: bool = True,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        if latency_distribution not in self.LATENCY_DISTRIBUTIONS:
+            raise ValueError(
+                "latency_distribution must be one of "
+                + ", ".join(self.LATENCY_DISTRIBUTIONS)
+            )
+        self.name = name
+        self.model_id = name
+        self.description = (
+            description or f"Fake model ({tokens_per_second:g} tokens/s)"
+        )
+        self.first_token_latency = first_token_latency
+        self.latency_distribution = latency_distribution
+        self.latency_sigma = latency_sigma
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+        self.chunk_tokens = max(1, chunk_tokens)
+        self.can_stream = stream
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.random = random.Random(seed)
+
+    def sample_latency(self) -> float:
+        """Draw a time to first token in seconds"""
+        mean = self.first_token_latency
+        if mean <= 0 or self.latency_distribution == "fixed":
+            return max(0.0, mean)
+        if self.latency_distribution == "uniform":
+            return self.random.uniform(0.0, 2 * mean)
+        if self.latency_distribution == "exponential":
+            return self.random.expovariate(1 / mean)
+        # Lognormal with the given mean, for the long tail of real endpoints
+        sigma = self.latency_sigma
+        return self.random.lognormvariate(math.log(mean) - sigma**2 / 2, sigma)
+
+    def _chunks(self, text: str) -> Iterator[str]:
+        roll = self.random.random()
+        time.sleep(self.sample_latency())
+        if roll < self.rate_limit_rate:
+            raise FakeRateLimitError(f"{self.name}: rate limit exceeded")
+        if roll < self.rate_limit_rate + self.error_rate:
+            raise RuntimeError(f"{self.name}: simulated failure")
+
+        if not self.can_stream:
+            if self.tokens_per_second > 0:
+                time.sleep(self.output_tokens / self.tokens_per_second)
+            yield " ".join(["token"] * self.output_tokens)
+            return
+        for start in range(0, self.output_tokens, self.chunk_tokens):
+            if start and self.tokens_per_second > 0:
+                time.sleep(self.chunk_tokens / self.tokens_per_second)
+            count = min(self.chunk_tokens, self.output_tokens - start)
+            yield "token " * count
+
+    def prompt(self, text, system=None):
+        """Implement the llm model's prompt interface, streaming when iterated"""
+        model = self
+        input_tokens = estimate_tokens(text, system)
+
+        class FakeResponse:
+            def __init__(self):
+                self.chunks: List[str] = []
+
+            def __iter__(self):
+                for chunk in model._chunks(text):
+                    self.chunks.append(chunk)
+                    yield chunk
+
+            def text(self):
+                if not self.chunks:
+                    for _ in self:
+                        pass
+                return "".join(self.chunks)
+
+            def usage(self):
+                class FakeUsage:
+                    input = input_tokens
+                    output = model.output_tokens
+
+                return FakeUsage()
+
+        return FakeResponse()
+
+    def generate(self, prompt, system=None):
+        """Generate the whole text at once, for when the llm library is missing"""
+        return self.prompt(prompt, system).text()
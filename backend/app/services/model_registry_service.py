@@ -0,0 +1,112 @@
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from .. import config
+from .. import models
+from ..database import SessionLocal
+from .llm_service import LLMService
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistryService:
+    """Keeps the models table in line with the models the llm library offers
+
+    The catalogue is synced into the database at startup, then discovered
+    again and synced every interval seconds from a background thread, or
+    when a refresh is requested explicitly. Listing models is a plain read.
+
+    With several workers, only the one is_leader picks syncs the catalogue;
+    the others load their models when they first need them.
+    """
+
+    def __init__(
+        self,
+        llm_service: LLMService,
+        interval: float = config.MODEL_CATALOGUE_TTL,
+        session_factory=SessionLocal,
+        is_leader: Optional[Callable[[Session], bool]] = None,
+    ):
+        self.llm_service = llm_service
+        self.interval = interval
+        self.session_factory = session_factory
+        self.is_leader = is_leader
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Sync the catalogue and keep it synced in the background
+
+        Syncs only while this worker is the leader. A failed sync is logged
+        rather than raised, so the server still starts; the background
+        thread tries again.
+        """
+        self._stopped.clear()
+        self._sync_logged(rediscover=False)
+        self._thread = threading.Thread(
+            target=self._run, name="model-registry", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def sync(self, db: Session) -> Dict[str, int]:
+        """Add the models already discovered that the database is missing"""
+        with self._lock:
+            return self._sync(db, rediscover=False)
+
+    def refresh(self, db: Session) -> Dict[str, int]:
+        """Discover the available models again and sync them now"""
+        with self._lock:
+            return self._sync(db, rediscover=True)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self._sync_logged(rediscover=True)
+
+    def _sync_logged(self, rediscover: bool) -> None:
+        db = self.session_factory()
+        try:
+            if self.is_leader is not None and not self.is_leader(db):
+                return
+            with self._lock:
+                self._sync(db, rediscover=rediscover)
+        except Exception as e:
+            logger.exception("Error syncing the model catalogue: %s", e)
+            db.rollback()
+        finally:
+            db.close()
+
+    def _sync(self, db: Session, rediscover: bool) -> Dict[str, int]:
+        """Insert catalogue models missing from the database; must hold the lock"""
+        if rediscover:
+            self.llm_service.refresh_models()
+        catalogue = self.llm_service.get_available_models()
+
+        db_model_names = {name for (name,) in db.query(models.LLMModel.name)}
+        new_models = [
+            {"name": model_info["name"], "description": model_info["description"]}
+            for model_info in catalogue
+            if model_info["name"] not in db_model_names
+        ]
+        if new_models:
+            self._insert_models(db, new_models)
+            db.commit()
+            logger.info("Added %s new models to database", len(new_models))
+        return {"models": len(catalogue), "added": len(new_models)}
+
+    def _insert_models(self, db: Session, new_models: List[Dict[str, str]]) -> None:
+        """Insert models, skipping names another worker inserted meanwhile"""
+        table = models.LLMModel.__table__
+        dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+        db.execute(
+            dialect.insert(table).on_conflict_do_nothing(index_elements=["name"]),
+            new_models,
+        )
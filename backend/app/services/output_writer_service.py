@@ -0,0 +1,337 @@
+import asyncio
+import datetime
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Collection, List, Dict, Any, Optional
+from sqlalchemy import update
+from .. import config
+from .. import models
+from ..database import SessionLocal
+from .worker_service import current_worker_id
+
+logger = logging.getLogger(__name__)
+
+
+class OutputWriterService:
+    """Write-behind buffer for generated outputs
+
+    Outputs from all requests and jobs are collected and inserted in bulk,
+    one transaction per flush, by a background thread. A flush starts once
+    flush_size outputs are waiting or flush_interval seconds after the first
+    one arrived. Every write returns a future that resolves to the new
+    output's id. An output written for a job cell marks the cell done in the
+    same transaction, so a cell is done exactly when its output is stored.
+
+    Each output is appended to a journal file before it is buffered. A flush
+    moves the journal aside as a segment and deletes the segment once its
+    outputs are committed. The segment of a failed flush is retried after
+    the next flush and by recover(); recover() also inserts the outputs of
+    segments left behind by a crash, so generated text isn't lost. An output
+    for a job cell that is already done isn't stored again, but an output
+    of a request may be stored twice if the process dies between a commit
+    and the deletion of its segment.
+
+    Every worker process writes its own journal, named after its worker id
+    next to journal_path, and only recovers the journals of workers that are
+    gone.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        flush_size: int = config.OUTPUT_FLUSH_SIZE,
+        flush_interval: float = config.OUTPUT_FLUSH_INTERVAL,
+        journal_path: Optional[str] = config.OUTPUT_JOURNAL_PATH,
+    ):
+        self.session_factory = session_factory
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.journal_path = journal_path or None
+        self._rows: List[Dict[str, Any]] = []
+        self._futures: List[Future] = []
+        self._first_at = 0.0
+        self._segment = 0
+        self._journal = None
+        # Segments of this worker whose insert failed, to be retried
+        self._failed_segments: List[str] = []
+        self._closing = False
+        self._thread: Optional[threading.Thread] = None
+        self._condition = threading.Condition()
+
+    def write(
+        self, row: Dict[str, Any], job_cell_id: Optional[int] = None
+    ) -> Future:
+        """Queue an output row; the future resolves to its id once committed"""
+        if job_cell_id is not None:
+            row = {**row, "job_cell_id": job_cell_id}
+        future: Future = Future()
+        with self._condition:
+            self._append_to_journal(row)
+            if not self._rows:
+                self._first_at = time.monotonic()
+            self._rows.append(row)
+            self._futures.append(future)
+            self._start_thread()
+            self._condition.notify()
+        return future
+
+    async def awrite(
+        self, row: Dict[str, Any], job_cell_id: Optional[int] = None
+    ) -> int:
+        """Async counterpart of write, returning the id"""
+        return await asyncio.wrap_future(self.write(row, job_cell_id))
+
+    def close(self) -> None:
+        """Flush everything that is buffered and stop the writer thread"""
+        with self._condition:
+            self._closing = True
+            self._condition.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        with self._condition:
+            self._closing = False
+            self._thread = None
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            # Rows written while the thread was stopping
+            if self._rows:
+                self._start_thread()
+
+    def _start_thread(self) -> None:
+        """Start the writer thread if it isn't running; must hold the lock"""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="output-writer", daemon=True
+            )
+            self._thread.start()
+
+    def recover(
+        self, live_worker_ids: Optional[Callable[[], Collection[str]]] = None
+    ) -> int:
+        """Insert outputs left in the journals of workers that are gone
+
+        live_worker_ids is called once the journals are listed, so a worker
+        that starts meanwhile isn't taken for a dead one. Each journal is
+        moved to a segment of this worker before it is read, so two workers
+        never recover the same one. Segments of this worker whose insert
+        failed are retried first.
+        """
+        if not self.journal_path:
+            return 0
+        recovered = self._retry_failed_segments()
+        prefix = f"{self.journal_path}."
+        paths = sorted(glob.glob(f"{glob.escape(prefix)}*"))
+        if os.path.exists(self.journal_path):
+            # Written before each worker had its own journal
+            paths.append(self.journal_path)
+        if not paths:
+            return recovered
+        live = set(live_worker_ids() if live_worker_ids else ())
+        live.add(current_worker_id())
+
+        for path in paths:
+            # Named <journal>.<worker id> or <journal>.<worker id>-<segment>
+            owner = path[len(prefix):].split("-")[0] if path.startswith(prefix) else ""
+            if owner in live:
+                continue
+            with self._condition:
+                segment = self._next_segment()
+            try:
+                os.replace(path, segment)
+            except FileNotFoundError:
+                # Recovered by another worker
+                continue
+            path = segment
+            rows = self._read_journal(path)
+            if rows:
+                try:
+                    self._insert(rows)
+                except Exception as e:
+                    logger.exception("Error recovering outputs from %s: %s", path, e)
+                    with self._condition:
+                        self._failed_segments.append(path)
+                    continue
+                recovered += len(rows)
+            os.remove(path)
+        if recovered:
+            logger.warning("Recovered %s outputs from the journal", recovered)
+        return recovered
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._rows and not self._closing:
+                    self._condition.wait()
+                if not self._rows:
+                    return
+                # Give other generations a moment to join this transaction
+                deadline = self._first_at + self.flush_interval
+                while len(self._rows) < self.flush_size and not self._closing:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                rows, futures = self._rows, self._futures
+                self._rows, self._futures = [], []
+                segment = self._rotate_journal()
+
+            try:
+                ids = self._insert(rows)
+            except Exception as e:
+                logger.exception("Error writing %s outputs: %s", len(rows), e)
+                if segment is not None:
+                    with self._condition:
+                        self._failed_segments.append(segment)
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            if segment is not None:
+                os.remove(segment)
+            for future, output_id in zip(futures, ids):
+                future.set_result(output_id)
+            self._retry_failed_segments()
+
+    def _retry_failed_segments(self) -> int:
+        """Insert the outputs of segments whose insert failed; returns how many"""
+        with self._condition:
+            segments, self._failed_segments = self._failed_segments, []
+        retried = 0
+        for index, segment in enumerate(segments):
+            rows = self._read_journal(segment)
+            if rows:
+                try:
+                    self._insert(rows)
+                except Exception as e:
+                    logger.warning(
+                        "Error writing %s outputs of %s again: %s", len(rows), segment, e
+                    )
+                    with self._condition:
+                        self._failed_segments.extend(segments[index:])
+                    break
+                retried += len(rows)
+            os.remove(segment)
+        if retried:
+            logger.info("Wrote %s outputs of earlier failed flushes", retried)
+        return retried
+
+    def _insert(self, rows: List[Dict[str, Any]]) -> List[int]:
+        """Insert rows in one transaction and return their ids in order
+
+        A row for a job cell that is already done, e.g. one written again
+        after a failed flush, isn't inserted; its id is that of the cell's
+        output.
+        """
+        db = self.session_factory()
+        try:
+            cell_ids = [
+                row["job_cell_id"] for row in rows if row.get("job_cell_id") is not None
+            ]
+            done_outputs: Dict[int, int] = {}
+            if cell_ids:
+                done_outputs = dict(
+                    db.query(models.JobCell.id, models.JobCell.output_id).filter(
+                        models.JobCell.id.in_(cell_ids),
+                        models.JobCell.status == models.CellStatus.DONE.value,
+                    )
+                )
+            new_rows = [row for row in rows if row.get("job_cell_id") not in done_outputs]
+            if len(new_rows) < len(rows):
+                logger.info(
+                    "Skipped %s outputs of job cells that are already done",
+                    len(rows) - len(new_rows),
+                )
+
+            db_outputs = [
+                models.Output(
+                    **{key: value for key, value in row.items() if key != "job_cell_id"}
+                )
+                for row in new_rows
+            ]
+            db.add_all(db_outputs)
+            # Batched INSERT ... RETURNING assigns the ids
+            db.flush()
+            new_ids = iter(db_output.id for db_output in db_outputs)
+            ids = [
+                done_outputs[row["job_cell_id"]]
+                if row.get("job_cell_id") in done_outputs
+                else next(new_ids)
+                for row in rows
+            ]
+
+            now = datetime.datetime.utcnow()
+            done_cells = [
+                {
+                    "id": row["job_cell_id"],
+                    "status": models.CellStatus.DONE.value,
+                    "output_id": output_id,
+                    "error": None,
+                    "updated_at": now,
+                }
+                for row, output_id in zip(rows, ids)
+                if row.get("job_cell_id") is not None
+                and row["job_cell_id"] not in done_outputs
+            ]
+            if done_cells:
+                db.execute(update(models.JobCell), done_cells)
+            db.commit()
+            return ids
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _append_to_journal(self, row: Dict[str, Any]) -> None:
+        """Record a row before it is buffered; must hold the lock"""
+        if not self.journal_path:
+            return
+        if self._journal is None:
+            self._journal = open(self._journal_file(), "a", encoding="utf-8")
+        self._journal.write(json.dumps(row, default=_encode_datetime) + "\n")
+        # Reaches the OS right away, so it survives the process dying
+        self._journal.flush()
+
+    def _rotate_journal(self) -> Optional[str]:
+        """Move the journal of the rows being flushed aside; must hold the lock"""
+        if self._journal is None:
+            return None
+        self._journal.close()
+        self._journal = None
+        segment = self._next_segment()
+        os.replace(self._journal_file(), segment)
+        return segment
+
+    def _journal_file(self) -> str:
+        return f"{self.journal_path}.{current_worker_id()}"
+
+    def _next_segment(self) -> str:
+        """A new segment name of this worker's journal; must hold the lock"""
+        self._segment += 1
+        return f"{self._journal_file()}-{self._segment:08d}"
+
+    def _read_journal(self, path: str) -> List[Dict[str, Any]]:
+        rows = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    # The process died while writing this line
+                    continue
+                row["created_at"] = datetime.datetime.fromisoformat(row["created_at"])
+                rows.append(row)
+        return rows
+
+
+def _encode_datetime(value: Any) -> str:
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError(f"Can't encode {type(value).__name__}")
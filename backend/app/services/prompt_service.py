@@ -1,25 +1,23 @@
+import logging
 from typing import List, Optional, Dict, Any
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from .. import models
 from .. import schemas
 
+logger = logging.getLogger(__name__)
+
 # Try to import the llm library
 try:
     import llm
 except ImportError:
     llm = None
-    print("Warning: llm library not found. Templates will be handled manually.")
+    logger.warning("llm library not found. Templates will be handled manually.")
 
 
 class PromptService:
     def create_prompt(self, db: Session, prompt: schemas.PromptCreate) -> models.Prompt:
         """Create a new prompt template with initial version"""
-        # Debug log
-        print(
-            f"Creating prompt: {prompt.name} with system_prompt: {prompt.system_prompt}"
-        )
-
         # Create the prompt
         db_prompt = models.Prompt(name=prompt.name, description=prompt.description)
         db.add(db_prompt)
@@ -30,10 +28,8 @@ class PromptService:
         version = schemas.PromptVersionCreate(
             template=prompt.template, system_prompt=prompt.system_prompt
         )
-        print(
-            f"Creating version with template: {prompt.template[:50]}... and system_prompt: {prompt.system_prompt}"
-        )
         self.create_prompt_version(db, db_prompt.id, version)
+        logger.info("Created prompt %s (ID: %s)", db_prompt.name, db_prompt.id)
 
         # Skip the llm template creation for now to avoid errors
 
@@ -109,11 +105,6 @@ class PromptService:
         self, db: Session, prompt_id: int, version: schemas.PromptVersionCreate
     ) -> models.PromptVersion:
         """Create a new version for an existing prompt"""
-        # Debug log
-        print(
-            f"Creating prompt version for prompt {prompt_id} with system_prompt: {version.system_prompt}"
-        )
-
         # Verify the prompt exists
         db_prompt = self.get_prompt(db, prompt_id)
         if not db_prompt:
@@ -139,6 +130,7 @@ class PromptService:
         db.add(db_version)
         db.commit()
         db.refresh(db_version)
+        logger.debug("Created version %d of prompt %s", next_version, prompt_id)
 
         return db_version
 
@@ -0,0 +1,392 @@
+import asyncio
+import collections
+import itertools
+import logging
+import random
+import threading
+import time
+from concurrent.futures import Executor, Future
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional
+from .. import config
+from ..logging_config import SampledLogger
+
+logger = logging.getLogger(__name__)
+# Rate limits hit every waiting generation, so their retries are sampled
+cell_logger = SampledLogger(logger)
+
+_request_keys = itertools.count(1)
+
+
+def new_request_key() -> int:
+    """Return a key identifying one request in the fair queue"""
+    return next(_request_keys)
+
+
+def estimate_tokens(*texts: Optional[str]) -> int:
+    """Rough token count (about four characters per token)"""
+    return max(1, sum(len(text) for text in texts if text) // 4)
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """Recognise rate-limit errors raised by model plugins"""
+    if getattr(error, "status_code", None) == 429:
+        return True
+    text = f"{type(error).__name__} {error}".lower()
+    return "ratelimit" in text or "rate limit" in text or "429" in text
+
+
+class TokenBucket:
+    """Allow `rate` units per minute, with bursts up to one minute's worth"""
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.tokens = self.capacity
+        self.rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` units are available (0 if they are now)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+
+class _Waiter:
+    def __init__(self, tokens: int, notify: Callable[[], None]):
+        self.tokens = tokens
+        self.notify = notify
+        self.granted = False
+
+
+class _ModelQueue:
+    """Scheduling state of a single model"""
+
+    def __init__(self, limits: Dict[str, Any]):
+        self.max_concurrency = int(
+            limits.get("max_concurrency", config.MAX_CONCURRENCY_PER_MODEL)
+        )
+        rpm = limits.get("requests_per_minute")
+        tpm = limits.get("tokens_per_minute")
+        self.request_bucket = TokenBucket(rpm) if rpm else None
+        self.token_bucket = TokenBucket(tpm) if tpm else None
+        self.active = 0
+        # Waiters grouped by request; requests are served round-robin
+        self.queues: "collections.OrderedDict[Hashable, Deque[_Waiter]]" = (
+            collections.OrderedDict()
+        )
+        self.paused_until = 0.0
+        self.timer: Optional[threading.Timer] = None
+
+    @property
+    def queued(self) -> int:
+        return sum(len(waiters) for waiters in self.queues.values())
+
+
+class SchedulerService:
+    """Admission control in front of model calls
+
+    Every generation asks for a slot on its model. A slot is granted when the
+    model is below its concurrency limit and its request/token buckets allow
+    it. Waiting generations are served round-robin across requests, so one
+    large batch can't starve an interactive request. Rate-limit errors pause
+    the model and the call is retried with exponential backoff.
+
+    Limits come from config.MODEL_LIMITS, e.g.
+    {"llama2": {"max_concurrency": 1},
+     "gpt-4o-mini": {"max_concurrency": 8, "tokens_per_minute": 200000}}
+    """
+
+    def __init__(
+        self,
+        model_limits: Optional[Dict[str, Dict[str, Any]]] = None,
+        max_retries: int = config.RATE_LIMIT_MAX_RETRIES,
+        backoff_base: float = config.RATE_LIMIT_BACKOFF_BASE,
+        backoff_max: float = config.RATE_LIMIT_BACKOFF_MAX,
+    ):
+        self.model_limits = (
+            config.MODEL_LIMITS if model_limits is None else model_limits
+        )
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._models: Dict[str, _ModelQueue] = {}
+        self._lock = threading.Lock()
+
+    def _model(self, model_name: str) -> _ModelQueue:
+        model_queue = self._models.get(model_name)
+        if model_queue is None:
+            model_queue = _ModelQueue(self.model_limits.get(model_name, {}))
+            self._models[model_name] = model_queue
+        return model_queue
+
+    def _enqueue(
+        self, model_name: str, request_key: Hashable, waiter: _Waiter
+    ) -> None:
+        with self._lock:
+            model_queue = self._model(model_name)
+            model_queue.queues.setdefault(request_key, collections.deque()).append(
+                waiter
+            )
+            self._dispatch(model_name, model_queue)
+
+    def _dispatch(self, model_name: str, model_queue: _ModelQueue) -> None:
+        """Grant free slots to waiters; must hold the lock"""
+        while model_queue.queues and model_queue.active < model_queue.max_concurrency:
+            request_key, waiters = next(iter(model_queue.queues.items()))
+            waiter = waiters[0]
+
+            now = time.monotonic()
+            wait = model_queue.paused_until - now
+            if model_queue.request_bucket:
+                wait = max(wait, model_queue.request_bucket.wait_time(1, now))
+            if model_queue.token_bucket:
+                wait = max(wait, model_queue.token_bucket.wait_time(waiter.tokens, now))
+            if wait > 0:
+                self._schedule_dispatch(model_name, model_queue, wait)
+                return
+
+            if model_queue.request_bucket:
+                model_queue.request_bucket.take(1)
+            if model_queue.token_bucket:
+                model_queue.token_bucket.take(waiter.tokens)
+
+            # Move this request to the back of the rotation
+            waiters.popleft()
+            del model_queue.queues[request_key]
+            if waiters:
+                model_queue.queues[request_key] = waiters
+
+            model_queue.active += 1
+            waiter.granted = True
+            waiter.notify()
+
+    def _schedule_dispatch(
+        self, model_name: str, model_queue: _ModelQueue, delay: float
+    ) -> None:
+        if model_queue.timer is not None:
+            return
+
+        def fire():
+            with self._lock:
+                model_queue.timer = None
+                self._dispatch(model_name, model_queue)
+
+        model_queue.timer = threading.Timer(delay, fire)
+        model_queue.timer.daemon = True
+        model_queue.timer.start()
+
+    def _release(self, model_name: str) -> None:
+        with self._lock:
+            model_queue = self._model(model_name)
+            model_queue.active -= 1
+            self._dispatch(model_name, model_queue)
+
+    def _withdraw(self, model_name: str, request_key: Hashable, waiter: _Waiter) -> bool:
+        """Remove a waiter that gave up; returns True if it already holds a slot"""
+        with self._lock:
+            if waiter.granted:
+                return True
+            model_queue = self._model(model_name)
+            waiters = model_queue.queues.get(request_key)
+            if waiters is not None and waiter in waiters:
+                waiters.remove(waiter)
+                if not waiters:
+                    del model_queue.queues[request_key]
+            return False
+
+    def _pause(self, model_name: str, delay: float) -> None:
+        with self._lock:
+            model_queue = self._model(model_name)
+            model_queue.paused_until = max(
+                model_queue.paused_until, time.monotonic() + delay
+            )
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * (2**attempt))
+        return delay * (0.5 + random.random() / 2)
+
+    @contextmanager
+    def slot(self, model_name: str, request_key: Hashable = None, tokens: int = 1):
+        """Hold one of the model's slots for the duration of the block"""
+        granted = threading.Event()
+        waiter = _Waiter(tokens, granted.set)
+        self._enqueue(model_name, request_key, waiter)
+        try:
+            granted.wait()
+        except BaseException:
+            if self._withdraw(model_name, request_key, waiter):
+                self._release(model_name)
+            raise
+        try:
+            yield
+        finally:
+            self._release(model_name)
+
+    @asynccontextmanager
+    async def aslot(self, model_name: str, request_key: Hashable = None, tokens: int = 1):
+        """Async counterpart of slot"""
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def notify():
+            loop.call_soon_threadsafe(
+                lambda: granted.done() or granted.set_result(None)
+            )
+
+        waiter = _Waiter(tokens, notify)
+        self._enqueue(model_name, request_key, waiter)
+        try:
+            await granted
+        except BaseException:
+            if self._withdraw(model_name, request_key, waiter):
+                self._release(model_name)
+            raise
+        try:
+            yield
+        finally:
+            self._release(model_name)
+
+    def run(
+        self,
+        model_name: str,
+        call: Callable[[], Dict[str, Any]],
+        request_key: Hashable = None,
+        tokens: int = 1,
+    ) -> Dict[str, Any]:
+        """Run a model call in a slot, retrying rate-limited attempts
+
+        The result's queue_wait is the time spent waiting for slots and
+        backing off, measured on the monotonic clock.
+        """
+        queue_wait_ns = 0
+        for attempt in range(self.max_retries + 1):
+            waiting_since = time.perf_counter_ns()
+            with self.slot(model_name, request_key, tokens):
+                queue_wait_ns += time.perf_counter_ns() - waiting_since
+                result = call()
+            if not result.get("rate_limited") or attempt == self.max_retries:
+                break
+            delay = self._backoff(attempt)
+            cell_logger.warning(
+                "Rate limited by %s, retrying in %.1fs", model_name, delay
+            )
+            self._pause(model_name, delay)
+            waiting_since = time.perf_counter_ns()
+            time.sleep(delay)
+            queue_wait_ns += time.perf_counter_ns() - waiting_since
+        result["queue_wait"] = queue_wait_ns / 1e9
+        return result
+
+    def submit(
+        self,
+        executor: Executor,
+        model_name: str,
+        call: Callable[[], Dict[str, Any]],
+        request_key: Hashable = None,
+        tokens: int = 1,
+    ) -> Future:
+        """Run a model call on an executor once the model grants it a slot
+
+        Like run, but the call only takes an executor thread once it holds
+        its slot, and rate-limit backoff waits on a timer. A model at its
+        limit thus never ties up threads that calls to other models could
+        use. The future resolves to the result, with queue_wait as in run.
+        """
+        future: Future = Future()
+        queue_wait_ns = 0
+        attempt = 0
+        waiting_since = time.perf_counter_ns()
+
+        def enqueue() -> None:
+            self._enqueue(model_name, request_key, _Waiter(tokens, start))
+
+        def start() -> None:
+            # Called by _dispatch, with the lock held
+            try:
+                executor.submit(call_in_slot)
+            except RuntimeError as e:
+                # The executor is shut down; give the slot back outside the lock
+                threading.Thread(target=fail, args=(e,), daemon=True).start()
+
+        def fail(error: BaseException) -> None:
+            self._release(model_name)
+            future.set_exception(error)
+
+        def call_in_slot() -> None:
+            nonlocal queue_wait_ns, attempt, waiting_since
+            queue_wait_ns += time.perf_counter_ns() - waiting_since
+            try:
+                result = call()
+            except BaseException as e:
+                fail(e)
+                return
+            self._release(model_name)
+            if not result.get("rate_limited") or attempt == self.max_retries:
+                result["queue_wait"] = queue_wait_ns / 1e9
+                future.set_result(result)
+                return
+            delay = self._backoff(attempt)
+            attempt += 1
+            cell_logger.warning(
+                "Rate limited by %s, retrying in %.1fs", model_name, delay
+            )
+            self._pause(model_name, delay)
+            waiting_since = time.perf_counter_ns()
+            timer = threading.Timer(delay, enqueue)
+            timer.daemon = True
+            timer.start()
+
+        enqueue()
+        return future
+
+    async def arun(
+        self,
+        model_name: str,
+        call: Callable[[], Awaitable[Dict[str, Any]]],
+        request_key: Hashable = None,
+        tokens: int = 1,
+    ) -> Dict[str, Any]:
+        """Async counterpart of run"""
+        queue_wait_ns = 0
+        for attempt in range(self.max_retries + 1):
+            waiting_since = time.perf_counter_ns()
+            async with self.aslot(model_name, request_key, tokens):
+                queue_wait_ns += time.perf_counter_ns() - waiting_since
+                result = await call()
+            if not result.get("rate_limited") or attempt == self.max_retries:
+                break
+            delay = self._backoff(attempt)
+            cell_logger.warning(
+                "Rate limited by %s, retrying in %.1fs", model_name, delay
+            )
+            self._pause(model_name, delay)
+            waiting_since = time.perf_counter_ns()
+            await asyncio.sleep(delay)
+            queue_wait_ns += time.perf_counter_ns() - waiting_since
+        result["queue_wait"] = queue_wait_ns / 1e9
+        return result
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Queue depth and active generations per model"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                model_name: {
+                    "queued": model_queue.queued,
+                    "active": model_queue.active,
+                    "max_concurrency": model_queue.max_concurrency,
+                    "requests": len(model_queue.queues),
+                    "paused_for": max(0.0, model_queue.paused_until - now),
+                }
+                for model_name, model_queue in self._models.items()
+            }
@@ -0,0 +1,165 @@
+import bisect
+import collections
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple
+
+# Phases of a generation, in the order they happen
+PHASES = ("queue_wait", "time_to_first_token", "generation", "persist")
+
+# Upper bounds of the histogram buckets in seconds, from 1ms doubling to
+# about two minutes; slower observations fall in a final open bucket
+BUCKETS = tuple(0.001 * 2**i for i in range(18))
+
+
+def seconds_since(start_ns: int, end_ns: Optional[int] = None) -> float:
+    """Seconds between two perf_counter_ns readings (the second defaults to now)"""
+    if end_ns is None:
+        end_ns = time.perf_counter_ns()
+    return (end_ns - start_ns) / 1e9
+
+
+class GenerationTimer:
+    """Marks the phases of one model call on the monotonic clock
+
+    Started just before the model is called; chunk() marks each piece of
+    text as it arrives and stop() the end of the call.
+    """
+
+    def __init__(self):
+        self.start_ns = time.perf_counter_ns()
+        self.first_chunk_ns: Optional[int] = None
+        self.end_ns: Optional[int] = None
+        self.chunks = 0
+
+    def chunk(self) -> None:
+        if self.first_chunk_ns is None:
+            self.first_chunk_ns = time.perf_counter_ns()
+        self.chunks += 1
+
+    def stop(self) -> None:
+        self.end_ns = time.perf_counter_ns()
+
+    @property
+    def processing_time(self) -> float:
+        return seconds_since(self.start_ns, self.end_ns)
+
+    @property
+    def time_to_first_token(self) -> Optional[float]:
+        if self.first_chunk_ns is None:
+            return None
+        return seconds_since(self.start_ns, self.first_chunk_ns)
+
+    @property
+    def generation_time(self) -> Optional[float]:
+        """Time from the first chunk to the end of the call"""
+        if self.first_chunk_ns is None:
+            return None
+        return seconds_since(self.first_chunk_ns, self.end_ns)
+
+
+class LatencyHistogram:
+    """Counts of observations per bucket, with their sum and maximum"""
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile by interpolating within its bucket"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                estimate = lower + (upper - lower) * (rank - seen) / count
+                return min(estimate, self.max)
+            seen += count
+        return self.max
+
+    def snapshot(self) -> Dict[str, Any]:
+        cumulative: List[int] = []
+        total = 0
+        for count in self.counts[:-1]:
+            total += count
+            cumulative.append(total)
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": self.max if self.count else None,
+            # Cumulative counts per upper bound, as Prometheus expects them
+            "buckets": dict(zip(self.buckets, cumulative)),
+        }
+
+
+class TimingService:
+    """Latency histograms per model and phase since startup
+
+    Failed generations are counted per model but kept out of the
+    histograms, so an error that returns quickly doesn't look like a fast
+    answer.
+    """
+
+    def __init__(self):
+        self._histograms: Dict[Tuple[str, str], LatencyHistogram] = {}
+        self._generations: Dict[str, int] = collections.Counter()
+        self._errors: Dict[str, int] = collections.Counter()
+        self._lock = threading.Lock()
+
+    def observe(self, model_name: str, phase: str, seconds: Optional[float]) -> None:
+        if seconds is None:
+            return
+        with self._lock:
+            histogram = self._histograms.get((model_name, phase))
+            if histogram is None:
+                histogram = LatencyHistogram()
+                self._histograms[(model_name, phase)] = histogram
+            histogram.observe(seconds)
+
+    def record_generation(self, model_name: str, output_data: Dict[str, Any]) -> None:
+        """Count a finished model call and observe its phases"""
+        with self._lock:
+            self._generations[model_name] += 1
+            if output_data.get("error"):
+                self._errors[model_name] += 1
+                return
+        self.observe(model_name, "queue_wait", output_data.get("queue_wait"))
+        self.observe(
+            model_name, "time_to_first_token", output_data.get("time_to_first_token")
+        )
+        self.observe(model_name, "generation", output_data.get("generation_time"))
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Generation and error counts with a histogram per phase, by model"""
+        with self._lock:
+            stats: Dict[str, Dict[str, Any]] = {}
+            model_names = set(self._generations) | {
+                model_name for model_name, _ in self._histograms
+            }
+            for model_name in sorted(model_names):
+                stats[model_name] = {
+                    "generations": self._generations[model_name],
+                    "errors": self._errors[model_name],
+                    "phases": {
+                        phase: self._histograms[(model_name, phase)].snapshot()
+                        for phase in PHASES
+                        if (model_name, phase) in self._histograms
+                    },
+                }
+            return stats
@@ -0,0 +1,116 @@
+import logging
+from typing import List, Dict, Any, Optional
+from sqlalchemy import and_, case, func, or_
+from sqlalchemy.orm import Session
+from .. import models
+
+logger = logging.getLogger(__name__)
+
+
+class UsageService:
+    """Aggregates token usage, cost and latency of outputs
+
+    Outputs are grouped by model and prompt version, so prompt versions can be
+    compared by what they cost and how fast they answer. Cached copies count
+    as outputs but cost nothing. Token counts and averages describe
+    successful generations only, leaving out cached copies and errors.
+    """
+
+    def get_usage(
+        self,
+        db: Session,
+        job_id: Optional[int] = None,
+        input_set_id: Optional[int] = None,
+        model_id: Optional[int] = None,
+        prompt_id: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Usage per model and prompt version, optionally of one job or input set"""
+        generated = and_(
+            or_(models.Output.cached.is_(False), models.Output.cached.is_(None)),
+            models.Output.error.is_(None),
+        )
+
+        def when_generated(column):
+            return case((generated, column))
+
+        query = (
+            db.query(
+                models.Output.model_id,
+                models.LLMModel.name.label("model_name"),
+                models.Output.prompt_id,
+                models.Prompt.name.label("prompt_name"),
+                models.Output.prompt_version_id,
+                models.PromptVersion.version_number.label("prompt_version_number"),
+                func.count(models.Output.id).label("outputs"),
+                func.count(when_generated(models.Output.id)).label("generated"),
+                func.count(models.Output.error).label("errors"),
+                func.sum(when_generated(models.Output.input_tokens)).label(
+                    "input_tokens"
+                ),
+                func.sum(when_generated(models.Output.output_tokens)).label(
+                    "output_tokens"
+                ),
+                func.sum(models.Output.cost).label("cost"),
+                func.avg(when_generated(models.Output.cost)).label("avg_cost"),
+                func.avg(when_generated(models.Output.processing_time)).label(
+                    "avg_processing_time"
+                ),
+                func.avg(when_generated(models.Output.queue_wait)).label(
+                    "avg_queue_wait"
+                ),
+                func.avg(when_generated(models.Output.time_to_first_token)).label(
+                    "avg_time_to_first_token"
+                ),
+                func.avg(when_generated(models.Output.tokens_per_second)).label(
+                    "avg_tokens_per_second"
+                ),
+            )
+            .outerjoin(models.LLMModel, models.Output.model_id == models.LLMModel.id)
+            .outerjoin(models.Prompt, models.Output.prompt_id == models.Prompt.id)
+            .outerjoin(
+                models.PromptVersion,
+                models.Output.prompt_version_id == models.PromptVersion.id,
+            )
+        )
+
+        if job_id is not None:
+            # Outputs that the job's cells produced or reused
+            query = query.join(
+                models.JobCell, models.JobCell.output_id == models.Output.id
+            ).filter(
+                models.JobCell.job_id == job_id,
+                models.JobCell.status == models.CellStatus.DONE.value,
+            )
+        if input_set_id is not None:
+            query = query.join(
+                models.Input, models.Output.input_id == models.Input.id
+            ).filter(models.Input.input_set_id == input_set_id)
+        if model_id is not None:
+            query = query.filter(models.Output.model_id == model_id)
+        if prompt_id is not None:
+            query = query.filter(models.Output.prompt_id == prompt_id)
+
+        rows = (
+            query.group_by(
+                models.Output.model_id,
+                models.LLMModel.name,
+                models.Output.prompt_id,
+                models.Prompt.name,
+                models.Output.prompt_version_id,
+                models.PromptVersion.version_number,
+            )
+            .order_by(
+                models.Output.model_id,
+                models.Output.prompt_id,
+                models.Output.prompt_version_id,
+            )
+            .all()
+        )
+
+        usage = []
+        for row in rows:
+            summary = row._asdict()
+            summary["input_tokens"] = summary["input_tokens"] or 0
+            summary["output_tokens"] = summary["output_tokens"] or 0
+            usage.append(summary)
+        return usage
@@ -0,0 +1,309 @@
+import datetime
+import logging
+import os
+import socket
+import threading
+import uuid
+from typing import Any, Callable, Collection, Dict, List, Optional, Set
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+from .. import config
+from .. import models
+from ..database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+_worker_id: Optional[str] = None
+_worker_pid: Optional[int] = None
+_worker_id_lock = threading.Lock()
+
+
+def current_worker_id() -> str:
+    """The id of this process as a worker
+
+    Chosen per process id, so workers forked from a server that loaded the
+    app first (gunicorn --preload) each get their own.
+    """
+    global _worker_id, _worker_pid
+    pid = os.getpid()
+    with _worker_id_lock:
+        if _worker_pid != pid:
+            _worker_id = uuid.uuid4().hex[:12]
+            _worker_pid = pid
+        return _worker_id
+
+
+def _pid_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Running as another user
+        return True
+    return True
+
+
+class WorkerService:
+    """Membership of this process among the workers sharing the database
+
+    Every server process registers a worker row and updates its heartbeat
+    every heartbeat_interval seconds from a background thread. Running jobs
+    and cells carry the id of the worker running them, so the database is
+    the only state the workers share. A worker whose heartbeat is older than
+    timeout, or that ran on this host under a process id that is gone, is
+    dead: the outputs left in its journal are stored first, then its
+    running cells go back to pending and its jobs back to the queue, where
+    the other workers pick them up.
+
+    Pollers, such as the job service's, are called after every heartbeat.
+    """
+
+    def __init__(
+        self,
+        recover_outputs: Callable[[Callable[[], Collection[str]]], int],
+        heartbeat_interval: float = config.WORKER_HEARTBEAT_INTERVAL,
+        timeout: float = config.WORKER_TIMEOUT,
+    ):
+        self.recover_outputs = recover_outputs
+        self.heartbeat_interval = heartbeat_interval
+        self.timeout = timeout
+        self.hostname = socket.gethostname()
+        self._pollers: List[Callable[[], None]] = []
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add_poller(self, poller: Callable[[], None]) -> None:
+        self._pollers.append(poller)
+
+    def start(self) -> None:
+        """Register this worker, take over the work of dead ones and start polling"""
+        self._stopped.clear()
+        db = SessionLocal()
+        try:
+            self._register(db)
+        finally:
+            db.close()
+        logger.info(
+            "Worker %s started", current_worker_id(), extra={"pid": os.getpid()}
+        )
+        self._beat()
+        self._thread = threading.Thread(
+            target=self._run, name="worker-heartbeat", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Hand this worker's unfinished jobs and cells back and deregister
+
+        Called at shutdown once the job service has stopped claiming cells
+        and the outputs are flushed, so nothing it hands back is still being
+        generated.
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        worker_id = current_worker_id()
+        db = SessionLocal()
+        try:
+            db.query(models.Worker).filter(models.Worker.id == worker_id).delete(
+                synchronize_session=False
+            )
+            released = self._release_orphaned_work(db)
+            db.commit()
+        finally:
+            db.close()
+        logger.info(
+            "Worker %s stopped, released %s cells",
+            worker_id,
+            released,
+            extra={"released_cells": released},
+        )
+
+    def get_workers(self, db: Session) -> List[Dict[str, Any]]:
+        """The registered workers with the number of cells each is generating"""
+        running = dict(
+            db.query(models.JobCell.worker_id, func.count())
+            .filter(models.JobCell.status == models.CellStatus.RUNNING.value)
+            .group_by(models.JobCell.worker_id)
+            .all()
+        )
+        worker_id = current_worker_id()
+        return [
+            {
+                "id": db_worker.id,
+                "hostname": db_worker.hostname,
+                "pid": db_worker.pid,
+                "started_at": db_worker.started_at,
+                "heartbeat_at": db_worker.heartbeat_at,
+                "running_cells": running.get(db_worker.id, 0),
+                "current": db_worker.id == worker_id,
+            }
+            for db_worker in db.query(models.Worker).order_by(models.Worker.started_at)
+        ]
+
+    def is_leader(self, db: Session) -> bool:
+        """Whether this is the longest-registered worker
+
+        The leader does the work every worker would otherwise repeat, such as
+        syncing the model catalogue. When it dies its row is removed, and the
+        next worker in line takes over.
+        """
+        leader = (
+            db.query(models.Worker.id)
+            .order_by(models.Worker.started_at, models.Worker.id)
+            .first()
+        )
+        return leader is not None and leader.id == current_worker_id()
+
+    def recover_dead_workers(self, db: Session) -> int:
+        """Give the work of dead workers to the living; returns the cells released
+
+        The outputs in a dead worker's journal are stored before its cells
+        are released, so they aren't generated again. Work of workers that
+        are no longer registered at all is released too.
+        """
+        dead = self._dead_workers(db)
+        if dead:
+            for db_worker in dead:
+                logger.warning(
+                    "Worker %s on %s (pid %s) is gone, taking over its work",
+                    db_worker.id,
+                    db_worker.hostname,
+                    db_worker.pid,
+                    extra={"dead_worker_id": db_worker.id},
+                )
+            db.query(models.Worker).filter(
+                models.Worker.id.in_([db_worker.id for db_worker in dead])
+            ).delete(synchronize_session=False)
+            db.commit()
+
+        self.recover_outputs(lambda: self._live_worker_ids(db))
+        released = self._release_orphaned_work(db)
+        db.commit()
+        if released:
+            logger.info("Released %s cells of workers that are gone", released)
+        return released
+
+    def _register(self, db: Session) -> None:
+        now = datetime.datetime.utcnow()
+        db.merge(
+            models.Worker(
+                id=current_worker_id(),
+                hostname=self.hostname,
+                pid=os.getpid(),
+                started_at=now,
+                heartbeat_at=now,
+            )
+        )
+        db.commit()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.heartbeat_interval):
+            self._beat()
+
+    def _beat(self) -> None:
+        """Record a heartbeat, recover dead workers and call the pollers"""
+        db = SessionLocal()
+        try:
+            beats = (
+                db.query(models.Worker)
+                .filter(models.Worker.id == current_worker_id())
+                .update(
+                    {models.Worker.heartbeat_at: datetime.datetime.utcnow()},
+                    synchronize_session=False,
+                )
+            )
+            db.commit()
+            if not beats:
+                # Missed heartbeats for longer than the timeout
+                logger.warning(
+                    "Worker %s was taken for dead, registering again",
+                    current_worker_id(),
+                )
+                self._register(db)
+            self.recover_dead_workers(db)
+        except Exception as e:
+            logger.exception("Error recording worker heartbeat: %s", e)
+            db.rollback()
+        finally:
+            db.close()
+
+        for poller in self._pollers:
+            try:
+                poller()
+            except Exception as e:
+                logger.exception("Error polling for work: %s", e)
+
+    def _dead_workers(self, db: Session) -> List[models.Worker]:
+        """Workers with a stale heartbeat, or whose process on this host is gone"""
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=self.timeout)
+        worker_id = current_worker_id()
+        pid = os.getpid()
+        dead = []
+        for db_worker in db.query(models.Worker).filter(models.Worker.id != worker_id):
+            if db_worker.heartbeat_at < cutoff:
+                dead.append(db_worker)
+            elif db_worker.hostname == self.hostname and (
+                # An earlier process, e.g. of a container that restarted
+                db_worker.pid == pid
+                or not _pid_running(db_worker.pid)
+            ):
+                dead.append(db_worker)
+        return dead
+
+    def _live_worker_ids(self, db: Session) -> Set[str]:
+        return {worker_id for (worker_id,) in db.query(models.Worker.id)}
+
+    def _release_orphaned_work(self, db: Session) -> int:
+        """Queue again the running jobs and cells of workers that aren't registered
+
+        Doesn't commit. Returns the number of cells released.
+        """
+        live_workers = select(models.Worker.id)
+        unfinished_jobs = select(models.Job.id).where(
+            models.Job.status.in_(
+                [models.JobStatus.QUEUED.value, models.JobStatus.RUNNING.value]
+            )
+        )
+        orphaned_cells = db.query(models.JobCell).filter(
+            models.JobCell.job_id.in_(unfinished_jobs),
+            models.JobCell.status == models.CellStatus.RUNNING.value,
+            or_(
+                models.JobCell.worker_id.is_(None),
+                models.JobCell.worker_id.notin_(live_workers),
+            ),
+        )
+        orphaned_jobs = db.query(models.Job).filter(
+            models.Job.status == models.JobStatus.RUNNING.value,
+            or_(
+                models.Job.worker_id.is_(None),
+                models.Job.worker_id.notin_(live_workers),
+            ),
+        )
+        # Look before writing, as this runs on every heartbeat
+        if not db.query(orphaned_cells.exists()).scalar() and not db.query(
+            orphaned_jobs.exists()
+        ).scalar():
+            return 0
+
+        now = datetime.datetime.utcnow()
+        released = orphaned_cells.update(
+            {
+                models.JobCell.status: models.CellStatus.PENDING.value,
+                models.JobCell.worker_id: None,
+                models.JobCell.updated_at: now,
+            },
+            synchronize_session=False,
+        )
+        jobs = orphaned_jobs.update(
+            {
+                models.Job.status: models.JobStatus.QUEUED.value,
+                models.Job.worker_id: None,
+            },
+            synchronize_session=False,
+        )
+        if jobs:
+            logger.info("Queued %s jobs of workers that are gone", jobs)
+        return released
@@ -0,0 +1,80 @@
+import asyncio
+import collections
+import io
+import threading
+from typing import Optional
+
+
+class UploadAborted(Exception):
+    """The request body ended before the upload was complete"""
+
+
+class BodyPipe(io.RawIOBase):
+    """A blocking file over a request body that arrives on the event loop
+
+    The endpoint feeds the body's chunks as they arrive while a worker thread
+    reads from the pipe, so an upload is parsed while it streams in and never
+    held in memory as a whole. At most max_chunks chunks wait in the pipe;
+    feeding blocks until the reader has caught up.
+    """
+
+    def __init__(self, max_chunks: int = 16):
+        super().__init__()
+        self.max_chunks = max_chunks
+        self._chunks: collections.deque = collections.deque()
+        self._buffer = memoryview(b"")
+        self._finished = False
+        self._error: Optional[BaseException] = None
+        self._abandoned = False
+        self._condition = threading.Condition()
+
+    async def feed(self, chunk: bytes) -> bool:
+        """Pass a chunk on to the reader; False once the reader has stopped"""
+        if not chunk:
+            return not self._abandoned
+        return await asyncio.to_thread(self._put, chunk)
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        """End the body; with an error, the reader raises instead of seeing EOF"""
+        with self._condition:
+            self._finished = True
+            if error is not None:
+                self._error = UploadAborted(str(error) or type(error).__name__)
+            self._condition.notify_all()
+
+    def _put(self, chunk: bytes) -> bool:
+        with self._condition:
+            while len(self._chunks) >= self.max_chunks and not self._abandoned:
+                self._condition.wait()
+            if self._abandoned:
+                return False
+            self._chunks.append(chunk)
+            self._condition.notify_all()
+            return True
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if not self._buffer:
+            with self._condition:
+                while not self._chunks and not self._finished:
+                    self._condition.wait()
+                if not self._chunks:
+                    if self._error is not None:
+                        raise self._error
+                    return 0
+                self._buffer = memoryview(self._chunks.popleft())
+                self._condition.notify_all()
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+    def close(self) -> None:
+        """Stop reading; chunks fed after this are dropped"""
+        with self._condition:
+            self._abandoned = True
+            self._chunks.clear()
+            self._condition.notify_all()
+        super().close()
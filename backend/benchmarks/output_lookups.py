@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+"""
+Benchmark the output and evaluation lookups before and after adding indexes
+
+Builds a throwaway SQLite database with a large number of outputs, times the
+queries behind compare_prompts, get_input_history, delete_input and
+create_evaluation without the lookup indexes, applies the index migration and
+times them again.
+
+Run from the backend directory:
+    python -m benchmarks.output_lookups --outputs 1000000
+"""
+import argparse
+import datetime
+import os
+import random
+import statistics
+import tempfile
+import time
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import Session
+from app import models
+from app.migrations import Operations
+from app.migrations.versions.v0004_lookup_indexes import LOOKUP_INDEXES
+from app.migrations.versions.v0004_lookup_indexes import upgrade as add_lookup_indexes
+
+MODELS = 10
+PROMPTS = 20
+VERSIONS_PER_PROMPT = 2
+OUTPUTS_PER_INPUT = 10
+EVALUATED_SHARE = 0.1
+INSERT_BATCH = 50000
+
+
+def build_database(engine, outputs: int) -> None:
+    """Create the tables without the lookup indexes and fill them"""
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        for index in LOOKUP_INDEXES:
+            index.drop(bind=connection, checkfirst=True)
+
+    inputs = max(1, outputs // OUTPUTS_PER_INPUT)
+    now = datetime.datetime.utcnow()
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.executemany(
+            "INSERT INTO models (id, name) VALUES (?, ?)",
+            [(i, f"model-{i}") for i in range(1, MODELS + 1)],
+        )
+        cursor.executemany(
+            "INSERT INTO prompts (id, name) VALUES (?, ?)",
+            [(i, f"prompt-{i}") for i in range(1, PROMPTS + 1)],
+        )
+        cursor.executemany(
+            "INSERT INTO prompt_versions (id, prompt_id, version_number, template)"
+            " VALUES (?, ?, ?, ?)",
+            [
+                ((p - 1) * VERSIONS_PER_PROMPT + v, p, v, "Summarize: {{input}}")
+                for p in range(1, PROMPTS + 1)
+                for v in range(1, VERSIONS_PER_PROMPT + 1)
+            ],
+        )
+        for start in range(1, inputs + 1, INSERT_BATCH):
+            cursor.executemany(
+                "INSERT INTO inputs (id, text, created_at) VALUES (?, ?, ?)",
+                [
+                    (i, f"input {i}", now)
+                    for i in range(start, min(inputs + 1, start + INSERT_BATCH))
+                ],
+            )
+
+        evaluation_id = 1
+        for start in range(1, outputs + 1, INSERT_BATCH):
+            output_rows = []
+            evaluation_rows = []
+            for i in range(start, min(outputs + 1, start + INSERT_BATCH)):
+                prompt_version_id = random.randint(1, PROMPTS * VERSIONS_PER_PROMPT)
+                prompt_id = (prompt_version_id - 1) // VERSIONS_PER_PROMPT + 1
+                output_rows.append(
+                    (
+                        i,
+                        (i - 1) // OUTPUTS_PER_INPUT + 1,
+                        random.randint(1, MODELS),
+                        prompt_id,
+                        prompt_version_id,
+                        f"output {i}",
+                        0.5,
+                        now,
+                    )
+                )
+                if random.random() < EVALUATED_SHARE:
+                    evaluation_rows.append((evaluation_id, i, "good", now))
+                    evaluation_id += 1
+            cursor.executemany(
+                "INSERT INTO outputs (id, input_id, model_id, prompt_id,"
+                " prompt_version_id, text, processing_time, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                output_rows,
+            )
+            cursor.executemany(
+                "INSERT INTO evaluations (id, output_id, quality, created_at)"
+                " VALUES (?, ?, ?, ?)",
+                evaluation_rows,
+            )
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def lookups(db: Session, input_id: int, output_id: int):
+    """The queries behind the endpoints that filter on the indexed columns"""
+    return {
+        "compare_prompts existing output": lambda: db.query(models.Output)
+        .filter(
+            models.Output.input_id == input_id,
+            models.Output.model_id == 1,
+            models.Output.prompt_id == 1,
+            models.Output.prompt_version_id == 1,
+        )
+        .first(),
+        "get_input_history page": lambda: db.query(models.Output)
+        .filter(models.Output.input_id == input_id)
+        .order_by(models.Output.created_at.desc(), models.Output.id.desc())
+        .limit(100)
+        .all(),
+        "delete_input outputs": lambda: db.query(models.Output)
+        .filter(models.Output.input_id == input_id)
+        .all(),
+        "create_evaluation existing": lambda: db.query(models.Evaluation)
+        .filter(models.Evaluation.output_id == output_id)
+        .first(),
+        "outputs by model and prompt": lambda: db.query(func.count(models.Output.id))
+        .filter(models.Output.model_id == 1, models.Output.prompt_id == 1)
+        .scalar(),
+    }
+
+
+def measure(engine, repeat: int) -> dict:
+    """Median and worst latency of each lookup in milliseconds"""
+    with Session(engine) as db:
+        inputs = db.query(func.max(models.Input.id)).scalar()
+        outputs = db.query(func.max(models.Output.id)).scalar()
+        timings = {}
+        for _ in range(repeat):
+            queries = lookups(db, random.randint(1, inputs), random.randint(1, outputs))
+            for name, query in queries.items():
+                start = time.perf_counter()
+                query()
+                timings.setdefault(name, []).append(
+                    (time.perf_counter() - start) * 1000
+                )
+                db.expunge_all()
+    return {
+        name: (statistics.median(values), max(values))
+        for name, values in timings.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--outputs", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--db", help="database file (default: a temporary file)")
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), "benchmark.db")
+    if os.path.exists(path):
+        os.remove(path)
+    engine = create_engine(f"sqlite:///{path}")
+    random.seed(0)
+
+    print(f"Building database with {args.outputs} outputs at {path}")
+    start = time.perf_counter()
+    build_database(engine, args.outputs)
+    print(f"  done in {time.perf_counter() - start:.1f}s")
+
+    before = measure(engine, args.repeat)
+
+    start = time.perf_counter()
+    add_lookup_indexes(Operations(engine))
+    print(f"Created indexes in {time.perf_counter() - start:.1f}s\n")
+
+    after = measure(engine, args.repeat)
+
+    print(f"{'lookup':34} {'before (median/max ms)':>24} {'after (median/max ms)':>24}")
+    for name in before:
+        print(
+            f"{name:34} {before[name][0]:>12.2f} / {before[name][1]:<9.2f}"
+            f" {after[name][0]:>12.2f} / {after[name][1]:<9.2f}"
+        )
+
+    if not args.db:
+        os.remove(path)
+        os.rmdir(os.path.dirname(path))
+
+
+if __name__ == "__main__":
+    main()
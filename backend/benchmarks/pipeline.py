@@ -0,0 +1,501 @@
+#!/usr/bin/env python
+"""
+Benchmark the generation pipeline and the read paths against fake models
+
+Builds a throwaway SQLite database, registers fake models through LLMService
+and runs each scenario through the services the endpoints call, so what is
+measured is our own overhead: scheduling, caching, persistence and queries.
+
+  process           process_text requests with one text each, concurrently
+  batch             batch_process requests over many texts
+  compare           compare_prompts over many inputs that have no outputs yet
+  compare-existing  the same comparison again, with every output existing
+  history           input history pages
+  evaluate          create_evaluation for a share of the outputs
+  evaluations       evaluation listing pages, following the cursor
+
+Each scenario reports its operations, cells generated or read, throughput,
+p50/p99 latency per operation, database statements per operation and the
+peak RSS of the process so far. --json saves the results with the current
+commit and options; --compare prints the change against such a file, so
+runs are comparable across commits.
+
+Run from the backend directory:
+    python -m benchmarks.pipeline --inputs 2000 --json before.json
+    python -m benchmarks.pipeline --inputs 2000 --compare before.json
+"""
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+SCENARIOS = (
+    "process",
+    "batch",
+    "compare",
+    "compare-existing",
+    "history",
+    "evaluate",
+    "evaluations",
+)
+
+# Metrics compared with --compare, and whether higher is better
+COMPARED_METRICS = {
+    "throughput": True,
+    "p50_ms": False,
+    "p99_ms": False,
+    "queries_per_operation": False,
+}
+
+WORDS = (
+    "meeting budget follow up call tomorrow client project deadline draft "
+    "review notes idea remember buy send email team launch feedback plan"
+).split()
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def current_commit() -> str:
+    """Short hash of HEAD, marked +dirty with uncommitted changes"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + ("+dirty" if dirty else "")
+
+
+def memo(rng: random.Random, index: int, words: int) -> str:
+    """A transcribed voice memo of roughly the given number of words"""
+    body = " ".join(rng.choice(WORDS) for _ in range(words))
+    return f"Voice memo {index}: {body}."
+
+
+def configure_environment(args, directory: str) -> None:
+    """Point the app at a scratch database; it reads its settings at import"""
+    os.environ["LLM_EVALUATOR_DATABASE_URL"] = (
+        f"sqlite:///{os.path.join(directory, 'benchmark.db')}"
+    )
+    os.environ["LLM_EVALUATOR_OUTPUT_JOURNAL"] = os.path.join(
+        directory, "benchmark.outputs.journal"
+    )
+    if args.max_workers:
+        os.environ["LLM_EVALUATOR_MAX_WORKERS"] = str(args.max_workers)
+    if args.concurrency_per_model:
+        os.environ["LLM_EVALUATOR_MAX_CONCURRENCY_PER_MODEL"] = str(
+            args.concurrency_per_model
+        )
+
+
+class Benchmark:
+    def __init__(self, args):
+        from sqlalchemy import event
+        from app import models, schemas
+        from app.database import AsyncSessionLocal, SessionLocal, async_engine, engine
+        from app.migrations import upgrade
+        from app.services.evaluation_service import EvaluationService
+        from app.services.input_service import InputService
+        from app.services.llm_service import FakeModel, LLMService
+        from app.services.model_registry_service import ModelRegistryService
+        from app.services.prompt_service import PromptService
+
+        self.args = args
+        self.models = models
+        self.schemas = schemas
+        self.SessionLocal = SessionLocal
+        self.AsyncSessionLocal = AsyncSessionLocal
+        self.async_engine = async_engine
+        self.rng = random.Random(args.seed)
+        # One loop for all scenarios: pooled async connections belong to it
+        self.loop = asyncio.new_event_loop()
+
+        upgrade(engine)
+
+        self.queries = itertools.count()
+        for counted_engine in (engine, async_engine.sync_engine):
+            event.listen(
+                counted_engine,
+                "after_cursor_execute",
+                lambda *_: next(self.queries),
+            )
+
+        llm_service = LLMService()
+        llm_service.models = {}
+        for index in range(args.models):
+            llm_service.register_model(
+                FakeModel(
+                    f"fake-{index + 1}",
+                    first_token_latency=args.latency,
+                    latency_distribution=args.latency_distribution,
+                    tokens_per_second=args.tokens_per_second,
+                    output_tokens=args.output_tokens,
+                    stream=not args.no_stream,
+                    error_rate=args.error_rate,
+                    seed=args.seed + index,
+                )
+            )
+        self.evaluation_service = EvaluationService(llm_service)
+        self.input_service = InputService()
+
+        with SessionLocal() as db:
+            ModelRegistryService(llm_service).sync(db)
+            self.model_ids = [model_id for (model_id,) in db.query(models.LLMModel.id)]
+            prompt_service = PromptService()
+            self.prompt_ids = [
+                prompt_service.create_prompt(
+                    db,
+                    schemas.PromptCreate(
+                        name=f"prompt-{index + 1}",
+                        template=f"Variant {index + 1}. Summarise this memo: {{{{input}}}}",
+                    ),
+                ).id
+                for index in range(args.prompts)
+            ]
+            input_set = self.input_service.create_input_set(
+                db, schemas.InputSetCreate(name="benchmark")
+            )
+            self.input_service.import_inputs(
+                db,
+                input_set.id,
+                (
+                    {"text": memo(self.rng, index, args.input_words)}
+                    for index in range(args.inputs)
+                ),
+            )
+            self.input_ids = [
+                input_id
+                for (input_id,) in db.query(models.Input.id)
+                .filter(models.Input.input_set_id == input_set.id)
+                .order_by(models.Input.id)
+            ]
+        self.memo_index = args.inputs
+
+    @property
+    def grid(self) -> int:
+        """Cells per text: every model with every prompt"""
+        return len(self.model_ids) * len(self.prompt_ids)
+
+    def new_texts(self, count: int) -> List[str]:
+        texts = []
+        for _ in range(count):
+            texts.append(memo(self.rng, self.memo_index, self.args.input_words))
+            self.memo_index += 1
+        return texts
+
+    def run_concurrently(self, calls: List[Callable], concurrency: int) -> List[float]:
+        """Await the calls at most concurrency at a time; their latencies"""
+
+        async def run_all():
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def timed(call):
+                async with semaphore:
+                    async with self.AsyncSessionLocal() as db:
+                        start = time.perf_counter()
+                        await call(db)
+                        return time.perf_counter() - start
+
+            return await asyncio.gather(*(timed(call) for call in calls))
+
+        return list(self.loop.run_until_complete(run_all()))
+
+    def scenario_process(self) -> Tuple[List[float], int]:
+        requests = [
+            self.schemas.ProcessRequest(
+                text=text,
+                model_ids=self.model_ids,
+                prompt_ids=self.prompt_ids,
+                use_cache=False,
+            )
+            for text in self.new_texts(self.args.requests)
+        ]
+        calls = [
+            lambda db, request=request: self.evaluation_service.process_text(
+                db, request
+            )
+            for request in requests
+        ]
+        return self.run_concurrently(calls, self.args.concurrency), len(
+            requests
+        ) * self.grid
+
+    def scenario_batch(self) -> Tuple[List[float], int]:
+        requests = [
+            self.schemas.BatchProcessRequest(
+                texts=self.new_texts(self.args.batch_texts),
+                model_ids=self.model_ids,
+                prompt_ids=self.prompt_ids,
+                use_cache=False,
+            )
+            for _ in range(self.args.batches)
+        ]
+        calls = [
+            lambda db, request=request: self.evaluation_service.batch_process(
+                db, request
+            )
+            for request in requests
+        ]
+        return self.run_concurrently(calls, 1), len(requests) * (
+            self.args.batch_texts * self.grid
+        )
+
+    def _compare_request(self):
+        return self.schemas.ComparePromptsRequest(
+            input_ids=self.input_ids[: self.args.compare_inputs],
+            model_ids=self.model_ids,
+            prompt_ids=self.prompt_ids,
+        )
+
+    def scenario_compare(self) -> Tuple[List[float], int]:
+        request = self._compare_request()
+        call = lambda db: self.evaluation_service.compare_prompts(db, request)
+        return self.run_concurrently([call], 1), len(request.input_ids) * self.grid
+
+    def scenario_compare_existing(self) -> Tuple[List[float], int]:
+        request = self._compare_request()
+        calls = [
+            lambda db: self.evaluation_service.compare_prompts(db, request)
+        ] * self.args.repeat
+        cells = len(request.input_ids) * self.grid * self.args.repeat
+        return self.run_concurrently(calls, 1), cells
+
+    def scenario_history(self) -> Tuple[List[float], int]:
+        # Mostly inputs with outputs, as users open the ones they compared
+        with_outputs = self.input_ids[: self.args.compare_inputs]
+        latencies, rows = [], 0
+        with self.SessionLocal() as db:
+            for _ in range(self.args.reads):
+                pool = with_outputs if self.rng.random() < 0.8 else self.input_ids
+                start = time.perf_counter()
+                history = self.evaluation_service.get_input_history(
+                    db, self.rng.choice(pool), limit=100
+                )
+                latencies.append(time.perf_counter() - start)
+                rows += len(history["results"]) if history else 0
+                db.expunge_all()
+        return latencies, rows
+
+    def scenario_evaluate(self) -> Tuple[List[float], int]:
+        models = self.models
+        with self.SessionLocal() as db:
+            output_ids = [
+                output_id for (output_id,) in db.query(models.Output.id)
+            ]
+            evaluated = self.rng.sample(
+                output_ids, int(len(output_ids) * self.args.evaluated_share)
+            )
+            latencies = []
+            for output_id in evaluated:
+                start = time.perf_counter()
+                self.evaluation_service.create_evaluation(
+                    db,
+                    self.schemas.EvaluationCreate(
+                        output_id=output_id,
+                        quality=self.rng.choice(["good", "ok", "bad"]),
+                    ),
+                )
+                latencies.append(time.perf_counter() - start)
+                db.expunge_all()
+        return latencies, len(latencies)
+
+    def scenario_evaluations(self) -> Tuple[List[float], int]:
+        latencies, rows = [], 0
+        cursor = None
+        with self.SessionLocal() as db:
+            for _ in range(self.args.reads):
+                start = time.perf_counter()
+                page = self.evaluation_service.get_evaluations(
+                    db, limit=100, cursor=cursor
+                )
+                latencies.append(time.perf_counter() - start)
+                rows += len(page["items"])
+                cursor = page["next_cursor"]
+                db.expunge_all()
+                if cursor is None:
+                    break
+        return latencies, rows
+
+    def run(self, name: str) -> Dict[str, Any]:
+        scenario = getattr(self, "scenario_" + name.replace("-", "_"))
+        queries_before = next(self.queries)
+        start = time.perf_counter()
+        latencies, cells = scenario()
+        seconds = time.perf_counter() - start
+        # The counter was advanced once more to read it
+        queries = next(self.queries) - queries_before - 1
+        operations = len(latencies)
+        return {
+            "operations": operations,
+            "cells": cells,
+            "seconds": seconds,
+            "throughput": operations / seconds if seconds else None,
+            "cells_per_second": cells / seconds if seconds else None,
+            "p50_ms": percentile(latencies, 0.5) * 1000 if latencies else None,
+            "p99_ms": percentile(latencies, 0.99) * 1000 if latencies else None,
+            "queries_per_operation": queries / operations if operations else None,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+    def close(self) -> None:
+        self.evaluation_service.output_writer.close()
+        # Pooled aiosqlite connections each keep a thread alive until closed
+        self.loop.run_until_complete(self.async_engine.dispose())
+        self.loop.close()
+
+
+def print_results(results: Dict[str, Dict[str, Any]]) -> None:
+    print(
+        f"{'scenario':18} {'ops':>6} {'cells':>7} {'ops/s':>9} {'cells/s':>9}"
+        f" {'p50 ms':>9} {'p99 ms':>9} {'queries/op':>10} {'RSS MB':>8}"
+    )
+    for name, result in results.items():
+        print(
+            f"{name:18} {result['operations']:>6} {result['cells']:>7}"
+            f" {result['throughput'] or 0:>9.1f} {result['cells_per_second'] or 0:>9.1f}"
+            f" {result['p50_ms'] or 0:>9.1f} {result['p99_ms'] or 0:>9.1f}"
+            f" {result['queries_per_operation'] or 0:>10.1f}"
+            f" {result['peak_rss_mb']:>8.0f}"
+        )
+
+
+def print_comparison(baseline: Dict[str, Any], results: Dict[str, Dict[str, Any]]) -> None:
+    print(f"\nChange against {baseline['commit']} ({baseline['created_at']}):")
+    print(f"{'scenario':18} {'metric':22} {'before':>10} {'after':>10} {'change':>8}")
+    for name, result in results.items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = before.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            better = (change > 0) == higher_is_better
+            marker = "" if abs(change) < 5 else (" +" if better else " -")
+            print(
+                f"{name:18} {metric:22} {old:>10.2f} {new:>10.2f}"
+                f" {change:>+7.1f}%{marker}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--scenarios",
+        default=",".join(SCENARIOS),
+        help="comma-separated scenarios to run, in order (default: all)",
+    )
+    parser.add_argument("--inputs", type=int, default=1000, help="inputs in the set")
+    parser.add_argument("--input-words", type=int, default=200)
+    parser.add_argument("--models", type=int, default=3)
+    parser.add_argument("--prompts", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=50, help="process requests")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent requests")
+    parser.add_argument("--batches", type=int, default=3)
+    parser.add_argument("--batch-texts", type=int, default=100)
+    parser.add_argument("--compare-inputs", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5, help="compare-existing runs")
+    parser.add_argument("--reads", type=int, default=200, help="history and listing pages")
+    parser.add_argument("--evaluated-share", type=float, default=0.3)
+    parser.add_argument("--latency", type=float, default=0.02, help="mean seconds to first token")
+    parser.add_argument(
+        "--latency-distribution",
+        default="lognormal",
+        choices=["fixed", "uniform", "exponential", "lognormal"],
+    )
+    parser.add_argument("--tokens-per-second", type=float, default=2000.0)
+    parser.add_argument("--output-tokens", type=int, default=100)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--no-stream", action="store_true")
+    parser.add_argument("--max-workers", type=int)
+    parser.add_argument("--concurrency-per-model", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="save the results to this file")
+    parser.add_argument("--compare", help="compare with results saved by --json")
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    directory = tempfile.mkdtemp(prefix="llm-evaluator-benchmark-")
+    configure_environment(args, directory)
+    try:
+        print(
+            f"Setting up {args.inputs} inputs, {args.models} fake models and"
+            f" {args.prompts} prompts in {directory}"
+        )
+        start = time.perf_counter()
+        benchmark = Benchmark(args)
+        print(f"  done in {time.perf_counter() - start:.1f}s\n")
+
+        results = {}
+        try:
+            for name in scenarios:
+                results[name] = benchmark.run(name)
+        finally:
+            benchmark.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print_results(results)
+    if baseline is not None:
+        print_comparison(baseline, results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(
+                {
+                    "commit": current_commit(),
+                    "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+                    "options": vars(args),
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+        print(f"\nSaved results to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import os
+
+# Keep the modules' default engines off the development database
+os.environ.setdefault("LLM_EVALUATOR_DATABASE_URL", "sqlite://")
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app import models  # noqa: F401 (registers the tables with Base)
+from app.database import Base
+
+
+@pytest.fixture
+def engine():
+    """A fresh in-memory database with the current schema"""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def count_queries(engine):
+    """The statements run on the database, as a list that can be cleared"""
+    statements = []
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    yield statements
+    event.remove(engine, "after_cursor_execute", after_cursor_execute)
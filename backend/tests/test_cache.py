@@ -0,0 +1,50 @@
+import pytest
+from app import models
+from app.services.evaluation_service import EvaluationService
+from app.services.llm_service import LLMService
+
+
+class UnusedLLMService:
+    """Fails any generation, as cache hits must not reach a model"""
+
+    render_prompt = LLMService.render_prompt
+
+    def process_text(self, *args, **kwargs):
+        raise AssertionError("The model was called for a cached generation")
+
+
+@pytest.fixture
+def evaluation_service():
+    service = EvaluationService(UnusedLLMService(), max_workers=1)
+    yield service
+    service.executor.shutdown()
+
+
+def test_cache_hit_records_no_generation_latency(db, evaluation_service):
+    generation = ("a-model", "Summarise: {{input}}", "The input", None)
+    (key,) = evaluation_service._cache_keys([generation])
+    db.add(
+        models.Output(
+            input_id=1,
+            model_id=1,
+            prompt_id=1,
+            prompt_version_id=1,
+            text="A summary",
+            processing_time=2.5,
+            time_to_first_token=0.5,
+            cache_key=key,
+        )
+    )
+    db.commit()
+
+    events = list(evaluation_service.execute(db, [generation]))
+
+    assert [(event, position) for event, position, _ in events] == [("result", 0)]
+    output_data = events[0][2]
+    assert output_data["cached"] is True
+    assert output_data["text"] == "A summary"
+    assert output_data["processing_time"] is None
+    row = evaluation_service.output_row(1, 1, 1, 1, output_data)
+    assert row["processing_time"] is None
+    assert row["time_to_first_token"] is None
+    assert evaluation_service.timing.get_stats() == {}
@@ -0,0 +1,75 @@
+import pytest
+from app import models, schemas
+from app.services.evaluation_service import EvaluationService
+
+
+@pytest.fixture
+def evaluation_service():
+    service = EvaluationService(llm_service=None, max_workers=1)
+    yield service
+    service.executor.shutdown()
+
+
+@pytest.fixture
+def grid(db):
+    """Three inputs for one model and prompt, the first two with outputs"""
+    db_inputs = [models.Input(text=f"Input {i}") for i in range(3)]
+    db_model = models.LLMModel(name="a-model")
+    db_prompt = models.Prompt(name="A prompt")
+    db.add_all([*db_inputs, db_model, db_prompt])
+    db.flush()
+    db_version = models.PromptVersion(
+        prompt_id=db_prompt.id, version_number=1, template="Summarise: {{input}}"
+    )
+    db.add(db_version)
+    db.flush()
+    db.add_all(
+        [
+            models.Output(
+                input_id=db_input.id,
+                model_id=db_model.id,
+                prompt_id=db_prompt.id,
+                prompt_version_id=db_version.id,
+                text=f"Output for {db_input.text}",
+            )
+            for db_input in db_inputs[:2]
+        ]
+    )
+    db.commit()
+    return schemas.ComparePromptsRequest(
+        input_ids=[db_input.id for db_input in db_inputs],
+        prompt_ids=[db_prompt.id],
+        model_ids=[db_model.id],
+    )
+
+
+def test_comparison_job_inserts_its_cells_at_once(
+    db, evaluation_service, grid, count_queries
+):
+    db_job, pending, generations = evaluation_service._plan_comparison_job(
+        db, grid, None
+    )
+
+    cell_inserts = [
+        statement
+        for statement in count_queries
+        if statement.startswith("INSERT INTO job_cells")
+    ]
+    assert len(cell_inserts) == 1
+
+    db_cells = (
+        db.query(models.JobCell)
+        .filter(models.JobCell.job_id == db_job.id)
+        .order_by(models.JobCell.id)
+        .all()
+    )
+    assert [db_cell.status for db_cell in db_cells] == [
+        models.CellStatus.DONE.value,
+        models.CellStatus.DONE.value,
+        models.CellStatus.RUNNING.value,
+    ]
+    assert all(db_cell.output_id for db_cell in db_cells[:2])
+    # The cells left to generate carry the ids of their rows
+    assert [db_cell.id for db_cell in pending] == [db_cells[2].id]
+    assert pending[0].input_id == grid.input_ids[2]
+    assert generations == [("a-model", "Summarise: {{input}}", "Input 2", None)]
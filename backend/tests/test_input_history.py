@@ -0,0 +1,67 @@
+import pytest
+from app import models
+from app.services.evaluation_service import EvaluationService
+
+
+@pytest.fixture
+def evaluation_service():
+    service = EvaluationService(llm_service=None, max_workers=1)
+    yield service
+    service.executor.shutdown()
+
+
+def add_outputs(db, count):
+    db_input = models.Input(text="The input")
+    db_model = models.LLMModel(name="a-model")
+    db_prompt = models.Prompt(name="A prompt")
+    db.add_all([db_input, db_model, db_prompt])
+    db.flush()
+    db_version = models.PromptVersion(
+        prompt_id=db_prompt.id, version_number=1, template="Summarise: {input}"
+    )
+    db.add(db_version)
+    db.flush()
+    for i in range(count):
+        db_output = models.Output(
+            input_id=db_input.id,
+            model_id=db_model.id,
+            prompt_id=db_prompt.id,
+            prompt_version_id=db_version.id,
+            text=f"Output {i}",
+        )
+        db.add(db_output)
+        db.flush()
+        if i % 2:
+            db.add(models.Evaluation(output_id=db_output.id, quality="good"))
+    db.commit()
+    input_id = db_input.id
+    db.expunge_all()
+    return input_id
+
+
+@pytest.mark.parametrize("count", [1, 200])
+def test_history_query_count_does_not_grow_with_outputs(
+    db, evaluation_service, count_queries, count
+):
+    input_id = add_outputs(db, count)
+    count_queries.clear()
+
+    history = evaluation_service.get_input_history(db, input_id, limit=count)
+
+    assert history["total"] == count
+    assert len(history["results"]) == count
+    assert all(result["model_name"] == "a-model" for result in history["results"])
+    assert all(result["prompt_version_number"] == 1 for result in history["results"])
+    # The input, the total and one page of outputs with their relations
+    assert len(count_queries) == 3
+
+
+def test_history_pages(db, evaluation_service):
+    input_id = add_outputs(db, 5)
+
+    first = evaluation_service.get_input_history(db, input_id, limit=3)
+    rest = evaluation_service.get_input_history(db, input_id, skip=3, limit=3)
+
+    assert first["total"] == rest["total"] == 5
+    output_ids = [result["output_id"] for result in first["results"] + rest["results"]]
+    assert len(set(output_ids)) == 5
@@ -0,0 +1,25 @@
+from app import config, models, schemas
+from app.services.input_service import InputService
+
+
+def test_input_set_inputs_are_read_a_batch_at_a_time(db, monkeypatch):
+    monkeypatch.setattr(config, "DB_YIELD_PER", 50)
+    db_input_set = models.InputSet(name="A set")
+    db.add(db_input_set)
+    db.flush()
+    db.add_all(
+        [models.Input(input_set_id=db_input_set.id, text=f"Input {i}") for i in range(250)]
+    )
+    db.add(models.Input(text="Not in the set"))
+    db.commit()
+    input_set_id = db_input_set.id
+    db.expunge_all()
+
+    input_set = InputService().get_input_set_with_inputs(db, input_set_id)
+
+    assert [db_input.text for db_input in input_set["inputs"]] == [
+        f"Input {i}" for i in range(250)
+    ]
+    assert all(isinstance(db_input, schemas.Input) for db_input in input_set["inputs"])
+    # Only the set and the last batch of inputs are still loaded
+    assert len(db.identity_map) <= 1 + 50
@@ -0,0 +1,105 @@
+import datetime
+from sqlalchemy.orm import sessionmaker
+from app import models
+from app.services import worker_service
+from app.services.llm_service import FakeModel, LLMService
+from app.services.model_registry_service import ModelRegistryService
+from app.services.worker_service import WorkerService
+
+
+def test_refresh_keeps_registered_models(db):
+    llm_service = LLMService()
+    llm_service.register_model(FakeModel("fake-registered"))
+    registry = ModelRegistryService(llm_service)
+
+    registry.refresh(db)
+
+    assert "fake-registered" in llm_service.models
+    db_model_names = {name for (name,) in db.query(models.LLMModel.name)}
+    assert "fake-registered" in db_model_names
+
+
+def test_sync_only_adds_missing_models(db):
+    registry = ModelRegistryService(LLMService())
+
+    first = registry.sync(db)
+    second = registry.sync(db)
+
+    assert first["added"] == first["models"] > 0
+    assert second == {"models": first["models"], "added": 0}
+    assert db.query(models.LLMModel).count() == first["models"]
+
+
+def test_insert_skips_models_another_worker_added(db):
+    registry = ModelRegistryService(LLMService())
+    db.add(models.LLMModel(name="fake-raced", description="First"))
+    db.commit()
+
+    registry._insert_models(
+        db,
+        [
+            {"name": "fake-raced", "description": "Second"},
+            {"name": "fake-new", "description": ""},
+        ],
+    )
+    db.commit()
+
+    assert dict(db.query(models.LLMModel.name, models.LLMModel.description)) == {
+        "fake-raced": "First",
+        "fake-new": "",
+    }
+
+
+def test_failed_startup_sync_does_not_stop_the_server(monkeypatch):
+    registry = ModelRegistryService(LLMService(), interval=60)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("database is away")
+
+    monkeypatch.setattr(registry, "_sync", fail)
+    registry.start()
+    registry.stop()
+
+
+def test_only_the_leading_worker_syncs_the_catalogue(engine, db, monkeypatch):
+    started_at = datetime.datetime.utcnow()
+    for offset, worker_id in enumerate(["first", "second"]):
+        db.add(
+            models.Worker(
+                id=worker_id,
+                hostname="host",
+                pid=offset + 1,
+                started_at=started_at + datetime.timedelta(seconds=offset),
+                heartbeat_at=started_at,
+            )
+        )
+    db.commit()
+    workers = WorkerService(recover_outputs=lambda live_worker_ids: 0)
+    registries = {
+        worker_id: ModelRegistryService(
+            LLMService(),
+            interval=60,
+            session_factory=sessionmaker(bind=engine),
+            is_leader=workers.is_leader,
+        )
+        for worker_id in ["first", "second"]
+    }
+
+    for worker_id, registry in registries.items():
+        monkeypatch.setattr(
+            worker_service, "current_worker_id", lambda worker_id=worker_id: worker_id
+        )
+        registry.start()
+    for registry in registries.values():
+        registry.stop()
+
+    catalogue = registries["first"].llm_service.get_available_models()
+    assert db.query(models.LLMModel).count() == len(catalogue)
+    # The second worker hasn't discovered any models
+    assert registries["second"].llm_service._models is None
+
+    # Once the leader is gone, the next worker syncs
+    db.query(models.Worker).filter(models.Worker.id == "first").delete()
+    db.commit()
+    registries["second"]._sync_logged(rediscover=True)
+    assert registries["second"].llm_service._models is not None
@@ -0,0 +1,109 @@
+import datetime
+import glob
+import pytest
+from sqlalchemy.orm import sessionmaker
+from app import models
+from app.services.output_writer_service import OutputWriterService
+
+
+class FlakySessions:
+    """A session factory whose first `failures` sessions fail to commit"""
+
+    def __init__(self, engine, failures):
+        self.sessionmaker = sessionmaker(bind=engine)
+        self.failures = failures
+
+    def __call__(self):
+        db = self.sessionmaker()
+        if self.failures:
+            self.failures -= 1
+
+            def commit():
+                raise RuntimeError("database is away")
+
+            db.commit = commit
+        return db
+
+
+@pytest.fixture
+def journal_path(tmp_path):
+    return str(tmp_path / "outputs.journal")
+
+
+def output_row(text, **extra):
+    return {
+        "input_id": 1,
+        "model_id": 1,
+        "prompt_id": 1,
+        "prompt_version_id": 1,
+        "text": text,
+        "created_at": datetime.datetime.utcnow(),
+        **extra,
+    }
+
+
+def running_cell(db):
+    db_job = models.Job(kind=models.JobKind.BATCH_PROCESS.value)
+    db.add(db_job)
+    db.flush()
+    db_cell = models.JobCell(
+        job_id=db_job.id,
+        input_id=1,
+        model_id=1,
+        prompt_id=1,
+        prompt_version_id=1,
+        status=models.CellStatus.RUNNING.value,
+    )
+    db.add(db_cell)
+    db.commit()
+    return db_cell.id
+
+
+def test_failed_flush_is_written_with_the_next(engine, db, journal_path):
+    writer = OutputWriterService(
+        FlakySessions(engine, failures=1), flush_interval=0, journal_path=journal_path
+    )
+    cell_id = running_cell(db)
+
+    with pytest.raises(RuntimeError):
+        writer.write(output_row("first"), job_cell_id=cell_id).result(timeout=5)
+    writer.write(output_row("second")).result(timeout=5)
+    writer.close()
+
+    assert sorted(text for (text,) in db.query(models.Output.text)) == [
+        "first",
+        "second",
+    ]
+    db_cell = db.get(models.JobCell, cell_id)
+    assert db_cell.status == models.CellStatus.DONE.value
+    assert glob.glob(f"{journal_path}*") == []
+
+
+def test_failed_flush_is_written_by_recover(engine, db, journal_path):
+    writer = OutputWriterService(
+        FlakySessions(engine, failures=1), flush_interval=0, journal_path=journal_path
+    )
+
+    with pytest.raises(RuntimeError):
+        writer.write(output_row("first")).result(timeout=5)
+    writer.close()
+    assert db.query(models.Output).count() == 0
+
+    assert writer.recover(lambda: ()) == 1
+    assert [text for (text,) in db.query(models.Output.text)] == ["first"]
+    assert glob.glob(f"{journal_path}*") == []
+
+
+def test_output_of_a_done_cell_is_not_stored_again(engine, db, journal_path):
+    writer = OutputWriterService(
+        sessionmaker(bind=engine), flush_interval=0, journal_path=journal_path
+    )
+    cell_id = running_cell(db)
+
+    first_id = writer.write(output_row("first"), job_cell_id=cell_id).result(timeout=5)
+    again_id = writer.write(output_row("again"), job_cell_id=cell_id).result(timeout=5)
+    writer.close()
+
+    assert again_id == first_id
+    assert [text for (text,) in db.query(models.Output.text)] == ["first"]
+    assert db.get(models.JobCell, cell_id).output_id == first_id
@@ -0,0 +1,70 @@
+import time
+import pytest
+from app.services.evaluation_service import EvaluationService
+from app.services.llm_service import LLMService
+from app.services.scheduler_service import SchedulerService
+
+
+class SleepingLLMService:
+    """Answers after a fixed latency per model"""
+
+    render_prompt = LLMService.render_prompt
+
+    def __init__(self, latencies):
+        self.latencies = latencies
+
+    def process_text(self, model_name, prompt_template, input_text, **kwargs):
+        time.sleep(self.latencies[model_name])
+        return {"text": f"{model_name}: {input_text}", "processing_time": 0.0}
+
+
+@pytest.fixture
+def evaluation_service():
+    service = EvaluationService(
+        SleepingLLMService({"slow": 0.5, "fast": 0.05}), max_workers=4
+    )
+    service.scheduler = SchedulerService(
+        model_limits={"slow": {"max_concurrency": 1}, "fast": {"max_concurrency": 1}}
+    )
+    yield service
+    service.executor.shutdown()
+
+
+def test_model_at_its_limit_leaves_the_pool_to_other_models(evaluation_service):
+    # More waiting calls to the slow model than the pool has threads, ahead
+    # of the calls to the fast model
+    generations = [("slow", "{{input}}", f"slow {i}", None) for i in range(8)]
+    generations += [("fast", "{{input}}", f"fast {i}", None) for i in range(4)]
+
+    started = time.perf_counter()
+    finished = {}
+    for event, position, value in evaluation_service.execute(
+        None, generations, use_cache=False
+    ):
+        assert event == "result", value
+        finished[position] = time.perf_counter() - started
+
+    assert len(finished) == len(generations)
+    # The fast model's four calls take their own latency, one after the other,
+    # rather than waiting behind the slow model's queue
+    assert max(finished[position] for position in range(8, 12)) < 1.0
+    assert max(finished.values()) >= 8 * 0.5
+
+
+def test_rate_limited_call_is_retried(evaluation_service):
+    attempts = []
+
+    def process_text(model_name, prompt_template, input_text, **kwargs):
+        attempts.append(time.perf_counter())
+        return {"text": "", "rate_limited": len(attempts) == 1}
+
+    evaluation_service.llm_service.process_text = process_text
+    evaluation_service.scheduler = SchedulerService(
+        max_retries=2, backoff_base=0.05, backoff_max=0.05
+    )
+
+    output_data = evaluation_service.generate("fast", "{{input}}", "text")
+
+    assert len(attempts) == 2
+    assert not output_data.get("rate_limited")
+    assert output_data["queue_wait"] >= attempts[1] - attempts[0] - 0.01
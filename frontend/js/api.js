@@ -42,6 +42,59 @@ class API {
         }
     }
 
+    /**
+     * Make an API request that answers with Server-Sent Events
+     * @param {string} endpoint - API endpoint
+     * @param {object} data - Request body
+     * @param {function} onEvent - Called with (event, data) for every event
+     * @returns {Promise} - Resolves when the stream ends
+     */
+    async streamRequest(endpoint, data, onEvent) {
+        const response = await fetch(`${this.baseUrl}${endpoint}`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Accept': 'text/event-stream'
+            },
+            body: JSON.stringify(data)
+        });
+
+        if (!response.ok) {
+            const error = await response.json();
+            throw new Error(error.detail || 'An error occurred');
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += decoder.decode(value, { stream: true });
+
+            // Events are separated by a blank line
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const block = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let event = 'message';
+                let payload = '';
+                block.split('\n').forEach(line => {
+                    if (line.startsWith('event: ')) {
+                        event = line.slice(7);
+                    } else if (line.startsWith('data: ')) {
+                        payload += line.slice(6);
+                    }
+                });
+                onEvent(event, payload ? JSON.parse(payload) : null);
+            }
+        }
+    }
+
     // Input Set Methods
 
     /**
@@ -309,6 +362,41 @@ class API {
         });
     }
 
+    /**
+     * Queue multiple texts for background processing
+     * @param {Array<string>} texts - Input texts
+     * @param {Array<number>} modelIds - Selected model IDs
+     * @param {Array<number>} promptIds - Selected prompt IDs
+     * @param {object} promptVersionIds - Optional mapping of prompt ID to version ID
+     * @returns {Promise<object>} - Queued job with progress counters
+     */
+    async createBatchJob(texts, modelIds, promptIds, promptVersionIds = null) {
+        return this.request('/jobs/batch-process/', 'POST', {
+            texts,
+            model_ids: modelIds,
+            prompt_ids: promptIds,
+            prompt_version_ids: promptVersionIds
+        });
+    }
+
+    /**
+     * Get a background job with its progress
+     * @param {number} jobId - Job ID
+     * @returns {Promise<object>} - Job with progress counters
+     */
+    async getJob(jobId) {
+        return this.request(`/jobs/${jobId}`);
+    }
+
+    /**
+     * Get the results a background job has produced so far
+     * @param {number} jobId - Job ID
+     * @returns {Promise<object>} - Job and its results grouped by input
+     */
+    async getJobResults(jobId) {
+        return this.request(`/jobs/${jobId}/results`);
+    }
+
     /**
      * Process multiple inputs with selected models and prompts
      * This uses the compare-prompts endpoint for efficient batch processing
@@ -333,6 +421,42 @@ class API {
         });
     }
 
+    /**
+     * Process multiple inputs and receive each result as soon as it is ready
+     * @param {Array<object>} inputs - Array of input objects with id property
+     * @param {Array<number>} modelIds - Selected model IDs
+     * @param {Array<number>} promptIds - Selected prompt IDs
+     * @param {function} onEvent - Called with (event, data) for every event
+     * @param {object} promptVersionIds - Optional mapping of prompt ID to version ID
+     * @returns {Promise} - Resolves when all results have arrived
+     */
+    async batchProcessInputsStream(inputs, modelIds, promptIds, onEvent, promptVersionIds = null) {
+        return this.streamRequest('/compare-prompts/stream', {
+            input_ids: inputs.map(input => input.id),
+            model_ids: modelIds,
+            prompt_ids: promptIds,
+            prompt_version_ids: promptVersionIds
+        }, onEvent);
+    }
+
+    /**
+     * Process a single text and receive each output as soon as it is ready
+     * @param {string} text - Input text
+     * @param {Array<number>} modelIds - Selected model IDs
+     * @param {Array<number>} promptIds - Selected prompt IDs
+     * @param {function} onEvent - Called with (event, data) for every event
+     * @param {object} promptVersionIds - Optional mapping of prompt ID to version ID
+     * @returns {Promise} - Resolves when all outputs have arrived
+     */
+    async processTextStream(text, modelIds, promptIds, onEvent, promptVersionIds = null) {
+        return this.streamRequest('/process/stream', {
+            text,
+            model_ids: modelIds,
+            prompt_ids: promptIds,
+            prompt_version_ids: promptVersionIds
+        }, onEvent);
+    }
+
     /**
      * Compare multiple prompts on the same inputs
      * @param {Array<number>} inputIds - Input IDs
@@ -353,12 +477,14 @@ class API {
     // History Methods
 
     /**
-     * Get historical results for a specific input
+     * Get historical results for a specific input, newest first
      * @param {number} inputId - Input ID
-     * @returns {Promise<object>} - Input history
+     * @param {number} skip - Number of results to skip
+     * @param {number} limit - Maximum number of results
+     * @returns {Promise<object>} - Input history with the total result count
      */
-    async getInputHistory(inputId) {
-        return this.request(`/inputs/${inputId}/history`);
+    async getInputHistory(inputId, skip = 0, limit = 100) {
+        return this.request(`/inputs/${inputId}/history?skip=${skip}&limit=${limit}`);
     }
 
     // Evaluation Methods
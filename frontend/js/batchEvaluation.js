@@ -511,41 +511,42 @@ class BatchEvaluationUI {
 
             console.log(`Starting batch processing with ${selectedInputs.length} inputs, ${modelIds.length} models, and ${promptIds.length} prompts`);
 
-            // Use the compare-prompts endpoint for efficient batch processing
-            const results = await api.batchProcessInputs(
+            // Stream results from the compare-prompts endpoint so each one
+            // shows up as soon as it has been generated
+            const resultsByInput = new Map();
+            this.batchResults = [];
+
+            await api.batchProcessInputsStream(
                 selectedInputs,
                 modelIds,
-                promptIds
-            );
-
-            console.log(`Received ${results.length} batch results`);
-
-            // Ensure results have complete input data
-            if (results.length > 0) {
-                results.forEach(result => {
-                    // If input is missing or incomplete, try to find the matching input from selectedInputs
-                    const inputId = result.input_id;
-                    if (inputId && (!result.input || !result.input.id)) {
-                        const matchingInput = selectedInputs.find(input => input.id === inputId);
-                        if (matchingInput) {
-                            console.log(`Augmenting result for input #${inputId} with data from input set`);
-                            result.input = matchingInput;
+                promptIds,
+                (event, data) => {
+                    if (event === 'input') {
+                        const inputResult = {
+                            input_id: data.input_id,
+                            input: data.input,
+                            prompt_results: []
+                        };
+                        resultsByInput.set(data.input_id, inputResult);
+
+                        // Keep newest inputs first
+                        this.batchResults.push(inputResult);
+                        this.batchResults.sort((a, b) => b.input_id - a.input_id);
+                    } else if (event === 'result') {
+                        const inputResult = resultsByInput.get(data.input_id);
+                        if (inputResult) {
+                            inputResult.prompt_results.push(data.prompt_result);
+                            this.displayBatchResults();
                         }
+                    } else if (event === 'error') {
+                        console.error('Error generating result:', data.detail);
                     }
-                });
-            }
-
-            // Sort results by input ID (newest first)
-            results.sort((a, b) => {
-                const idA = a.input?.id || a.input_id || 0;
-                const idB = b.input?.id || b.input_id || 0;
-                return idB - idA;
-            });
+                }
+            );
 
-            // Store the results
-            this.batchResults = results;
+            console.log(`Received ${this.batchResults.length} batch results`);
 
-            // Display the results
+            // Display the final results
             this.displayBatchResults();
 
             // Enable export button
@@ -778,7 +779,8 @@ class BatchEvaluationUI {
                     const promptName = result.prompt_name.replace(/,/g, ' ');
                     const version = result.prompt_version_number || '';
                     const output = result.text.replace(/,/g, ' ').replace(/\n/g, ' ');
-                    const processingTime = result.processing_time.toFixed(2);
+                    const processingTime = typeof result.processing_time === 'number' ?
+                        result.processing_time.toFixed(2) : '';
                     const timestamp = new Date(result.created_at).toLocaleString();
                     const evaluation = result.evaluation ? result.evaluation.quality : 'not evaluated';
 
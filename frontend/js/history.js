@@ -311,8 +311,15 @@ class HistoryUI {
             const targetContainer = this.viewMode === 'timeline' ? this.resultsContainer : this.matrixContainer;
             ui.showLoading(targetContainer, 'Loading history...');
 
-            // Load history
+            // Load history, a page at a time until every result is in
             const history = await api.getInputHistory(inputId);
+            while (history.results.length < history.total) {
+                const page = await api.getInputHistory(inputId, history.results.length);
+                if (page.results.length === 0) {
+                    break;
+                }
+                history.results.push(...page.results);
+            }
             this.historyData = history; // Store for view switching
 
             // Populate model and prompt filters